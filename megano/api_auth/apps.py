@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api_auth'
+
+    def ready(self):
+        import api_auth.signals
+        import api_auth.schema
@@ -0,0 +1,173 @@
+"""
+Асинхронные варианты входа, регистрации и смены пароля для ASGI.
+
+Подключаются вместо SignInView, SignUpView и ChangePasswordView настройкой
+AUTH_ASYNC_VIEWS (см. urls.py). Хэширование выполняется в ограниченном пуле
+(api_auth.hashing), запросы к БД — асинхронным ORM, поэтому цикл событий не
+блокируется на время PBKDF2. Форматы запросов и ответов те же, что у
+синхронных представлений.
+"""
+
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import alogin
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from api_transaction.storage import merge_guest_basket, take_guest_basket
+from .hashing import HashingBusy, run_hashing, verify_password
+from .models import Profile
+from .serializers import (
+    JsonStringSerializer,
+    PasswordSerializer,
+    SignInSerializer,
+    SignUpSerializer,
+)
+from .throttling import SlidingWindowLimiter, client_ip
+
+logger = logging.getLogger(__name__)
+
+BACKEND = "django.contrib.auth.backends.ModelBackend"
+
+
+class NewPasswordSerializer(PasswordSerializer):
+    """Текущий пароль проверяется в пуле хэширования, а не в сериализаторе"""
+
+    def validate_currentPassword(self, value):
+        return value
+
+
+def rate_limited(wait) -> JsonResponse:
+    response = JsonResponse({"detail": "Слишком много попыток, повторите позже"}, status=429)
+    response["Retry-After"] = str(wait)
+    return response
+
+
+def hashing_busy() -> JsonResponse:
+    logger.warning("Очередь хэширования паролей заполнена", extra={"tags": ["auth"]})
+    response = JsonResponse({"detail": "Сервис перегружен, повторите позже"}, status=503)
+    response["Retry-After"] = "1"
+    return response
+
+
+def parse_credentials(request, serializer_class):
+    """Данные формы вида {"<json>": ""} -> (validated_data, None) или (None, ответ 400)"""
+    wrapper_serializer = JsonStringSerializer(data=request.POST)
+    if not wrapper_serializer.is_valid():
+        return None, JsonResponse(wrapper_serializer.errors, status=400)
+    serializer = serializer_class(data=wrapper_serializer.validated_data)
+    if not serializer.is_valid():
+        return None, JsonResponse(serializer.errors, status=400)
+    return serializer.validated_data, None
+
+
+async def login_with_basket(request, user):
+    guest_basket = await sync_to_async(take_guest_basket)(request)
+    await alogin(request, user, backend=BACKEND)
+    await sync_to_async(merge_guest_basket)(request, guest_basket)
+
+
+@csrf_exempt
+@require_POST
+async def sign_in(request):
+    data, error = parse_credentials(request, SignInSerializer)
+    if error:
+        return error
+    username, password = data["username"], data["password"]
+    failures = SlidingWindowLimiter("sign-in:username")
+    wait = await sync_to_async(SlidingWindowLimiter("sign-in:ip").hit)(
+        client_ip(request)
+    ) or await sync_to_async(failures.retry_after)(username.lower())
+    if wait:
+        return rate_limited(wait)
+
+    user = await User.objects.filter(username=username).afirst()
+    try:
+        valid = await run_hashing(verify_password, user, password)
+    except HashingBusy:
+        return hashing_busy()
+    if not valid or not user.is_active:
+        await sync_to_async(failures.hit)(username.lower())
+        logger.warning(
+            "Authentication failed", extra={"tags": ["auth_failed"], "username": username}
+        )
+        return JsonResponse({"detail": "Authentication failed"}, status=401)
+
+    await sync_to_async(failures.reset)(username.lower())
+    await login_with_basket(request, user)
+    logger.info(f"User logged in: {username}", extra={"tags": ["auth"]})
+    return HttpResponse(status=201)
+
+
+@sync_to_async
+def create_user(username, password_hash, name) -> User:
+    with transaction.atomic():
+        user = User.objects.create(username=username, password=password_hash, first_name=name)
+        Profile.objects.create(user=user, fullName=name)
+    return user
+
+
+@csrf_exempt
+@require_POST
+async def sign_up(request):
+    data, error = parse_credentials(request, SignUpSerializer)
+    if error:
+        return error
+    wait = await sync_to_async(SlidingWindowLimiter("sign-up:ip").hit)(client_ip(request))
+    if wait:
+        return rate_limited(wait)
+    username = data["username"]
+    if await User.objects.filter(username=username).aexists():
+        return JsonResponse({"detail": "Пользователь с таким username уже существует"}, status=400)
+    try:
+        password_hash = await run_hashing(make_password, data["password"])
+    except HashingBusy:
+        return hashing_busy()
+    # Пароль хэшируется один раз: вход сразу по созданному пользователю
+    user = await create_user(username, password_hash, data["name"])
+    await login_with_basket(request, user)
+    logger.info(f"User created: {username}", extra={"tags": ["registration"]})
+    return HttpResponse(status=201)
+
+
+@require_POST
+async def change_password(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+    wait = await sync_to_async(SlidingWindowLimiter("password:user").hit)(user.pk)
+    if wait:
+        return rate_limited(wait)
+    if request.content_type == "application/json":
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"detail": "Invalid JSON"}, status=400)
+    else:
+        payload = request.POST
+    serializer = NewPasswordSerializer(data=payload, context={"request": request})
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+    current = serializer.validated_data["currentPassword"]
+    new_password = serializer.validated_data["newPassword"]
+
+    try:
+        if not await run_hashing(verify_password, user, current):
+            return JsonResponse({"currentPassword": ["Текущий пароль неверен"]}, status=400)
+        # Текущий пароль уже проверен — совпадение с новым видно без хэширования
+        if new_password == current:
+            return JsonResponse(
+                {"newPassword": ["Новый пароль не должен совпадать с текущим"]}, status=400
+            )
+        user.password = await run_hashing(make_password, new_password)
+    except HashingBusy:
+        return hashing_busy()
+    await user.asave(update_fields=["password"])
+    logger.info("Password changed for user: %s", user.username)
+    return JsonResponse({"detail": "Пароль успешно изменён"})
@@ -0,0 +1,64 @@
+"""
+Ограниченный пул потоков для хэширования паролей.
+
+PBKDF2 занимает процессор на ~100 мс и выполняется в hashlib без GIL, поэтому
+асинхронные представления входа (api_auth.async_views) отдают его потокам
+пула из PASSWORD_HASH_WORKERS потоков. Очередь к пулу ограничена
+PASSWORD_HASH_QUEUE ожидающими вызовами: при всплеске входов лишние попытки
+сразу получают 503, а не копятся в памяти, и не отнимают потоки у остальных
+запросов процесса.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """Очередь к пулу хэширования заполнена"""
+
+
+def get_pool() -> tuple:
+    """(пул потоков, семафор мест в пуле и очереди) процесса"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = settings.PASSWORD_HASH_WORKERS
+                _pool = (
+                    ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash"),
+                    threading.BoundedSemaphore(workers + settings.PASSWORD_HASH_QUEUE),
+                )
+    return _pool
+
+
+async def run_hashing(func, *args):
+    """Выполняет func(*args) в пуле; HashingBusy, если мест в очереди нет"""
+    executor, slots = get_pool()
+    # Семафор потоковый: под WSGI у каждого запроса свой цикл событий
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args))
+    finally:
+        slots.release()
+
+
+def verify_password(user, raw_password) -> bool:
+    """
+    Проверка пароля без обращения к БД. Для несуществующего пользователя пароль
+    всё равно хэшируется (как в ModelBackend), чтобы время ответа не выдавало,
+    есть ли такой логин. Устаревший хэш здесь не перезаписывается
+    """
+    if user is None:
+        make_password(raw_password)
+        return False
+    return check_password(raw_password, user.password)
@@ -0,0 +1,159 @@
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from api_auth.models import Profile
+
+ENGINES = ("django.contrib.sessions.backends.db", "megano.sessions")
+
+
+def session_cache_table():
+    """Таблица кэша сессий, если он хранится в БД (без REDIS_URL), иначе None"""
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    return cache._table if isinstance(cache, DatabaseCache) else None
+
+
+class Command(BaseCommand):
+    """
+    Сравнение хранилищ сессий: параллельные клиенты (вошедшие пользователи и
+    гости) запрашивают профиль и корзину. Для каждого хранилища выводит
+    задержки, число всех SQL-запросов на запрос и обращений к таблицам сессий:
+    django_session и таблице кэша сессий, если кэш хранится в БД (каждая запись
+    в SQLite блокирует на запись всю базу). Созданные данные удаляются.
+    """
+
+    help = "Benchmark session engines: latency and SQL queries per request"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400, help="Запросов на хранилище")
+        parser.add_argument("--threads", type=int, default=4, help="Параллельных клиентов")
+        parser.add_argument(
+            "--engines",
+            default=",".join(ENGINES),
+            help="Хранилища сессий (SESSION_ENGINE) через запятую",
+        )
+
+    def handle(self, *args, **options):
+        requests, threads = options["requests"], options["threads"]
+        if min(requests, threads) <= 0:
+            self.stdout.write(self.style.ERROR("Все параметры должны быть больше 0"))
+            return
+
+        prefix = "bench-%s" % uuid.uuid4().hex[:8]
+        users = []
+        for i in range(threads):
+            user = User.objects.create_user(username=f"{prefix}-{i}")
+            Profile.objects.create(user=user, fullName=user.username)
+            users.append(user)
+        # Половина клиентов — гости: им нужна только корзина
+        urls = {
+            "user": [reverse("api_auth:profile"), reverse("api_transaction:basket")],
+            "guest": [reverse("api_transaction:basket")],
+        }
+
+        # Все клиенты приходят с одного IP — лимиты запросов не должны мешать замеру
+        limits = {scope: (10**9, window) for scope, (_, window) in settings.RATE_LIMITS.items()}
+        cache_table = session_cache_table()
+        if cache_table:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Кэш сессий хранится в таблице %s: megano.sessions читает её на каждом "
+                    "запросе, а изменённую сессию пишет дважды (в django_session и в кэш). "
+                    "Экономия запросов к БД есть только с кэшем вне БД (REDIS_URL)" % cache_table
+                )
+            )
+        try:
+            for engine in options["engines"].split(","):
+                with override_settings(SESSION_ENGINE=engine, RATE_LIMITS=limits):
+                    self.run_engine(engine, users, requests, urls)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run_engine(self, engine, users, requests, urls):
+        latencies = []
+        queries = Counter()
+        total_queries = 0
+        lock = threading.Lock()
+        tables = ["django_session"]
+        cache_table = session_cache_table()
+        if cache_table:
+            tables.append(cache_table)
+
+        def count_session_queries(execute, sql, params, many, context):
+            nonlocal total_queries
+            with lock:
+                total_queries += 1
+                if any(table in sql for table in tables):
+                    queries[sql.lstrip().split(" ", 1)[0].upper()] += 1
+            return execute(sql, params, many, context)
+
+        def client_loop(index, user, count):
+            client = Client(HTTP_HOST="localhost")
+            kind = "user" if index % 2 == 0 else "guest"
+            if kind == "user":
+                client.force_login(user)
+            try:
+                with connection.execute_wrapper(count_session_queries):
+                    for i in range(count):
+                        url = urls[kind][i % len(urls[kind])]
+                        tick = time.monotonic()
+                        client.get(url)
+                        elapsed = time.monotonic() - tick
+                        with lock:
+                            latencies.append(elapsed)
+            finally:
+                connection.close()
+
+        threads = len(users)
+        shares = [
+            requests // threads + (1 if i < requests % threads else 0) for i in range(threads)
+        ]
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for future in [
+                executor.submit(client_loop, index, user, share)
+                for index, (user, share) in enumerate(zip(users, shares))
+            ]:
+                future.result()
+        total_time = time.monotonic() - started
+
+        latencies.sort()
+        writes = sum(count for statement, count in queries.items() if statement != "SELECT")
+        self.stdout.write(self.style.MIGRATE_HEADING(engine))
+        self.stdout.write(
+            "Запросов: %d, потоков: %d, время: %.3f c (%.1f запросов/с)"
+            % (requests, threads, total_time, requests / total_time)
+        )
+        self.stdout.write(
+            "Задержка, мс: p50 %.1f, p95 %.1f, max %.1f"
+            % (
+                statistics.median(latencies) * 1000,
+                latencies[int(len(latencies) * 0.95) - 1] * 1000,
+                latencies[-1] * 1000,
+            )
+        )
+        self.stdout.write(
+            "SQL-запросов: %d (%.2f на запрос)" % (total_queries, total_queries / requests)
+        )
+        self.stdout.write(
+            "Сессии (%s): чтений %d (%.2f на запрос), записей %d (%.2f на запрос)"
+            % (
+                ", ".join(tables),
+                queries["SELECT"],
+                queries["SELECT"] / requests,
+                writes,
+                writes / requests,
+            )
+        )
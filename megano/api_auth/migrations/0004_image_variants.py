@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0003_alter_profile_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avatar',
+            name='variants',
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name='Варианты'
+            ),
+        ),
+    ]
@@ -19,6 +19,10 @@ class Avatar(models.Model):
         verbose_name="Ссылка",
     )
     alt = models.CharField(max_length=128, verbose_name="Описание")
+    # Уменьшенные копии (megano.images)
+    variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Варианты"
+    )
 
     class Meta:
         verbose_name = "Аватар"
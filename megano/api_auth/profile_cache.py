@@ -0,0 +1,95 @@
+"""
+Кэш профиля пользователя для чтения.
+
+Шапка сайта запрашивает /api/profile почти на каждой странице, а заказы
+показывают имя, email и телефон покупателя. Данные профиля (id, fullName,
+email, phone, аватар) хранятся в кэше PROFILE_CACHE_ALIAS по id пользователя
+и сбрасываются сигналами при сохранении или удалении Profile, User и Avatar
+(api_auth.signals). Изменения через QuerySet.update() сигналов не вызывают —
+для них нужно вызвать invalidate_profile().
+
+В кэше лежит относительный URL аватара: абсолютный строится из запроса,
+поэтому одна запись годится для любого хоста.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from megano.images import srcset, variant_urls
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+
+def _cache():
+    return caches[settings.PROFILE_CACHE_ALIAS]
+
+
+def _key(user_id) -> str:
+    return f"profile:{user_id}"
+
+
+def _load(user_id) -> dict:
+    profile = Profile.objects.select_related("user", "avatar").get(user_id=user_id)
+    avatar = getattr(profile, "avatar", None)
+    return {
+        "id": profile.pk,
+        "fullName": profile.fullName,
+        "email": profile.user.email,
+        "phone": profile.phone,
+        "avatar": (
+            {"src": avatar.src.url, "alt": avatar.alt, "variants": avatar.variants}
+            if avatar
+            else None
+        ),
+    }
+
+
+def get_profile_data(user) -> dict:
+    """
+    Данные профиля пользователя из кэша. Как и user.profile, выбрасывает
+    Profile.DoesNotExist, если профиля нет
+    """
+    key = _key(user.pk)
+    data = _cache().get(key)
+    if data is None:
+        data = _load(user.pk)
+        _cache().set(key, data, timeout=settings.PROFILE_CACHE_TIMEOUT)
+        logger.debug("Профиль пользователя %s загружен в кэш", user.pk)
+    return data
+
+
+def get_profile_id(user) -> int:
+    return get_profile_data(user)["id"]
+
+
+def render_profile(data, request) -> dict:
+    """Ответ /api/profile (формат ProfileSerializer) из данных кэша"""
+    avatar = data["avatar"]
+    if avatar:
+        variants = variant_urls(avatar["variants"], request)
+        avatar = {
+            "src": request.build_absolute_uri(avatar["src"]),
+            "alt": avatar["alt"],
+            "srcset": srcset(variants),
+            "variants": variants,
+        }
+    return {
+        "avatar": avatar,
+        "email": data["email"],
+        "fullName": data["fullName"],
+        "phone": None if data["phone"] is None else str(data["phone"]),
+    }
+
+
+def invalidate_profile(user_id):
+    """
+    Сбрасывает кэш сразу и ещё раз после фиксации транзакции: иначе
+    параллельный запрос успел бы положить в кэш старые данные до фиксации
+    """
+    key = _key(user_id)
+    _cache().delete(key)
+    transaction.on_commit(lambda: _cache().delete(key))
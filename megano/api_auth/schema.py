@@ -0,0 +1,17 @@
+"""
+Описание схем аутентификации api_auth для drf-spectacular
+"""
+
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+
+
+class AccessTokenScheme(OpenApiAuthenticationExtension):
+    target_class = "api_auth.tokens.AccessTokenAuthentication"
+    name = "accessToken"
+
+    def get_security_definition(self, auto_schema):
+        return {
+            "type": "http",
+            "scheme": "bearer",
+            "description": "Токен доступа из POST /api/token (Authorization: Bearer <токен>)",
+        }
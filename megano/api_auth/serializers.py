@@ -1,10 +1,12 @@
 import json
+import os
 
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from rest_framework import serializers
-from PIL import Image
 
+from megano.images import InvalidImage, normalize_image, srcset, variant_urls
 from .models import Avatar
 
 
@@ -33,6 +35,10 @@ class SignInSerializer(serializers.Serializer):
     password = serializers.CharField(max_length=255)
 
 
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+
 class SignUpSerializer(serializers.Serializer):
     username = serializers.CharField(max_length=255)
     password = serializers.CharField(max_length=255)
@@ -62,9 +68,12 @@ class ProfileSerializer(serializers.Serializer):
         avatar = getattr(obj, "avatar", None)
         if avatar:
             request = self.context.get("request")
+            variants = variant_urls(avatar.variants, request)
             return {
                 "src": request.build_absolute_uri(avatar.src.url),
                 "alt": avatar.alt,
+                "srcset": srcset(variants),
+                "variants": variants,
             }
         return None
 
@@ -91,6 +100,10 @@ class PasswordSerializer(serializers.Serializer):
 
 
 class AvatarUploadSerializer(serializers.ModelSerializer):
+    # Файл проверяет и перекодирует validate_src (ImageField сериализатора
+    # открыл бы изображение ещё раз)
+    src = serializers.FileField()
+
     class Meta:
         model = Avatar
         fields = ["src", "alt"]
@@ -100,12 +113,19 @@ class AvatarUploadSerializer(serializers.ModelSerializer):
         }
 
     def validate_src(self, value):
+        """
+        Аватар уменьшается до AVATAR_SIZE и сохраняется в JPEG без метаданных:
+        размер файла на пользователя ограничен, что бы ни загрузили
+        """
+        if value.size > settings.AVATAR_MAX_UPLOAD_SIZE:
+            raise ValidationError("Файл больше %d МБ" % (settings.AVATAR_MAX_UPLOAD_SIZE // 2**20))
         try:
-            img = Image.open(value)
-            img.verify()  # Проверка целостности изображения
-        except Exception:
-            raise ValidationError("Загруженный файл не является валидным изображением")
-        return value
+            content = normalize_image(value, settings.AVATAR_SIZE, settings.AVATAR_MAX_PIXELS)
+        except InvalidImage as e:
+            raise ValidationError(str(e))
+        stem = os.path.splitext(os.path.basename(value.name))[0] or "avatar"
+        content.name = f"{stem}.jpg"
+        return content
 
     def get_src(self, obj) -> str:
         request = self.context.get("request")
@@ -0,0 +1,51 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from megano.images import delete_variants, schedule_variants
+from .models import Avatar, Profile
+from .profile_cache import invalidate_profile
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """
+    В кэше профиля из User только email; вход (last_login) и смена пароля
+    сохраняют User с update_fields и кэш не сбрасывают
+    """
+    if update_fields is not None and "email" not in update_fields:
+        return
+    invalidate_profile(instance.pk)
+
+
+@receiver(post_save, sender=Avatar)
+@receiver(post_delete, sender=Avatar)
+def avatar_changed(sender, instance, **kwargs):
+    if Avatar.profile.is_cached(instance):
+        user_id = instance.profile.user_id
+    else:
+        user_id = (
+            Profile.objects.filter(pk=instance.profile_id).values_list("user_id", flat=True).first()
+        )
+    if user_id is not None:
+        invalidate_profile(user_id)
+
+
+@receiver(post_save, sender=Avatar)
+def build_avatar_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_variants(instance)
+
+
+@receiver(post_delete, sender=Avatar)
+def delete_avatar_variants(sender, instance, **kwargs):
+    storage = instance.src.storage
+    transaction.on_commit(lambda: delete_variants(storage, instance.variants))
@@ -1,3 +1,403 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import path, reverse
+from PIL import Image, ImageFile
+
+from api_product.models import Category, Product
+from api_transaction.models import Basket, StockReservation
+from api_transaction.storage import CacheBasketStorage
+from megano.sessions import SessionStore
+from . import async_views, hashing
+from .models import Avatar, Profile
+
+# Маршруты асинхронных представлений для AsyncAuthViewsTestCase
+urlpatterns = [
+    path("sign-in", async_views.sign_in),
+    path("sign-up", async_views.sign_up),
+    path("password", async_views.change_password),
+]
+
+
+class SignInBasketMergeTestCase(TestCase):
+    """
+    Гостевая корзина переносится в корзину пользователя при входе
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="secret-pass-123")
+        Profile.objects.create(user=cls.user, fullName="Buyer")
+        category = Category.objects.create(title="Electronics")
+        cls.phone = Product.objects.create(category=category, title="Phone", count=5)
+        cls.laptop = Product.objects.create(category=category, title="Laptop", count=3)
+        cls.hidden = Product.objects.create(category=category, title="Hidden", count=3)
+
+    def setUp(self):
+        caches[settings.BASKET_CACHE_ALIAS].clear()
+
+    def sign_in(self):
+        payload = json.dumps({"username": "buyer", "password": "secret-pass-123"})
+        return self.client.post(
+            reverse("api_auth:login"),
+            urlencode({payload: ""}),
+            content_type="application/x-www-form-urlencoded",
+        )
+
+    def test_guest_basket_is_merged_on_sign_in(self):
+        Basket.objects.create(user=self.user, product=self.phone, count=1)
+        basket_url = reverse("api_transaction:basket")
+        for product, count in ((self.phone, 2), (self.laptop, 3), (self.hidden, 1)):
+            self.client.post(
+                basket_url, {"id": product.id, "count": count}, content_type="application/json"
+            )
+        Product.objects.filter(pk=self.hidden.pk).update(available=False)
+        # Остаток ноутбуков частично зарезервирован другим покупателем
+        Product.objects.filter(pk=self.laptop.pk).update(count=4)
+        StockReservation.objects.create(
+            owner="u999", product=self.laptop, quantity=2, expires_at="2100-01-01T00:00Z"
+        )
+        Product.objects.filter(pk=self.laptop.pk).update(reserved=5)
+
+        response = self.sign_in()
+
+        self.assertEqual(response.status_code, 201)
+        CacheBasketStorage.flush_all()
+        counts = dict(Basket.objects.filter(user=self.user).values_list("product_id", "count"))
+        self.assertEqual(counts, {self.phone.id: 3, self.laptop.id: 2})
+        owners = set(StockReservation.objects.values_list("owner", flat=True))
+        self.assertEqual(owners, {f"u{self.user.pk}", "u999"})
+        self.assertEqual(self.client.get(basket_url).data[0]["count"], 3)
+
+
+@override_settings(
+    RATE_LIMITS={**settings.RATE_LIMITS, "sign-in:username": (3, 60), "basket": (2, 60)}
+)
+class RateLimitTestCase(TestCase):
+    """
+    Лимиты попыток входа проверяются до хэширования пароля
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="secret-pass-123")
+        Profile.objects.create(user=cls.user, fullName="Buyer")
+
+    def setUp(self):
+        caches[settings.RATE_LIMIT_CACHE_ALIAS].clear()
+        # Часы лимитера стоят на месте: запросы теста не пересекают границу окна,
+        # иначе доля предыдущего окна уменьшается и лимит срабатывает не всегда
+        clock = mock.patch("api_auth.throttling.time")
+        clock.start().time.return_value = 1_000_000.0
+        self.addCleanup(clock.stop)
+
+    def sign_in(self, password):
+        payload = json.dumps({"username": "buyer", "password": password})
+        return self.client.post(
+            reverse("api_auth:login"),
+            urlencode({payload: ""}),
+            content_type="application/x-www-form-urlencoded",
+        )
+
+    def test_failed_sign_ins_lock_username_before_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.sign_in("wrong").status_code, 401)
+
+        with mock.patch("api_auth.views.authenticate") as authenticate:
+            response = self.sign_in("secret-pass-123")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response.headers["Retry-After"]), 0)
+        authenticate.assert_not_called()
+
+    def test_successful_sign_in_resets_failures(self):
+        self.sign_in("wrong")
+        self.sign_in("wrong")
+        self.assertEqual(self.sign_in("secret-pass-123").status_code, 201)
+        self.assertEqual(self.sign_in("wrong").status_code, 401)
+
+    def test_basket_throttle(self):
+        url = reverse("api_transaction:basket")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+
+
+@override_settings(ROOT_URLCONF="api_auth.tests")
+class AsyncAuthViewsTestCase(TestCase):
+    """
+    Асинхронные вход, регистрация и смена пароля с хэшированием в пуле
+    """
+
+    def setUp(self):
+        caches[settings.RATE_LIMIT_CACHE_ALIAS].clear()
+
+    def post_form(self, url, data):
+        return self.client.post(
+            url, urlencode({json.dumps(data): ""}), content_type="application/x-www-form-urlencoded"
+        )
+
+    def test_sign_up_sign_in_and_change_password(self):
+        credentials = {"username": "buyer", "password": "secret-pass-123"}
+        self.assertEqual(
+            self.post_form("/sign-up", {**credentials, "name": "Buyer"}).status_code, 201
+        )
+        user = User.objects.get(username="buyer")
+        self.assertEqual(user.profile.fullName, "Buyer")
+        self.assertTrue(user.check_password("secret-pass-123"))
+        self.client.logout()
+
+        self.assertEqual(
+            self.post_form("/sign-in", {**credentials, "password": "x"}).status_code, 401
+        )
+        self.assertEqual(self.post_form("/sign-in", credentials).status_code, 201)
+
+        response = self.client.post(
+            "/password",
+            {"currentPassword": "secret-pass-123", "newPassword": "another-pass-456"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password("another-pass-456"))
+
+    def test_full_hashing_queue_rejects_sign_in(self):
+        _, slots = hashing.get_pool()
+        size = settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE
+        for _ in range(size):
+            slots.acquire(blocking=False)
+        try:
+            response = self.post_form("/sign-in", {"username": "buyer", "password": "x"})
+        finally:
+            for _ in range(size):
+                slots.release()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+
+class SessionStoreTestCase(TestCase):
+    """
+    Сессия записывается, только если её данные изменились
+    """
+
+    def setUp(self):
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+
+    def test_unchanged_session_is_not_saved(self):
+        session = SessionStore()
+        session["basket"] = {"1": {"count": 2}}
+        session.save()
+
+        session = SessionStore(session.session_key)
+        session["basket"] = {"1": {"count": 2}}
+        with self.assertNumQueries(0):
+            session.save()
+
+        session["basket"] = {"1": {"count": 3}}
+        session.save()
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+        self.assertEqual(SessionStore(session.session_key)["basket"], {"1": {"count": 3}})
+
+
+# Общий кэш (профили, лимиты запросов) вне БД, как Redis в production
+@override_settings(
+    CACHES={
+        **settings.CACHES,
+        "shared": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-shared",
+        },
+    }
+)
+class TokenAuthTestCase(TestCase):
+    """
+    Токены доступа проверяются без сессии и без чтения пользователя из базы
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="buyer", password="secret-pass-123", email="buyer@example.com"
+        )
+        Profile.objects.create(user=cls.user, fullName="Buyer", phone="+70000000000")
+
+    def setUp(self):
+        caches["shared"].clear()
+
+    def obtain(self, password="secret-pass-123"):
+        return self.client.post(
+            reverse("api_auth:token"),
+            {"username": "buyer", "password": password},
+            content_type="application/json",
+        )
+
+    def bearer(self, token):
+        return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def test_access_token_authenticates_without_session(self):
+        self.assertEqual(self.obtain("wrong").status_code, 401)
+        tokens = self.obtain().data
+
+        # Один запрос — профиль; ни сессии, ни пользователя отдельно
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("api_auth:profile"), **self.bearer(tokens["access"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["fullName"], "Buyer")
+        self.assertNotIn("sessionid", response.cookies)
+
+        response = self.client.get(reverse("api_auth:profile"), **self.bearer("broken"))
+        self.assertEqual(response.status_code, 401)
+        with override_settings(ACCESS_TOKEN_TTL=-1):
+            response = self.client.get(reverse("api_auth:profile"), **self.bearer(tokens["access"]))
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_revokes_refresh_token(self):
+        tokens = self.obtain().data
+        refresh_url = reverse("api_auth:token-refresh")
+        response = self.client.post(
+            refresh_url, {"refresh": tokens["refresh"]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.data)
+
+        response = self.client.post(
+            reverse("api_auth:password"),
+            {"currentPassword": "secret-pass-123", "newPassword": "another-pass-456"},
+            content_type="application/json",
+            **self.bearer(tokens["access"]),
+        )
+        self.assertEqual(response.status_code, 200)
+        # Сохранены только загруженные поля: email не затёрт
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("another-pass-456"))
+        self.assertEqual(self.user.email, "buyer@example.com")
+
+        response = self.client.post(
+            refresh_url, {"refresh": tokens["refresh"]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_bearer_scheme_in_openapi_schema(self):
+        response = self.client.get(reverse("schema"), {"format": "json"})
+        schema = json.loads(response.content)
+        scheme = schema["components"]["securitySchemes"]["accessToken"]
+        self.assertEqual((scheme["type"], scheme["scheme"]), ("http", "bearer"))
+        security = schema["paths"]["/api/profile"]["get"]["security"]
+        self.assertIn({"accessToken": []}, security)
+
+
+class ProfileCacheTestCase(TestCase):
+    """
+    Профиль читается из кэша и сбрасывается при сохранении Profile, User и Avatar
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.profile = Profile.objects.create(user=cls.user, fullName="Buyer", phone=70000000000)
+
+    def setUp(self):
+        caches[settings.PROFILE_CACHE_ALIAS].clear()
+        self.client.force_login(self.user)
+        self.url = reverse("api_auth:profile")
+
+    def test_profile_is_cached_and_invalidated(self):
+        self.assertEqual(self.client.get(self.url).data["phone"], "70000000000")
+        # сессия из таблицы кэша сессий, её пользователь и профиль из таблицы общего кэша
+        with self.assertNumQueries(3):
+            data = self.client.get(self.url).data
+        self.assertEqual(data["email"], "buyer@example.com")
+        self.assertIsNone(data["avatar"])
+
+        self.client.post(
+            self.url,
+            {"email": "new@example.com", "fullName": "New Name", "phone": "71111111111"},
+            content_type="application/json",
+        )
+        data = self.client.get(self.url).data
+        self.assertEqual(
+            (data["email"], data["fullName"], data["phone"]),
+            ("new@example.com", "New Name", "71111111111"),
+        )
+
+        Avatar.objects.create(profile=self.profile, src="avatars/a.png", alt="Me")
+        data = self.client.get(self.url).data
+        self.assertEqual(data["avatar"]["src"], "http://testserver/media/avatars/a.png")
+
+        # вход сохраняет только last_login — кэш профиля остаётся
+        self.client.force_login(self.user)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+
+class AvatarUploadTestCase(TestCase):
+    """
+    Аватар проверяется по заголовку, уменьшается и сохраняется без метаданных
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer")
+        Profile.objects.create(user=cls.user, fullName="Buyer")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.user)
+
+    def upload(self, content, name="photo.png"):
+        return self.client.post(
+            reverse("api_auth:avatar"), {"avatar": SimpleUploadedFile(name, content)}
+        )
+
+    def image(self, size, fmt="PNG", **options) -> bytes:
+        buffer = BytesIO()
+        Image.new("RGB", size, "green").save(buffer, fmt, **options)
+        return buffer.getvalue()
+
+    def test_avatar_is_downscaled_and_replaced(self):
+        exif = Image.Exif()
+        exif[0x010E] = "secret description"
+        content = self.image((2000, 1000), "JPEG", exif=exif.tobytes())
+        self.assertEqual(self.upload(content, "me.jpeg").status_code, 200)
+
+        avatar = Avatar.objects.get(profile__user=self.user)
+        self.assertTrue(avatar.src.name.endswith("/me.jpg"))
+        with default_storage.open(avatar.src.name) as file:
+            stored = Image.open(file)
+            self.assertEqual((stored.format, stored.size), ("JPEG", (512, 256)))
+            self.assertFalse(stored.getexif())
+        first = avatar.src.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.upload(self.image((300, 300))).status_code, 200)
+        avatar.refresh_from_db()
+        self.assertNotEqual(avatar.src.name, first)
+        self.assertFalse(default_storage.exists(first))
+
+    @override_settings(AVATAR_MAX_PIXELS=100 * 100)
+    def test_oversized_and_invalid_uploads_are_rejected(self):
+        content = self.image((200, 200))
+        with mock.patch.object(ImageFile.ImageFile, "load") as load:
+            response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        load.assert_not_called()
+
+        self.assertEqual(self.upload(b"not an image", "photo.jpg").status_code, 400)
+        self.assertFalse(Avatar.objects.exists())
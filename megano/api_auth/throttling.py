@@ -0,0 +1,105 @@
+"""
+Ограничение частоты запросов со скользящим окном в кэше.
+
+Лимиты задаются настройкой RATE_LIMITS: {область: (запросов, окно в секундах)}.
+Счётчик хранится в двух соседних фиксированных окнах; число запросов за
+последние window секунд оценивается как текущее окно плюс доля предыдущего,
+ещё попадающая в скользящее окно. Это два ключа кэша на клиента вместо
+списка отметок времени.
+
+Вход, регистрация и смена пароля проверяют лимиты до хэширования пароля,
+поэтому перебор паролей упирается в кэш, а не в PBKDF2. Для остальных
+представлений есть DRF-троттлинг ScopedSlidingWindowThrottle.
+"""
+
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowLimiter:
+    """Лимит limit событий за window секунд для каждого идентификатора"""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.limit, self.window = settings.RATE_LIMITS[scope]
+        self.cache = caches[settings.RATE_LIMIT_CACHE_ALIAS]
+
+    def _keys(self, ident, now) -> tuple:
+        index = int(now // self.window)
+        prefix = f"ratelimit:{self.scope}:{ident}"
+        return f"{prefix}:{index}", f"{prefix}:{index - 1}", now % self.window
+
+    def retry_after(self, ident, now=None) -> int:
+        """
+        Секунды до следующей разрешённой попытки (0 — лимит не исчерпан)
+        """
+        now = time.time() if now is None else now
+        current_key, previous_key, elapsed = self._keys(ident, now)
+        counts = self.cache.get_many([current_key, previous_key])
+        current = counts.get(current_key, 0)
+        previous = counts.get(previous_key, 0)
+        if current + previous * (1 - elapsed / self.window) < self.limit:
+            return 0
+        if current >= self.limit:
+            return max(1, math.ceil(self.window - elapsed))
+        # Момент, когда доля предыдущего окна уменьшится достаточно
+        wait = (1 - (self.limit - current) / previous) * self.window - elapsed
+        return max(1, math.ceil(wait))
+
+    def hit(self, ident, now=None) -> int:
+        """
+        Учитывает событие, если лимит не исчерпан. Возвращает 0 при успехе или
+        секунды до следующей разрешённой попытки
+        """
+        now = time.time() if now is None else now
+        wait = self.retry_after(ident, now)
+        if wait:
+            logger.warning("Превышен лимит %s для %s", self.scope, ident)
+            return wait
+        current_key, _, _ = self._keys(ident, now)
+        # Ключ живёт два окна: пока он нужен как «предыдущее» окно
+        self.cache.add(current_key, 0, timeout=self.window * 2)
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # ключ вытеснили между add и incr
+            self.cache.set(current_key, 1, timeout=self.window * 2)
+        return 0
+
+    def reset(self, ident, now=None):
+        now = time.time() if now is None else now
+        current_key, previous_key, _ = self._keys(ident, now)
+        self.cache.delete_many([current_key, previous_key])
+
+
+def client_ip(request) -> str:
+    """IP клиента с учётом NUM_PROXIES (как во встроенном троттлинге DRF)"""
+    return BaseThrottle().get_ident(request)
+
+
+class ScopedSlidingWindowThrottle(BaseThrottle):
+    """
+    DRF-троттлинг по области view.throttle_scope из RATE_LIMITS: пользователи
+    считаются по id, гости — по IP
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if not scope:
+            return True
+        if request.user and request.user.is_authenticated:
+            ident = f"user-{request.user.pk}"
+        else:
+            ident = f"ip-{self.get_ident(request)}"
+        self.wait_seconds = SlidingWindowLimiter(scope).hit(ident)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
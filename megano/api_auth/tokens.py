@@ -0,0 +1,89 @@
+"""
+Подписанные токены доступа для мобильных и интеграционных клиентов /api/.
+
+Токен доступа (ACCESS_TOKEN_TTL секунд) подписан SECRET_KEY и содержит id и
+username пользователя, поэтому AccessTokenAuthentication проверяет подпись и
+срок без обращения к базе и сессии. Пользователь создаётся с отложенными
+полями: остальные поля User и request.user.profile загружаются из базы, только
+если представление к ним обращается.
+
+Токен обновления (REFRESH_TOKEN_TTL секунд) обменивается на новую пару и при
+этом проверяется по базе: активен ли пользователь и не сменился ли пароль.
+Отозвать выданный токен доступа нельзя, поэтому его срок короткий.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+ACCESS_SALT = "api_auth.tokens.access"
+REFRESH_SALT = "api_auth.tokens.refresh"
+KEYWORD = b"bearer"
+
+
+class InvalidToken(Exception):
+    """Подпись не сошлась, срок истёк или пользователь больше не может войти"""
+
+
+def _password_fingerprint(user) -> str:
+    # После смены пароля выданные токены обновления перестают действовать
+    return salted_hmac(REFRESH_SALT, user.password).hexdigest()[:16]
+
+
+def issue_tokens(user) -> dict:
+    """Пара токенов для пользователя, прошедшего аутентификацию"""
+    return {
+        "access": signing.dumps({"u": user.pk, "n": user.username}, salt=ACCESS_SALT),
+        "refresh": signing.dumps(
+            {"u": user.pk, "p": _password_fingerprint(user)}, salt=REFRESH_SALT
+        ),
+        "tokenType": "Bearer",
+        "expiresIn": settings.ACCESS_TOKEN_TTL,
+    }
+
+
+def refresh_tokens(token) -> dict:
+    """Новая пара токенов в обмен на действующий токен обновления"""
+    try:
+        claims = signing.loads(token, salt=REFRESH_SALT, max_age=settings.REFRESH_TOKEN_TTL)
+    except signing.BadSignature as e:
+        raise InvalidToken(str(e))
+    user = User.objects.filter(pk=claims["u"], is_active=True).first()
+    if user is None or not constant_time_compare(claims["p"], _password_fingerprint(user)):
+        raise InvalidToken("Пользователь не найден или сменил пароль")
+    return issue_tokens(user)
+
+
+def token_user(claims) -> User:
+    """
+    Пользователь из токена без запроса к базе: загружены только id и username,
+    остальные поля отложены (как у QuerySet.only). save() такого объекта
+    записывает только загруженные и изменённые поля
+    """
+    values = {"id": claims["u"], "username": claims["n"]}
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in values]
+    return User.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+class AccessTokenAuthentication(BaseAuthentication):
+    """Заголовок Authorization: Bearer <токен доступа>"""
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != KEYWORD:
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Неверный заголовок Authorization")
+        try:
+            token = auth[1].decode()
+            claims = signing.loads(token, salt=ACCESS_SALT, max_age=settings.ACCESS_TOKEN_TTL)
+        except (UnicodeError, signing.BadSignature):
+            raise exceptions.AuthenticationFailed("Токен недействителен или истёк")
+        return token_user(claims), token
+
+    def authenticate_header(self, request):
+        return "Bearer"
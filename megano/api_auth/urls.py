@@ -1,14 +1,34 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import SignInView, SignUpView, SignOutView, ProfileView, ChangePasswordView, ProfileAvatarUpdateView
+from . import async_views
+from .views import (
+    SignInView,
+    SignUpView,
+    SignOutView,
+    ProfileView,
+    ChangePasswordView,
+    ProfileAvatarUpdateView,
+)
+from .views import TokenObtainView, TokenRefreshView
 
 app_name = "api_auth"
 
+if settings.AUTH_ASYNC_VIEWS:
+    # Под ASGI хэширование паролей уходит в ограниченный пул (api_auth.hashing)
+    sign_in, sign_up = async_views.sign_in, async_views.sign_up
+    change_password = async_views.change_password
+else:
+    sign_in, sign_up = SignInView.as_view(), SignUpView.as_view()
+    change_password = ChangePasswordView.as_view()
+
 urlpatterns = [
-    path("sign-in", SignInView.as_view(), name="login"),
-    path("sign-up", SignUpView.as_view(), name="register"),
+    path("sign-in", sign_in, name="login"),
+    path("sign-up", sign_up, name="register"),
+    path("token", TokenObtainView.as_view(), name="token"),
+    path("token/refresh", TokenRefreshView.as_view(), name="token-refresh"),
     path("sign-out", SignOutView.as_view(), name="logout"),
     path("profile", ProfileView.as_view(), name="profile"),
-    path("profile/password", ChangePasswordView.as_view(), name="password"),
+    path("profile/password", change_password, name="password"),
     path("profile/avatar", ProfileAvatarUpdateView.as_view(), name="avatar"),
 ]
@@ -10,7 +10,10 @@ from rest_framework.views import APIView
 
 from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResponse
 
+from api_transaction.storage import merge_guest_basket, take_guest_basket
 from .models import Profile
+from .profile_cache import get_profile_data, render_profile
+from .throttling import SlidingWindowLimiter, client_ip
 from .serializers import (
     SignInSerializer,
     SignUpSerializer,
@@ -18,12 +21,23 @@ from .serializers import (
     ProfileSerializer,
     PasswordSerializer,
     AvatarUploadSerializer,
+    TokenRefreshSerializer,
 )
+from .tokens import InvalidToken, issue_tokens, refresh_tokens
 
 
 logger = logging.getLogger(__name__)
 
 
+def rate_limited(wait) -> Response:
+    """Ответ 429 с Retry-After — попытка отклонена до хэширования пароля"""
+    return Response(
+        {"detail": "Слишком много попыток, повторите позже"},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(wait)},
+    )
+
+
 @extend_schema(tags=["auth"])
 class SignUpView(APIView):
     serializer_class = SignUpSerializer
@@ -48,6 +62,9 @@ class SignUpView(APIView):
                 name = serializer.validated_data["name"]
                 username = serializer.validated_data["username"]
                 password = serializer.validated_data["password"]
+                wait = SlidingWindowLimiter("sign-up:ip").hit(client_ip(request))
+                if wait:
+                    return rate_limited(wait)
                 if User.objects.filter(username=username).exists():
                     return Response(
                         {"detail": "Пользователь с таким username уже существует"},
@@ -60,7 +77,9 @@ class SignUpView(APIView):
                     Profile.objects.create(user=user, fullName=name)
                     user = authenticate(request, username=username, password=password)
                     if user is not None:
+                        guest_basket = take_guest_basket(request)
                         login(request, user)
+                        merge_guest_basket(request, guest_basket)
                     logger.info(
                         f"User created: {username}", extra={"tags": ["registration"]}
                     )
@@ -109,12 +128,23 @@ class SignInView(APIView):
             if serializer.is_valid():
                 username = serializer.validated_data.get("username")
                 password = serializer.validated_data.get("password")
+                # Лимит по IP учитывает все попытки, по имени — только неудачные
+                failures = SlidingWindowLimiter("sign-in:username")
+                wait = SlidingWindowLimiter("sign-in:ip").hit(
+                    client_ip(request)
+                ) or failures.retry_after(username.lower())
+                if wait:
+                    return rate_limited(wait)
                 user = authenticate(request, username=username, password=password)
                 if user is not None:
+                    failures.reset(username.lower())
+                    guest_basket = take_guest_basket(request)
                     login(request, user)
+                    merge_guest_basket(request, guest_basket)
                     logger.info(f"User logged in: {username}", extra={"tags": ["auth"]})
                     return Response(status=status.HTTP_201_CREATED)
                 else:
+                    failures.hit(username.lower())
                     logger.warning(
                         "Authentication failed",
                         extra={"tags": ["auth_failed"], "username": username},
@@ -139,6 +169,81 @@ class SignInView(APIView):
             )
 
 
+@extend_schema(tags=["auth"])
+class TokenObtainView(APIView):
+    """
+    Токены для клиентов без cookie (api_auth.tokens): JSON-тело, без сессии
+    """
+
+    authentication_classes = []
+    serializer_class = SignInSerializer
+
+    @extend_schema(
+        request=SignInSerializer,
+        responses={
+            200: OpenApiResponse(description="access и refresh токены", response=None),
+            400: OpenApiResponse(description="Validation error", response=None),
+            401: OpenApiResponse(description="Authentication failed", response=None),
+        },
+        description="Выдача токена доступа (Authorization: Bearer) и токена обновления",
+    )
+    def post(self, request: Request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        username = serializer.validated_data["username"]
+        password = serializer.validated_data["password"]
+        # Те же лимиты, что у входа по сессии
+        failures = SlidingWindowLimiter("sign-in:username")
+        wait = SlidingWindowLimiter("sign-in:ip").hit(
+            client_ip(request)
+        ) or failures.retry_after(username.lower())
+        if wait:
+            return rate_limited(wait)
+        user = authenticate(request, username=username, password=password)
+        if user is None:
+            failures.hit(username.lower())
+            logger.warning(
+                "Token authentication failed",
+                extra={"tags": ["auth_failed"], "username": username},
+            )
+            return Response(
+                {"detail": "Authentication failed"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        failures.reset(username.lower())
+        logger.info(f"Token issued: {username}", extra={"tags": ["auth"]})
+        return Response(issue_tokens(user))
+
+
+@extend_schema(tags=["auth"])
+class TokenRefreshView(APIView):
+    authentication_classes = []
+    serializer_class = TokenRefreshSerializer
+
+    @extend_schema(
+        request=TokenRefreshSerializer,
+        responses={
+            200: OpenApiResponse(description="Новая пара токенов", response=None),
+            401: OpenApiResponse(description="Invalid refresh token", response=None),
+        },
+        description="Обмен токена обновления на новую пару токенов",
+    )
+    def post(self, request: Request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tokens = refresh_tokens(serializer.validated_data["refresh"])
+        except InvalidToken as e:
+            logger.warning("Token refresh failed: %s", e, extra={"tags": ["auth_failed"]})
+            return Response(
+                {"detail": "Токен обновления недействителен"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        return Response(tokens)
+
+
 @extend_schema(tags=["auth"])
 @extend_schema_view(
     post=extend_schema(
@@ -166,13 +271,10 @@ class ProfileView(APIView):
         description="Получение профиля пользователя",
     )
     def get(self, request):
-        profile = (
-            Profile.objects.select_related("user", "avatar")
-            .get(user=request.user)
-        )
-        serializer = self.serializer_class(profile, context={"request": request})
-        logger.debug("GET profile data: %s", serializer.data)
-        return Response(serializer.data)
+        # Шапка сайта запрашивает профиль на каждой странице — данные из кэша
+        data = render_profile(get_profile_data(request.user), request)
+        logger.debug("GET profile data: %s", data)
+        return Response(data)
 
     @extend_schema(
         request=ProfileSerializer,
@@ -241,6 +343,10 @@ class ChangePasswordView(APIView):
         description="Изменение пароля пользователя",
     )
     def post(self, request):
+        # currentPassword проверяется в сериализаторе — лимит раньше хэширования
+        wait = SlidingWindowLimiter("password:user").hit(request.user.pk)
+        if wait:
+            return rate_limited(wait)
         serializer = self.serializer_class(
             data=request.data, context={"request": request}
         )
@@ -301,6 +407,7 @@ class ProfileAvatarUpdateView(APIView):
 
             logger.debug("Serializer validated data: %s", serializer.validated_data)
             if avatar:
+                # Прежний файл после фиксации удаляет django_cleanup
                 avatar.src = serializer.validated_data["src"]
                 avatar.alt = serializer.validated_data["alt"]
                 avatar.save()
@@ -0,0 +1,21 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "queue", "priority", "status", "attempts", "run_at", "locked_by")
+    list_filter = ("status", "queue")
+    search_fields = ("name", "key")
+    ordering = ("-id",)
+    readonly_fields = ("attempts", "locked_by", "locked_at", "created_at", "finished_at")
+    actions = ["retry"]
+
+    @admin.action(description="Повторить выбранные задачи")
+    def retry(self, request, queryset):
+        count = queryset.exclude(status=Job.Status.RUNNING).update(
+            status=Job.Status.QUEUED, attempts=0, run_at=timezone.now(), locked_by=""
+        )
+        self.message_user(request, f"Поставлено в очередь: {count}")
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class ApiJobConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api_job'
+    verbose_name = "Фоновые задачи"
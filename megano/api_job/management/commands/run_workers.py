@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import signal
+import socket
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+
+from api_job.queue import purge_finished, requeue_stale, work
+
+
+def _worker_id(index) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def _worker(index, queues, burst, stop):
+    # Дочерний процесс не должен использовать соединения родителя
+    connections.close_all()
+    # Ctrl+C получает родитель и останавливает обработчики через stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        work(_worker_id(index), queues, burst=burst, should_stop=stop.is_set)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """
+    Запускает обработчики фоновых задач (api_job.queue) в --processes процессах.
+    Ctrl+C или SIGTERM останавливает обработчики после текущей задачи.
+    """
+
+    help = "Run background job workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=2, help="Количество процессов-обработчиков"
+        )
+        parser.add_argument(
+            "--queues",
+            default="",
+            help="Очереди через запятую (по умолчанию — все)",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Завершиться, когда готовых задач не останется",
+        )
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        queues = [queue for queue in options["queues"].split(",") if queue]
+        burst = options["burst"]
+        if processes <= 0:
+            self.stdout.write(self.style.ERROR("--processes должен быть больше 0"))
+            return
+
+        requeue_stale()
+        purged = purge_finished(settings.JOB_RETENTION_DAYS)
+        self.stdout.write(
+            "Обработчиков: %d, очереди: %s, удалено старых задач: %d"
+            % (processes, ", ".join(queues) or "все", purged)
+        )
+
+        if processes == 1:
+            try:
+                work(_worker_id(0), queues, burst=burst)
+            except KeyboardInterrupt:
+                pass
+            self.stdout.write(self.style.SUCCESS("Workers stopped."))
+            return
+
+        # fork: дочерние процессы наследуют настроенный Django
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        connections.close_all()
+        workers = [
+            context.Process(target=_worker, args=(index, queues, burst, stop), daemon=True)
+            for index in range(processes)
+        ]
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        for process in workers:
+            process.start()
+        try:
+            for process in workers:
+                process.join()
+        except KeyboardInterrupt:
+            stop.set()
+            for process in workers:
+                process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped."))
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                (
+                    'queue',
+                    models.CharField(default='default', max_length=64, verbose_name='Очередь'),
+                ),
+                ('name', models.CharField(max_length=255, verbose_name='Функция')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='Аргументы')),
+                (
+                    'kwargs',
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name='Именованные аргументы'
+                    ),
+                ),
+                (
+                    'key',
+                    models.CharField(
+                        blank=True,
+                        db_index=True,
+                        help_text='Задача не ставится повторно, пока в очереди есть задача с тем же ключом',
+                        max_length=255,
+                        verbose_name='Ключ',
+                    ),
+                ),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Приоритет')),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('queued', 'В очереди'),
+                            ('running', 'Выполняется'),
+                            ('done', 'Выполнена'),
+                            ('failed', 'Ошибка'),
+                        ],
+                        default='queued',
+                        max_length=16,
+                        verbose_name='Статус',
+                    ),
+                ),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                (
+                    'max_attempts',
+                    models.PositiveSmallIntegerField(default=3, verbose_name='Максимум попыток'),
+                ),
+                ('run_at', models.DateTimeField(verbose_name='Выполнить не раньше')),
+                (
+                    'locked_by',
+                    models.CharField(blank=True, max_length=64, verbose_name='Обработчик'),
+                ),
+                (
+                    'locked_at',
+                    models.DateTimeField(blank=True, null=True, verbose_name='Взята в работу'),
+                ),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                (
+                    'finished_at',
+                    models.DateTimeField(blank=True, null=True, verbose_name='Завершена'),
+                ),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+                'indexes': [
+                    models.Index(
+                        fields=['status', 'queue', '-priority', 'run_at'],
+                        name='api_job_job_status_463675_idx',
+                    )
+                ],
+            },
+        ),
+    ]
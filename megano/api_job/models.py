@@ -0,0 +1,48 @@
+from django.db import models
+
+
+class Job(models.Model):
+    """
+    Фоновая задача в очереди (см. api_job.queue)
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "В очереди"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Выполнена"
+        FAILED = "failed", "Ошибка"
+
+    queue = models.CharField(max_length=64, default="default", verbose_name="Очередь")
+    name = models.CharField(max_length=255, verbose_name="Функция")
+    args = models.JSONField(default=list, blank=True, verbose_name="Аргументы")
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name="Именованные аргументы")
+    key = models.CharField(
+        max_length=255,
+        blank=True,
+        db_index=True,
+        verbose_name="Ключ",
+        help_text="Задача не ставится повторно, пока в очереди есть задача с тем же ключом",
+    )
+    priority = models.SmallIntegerField(default=0, verbose_name="Приоритет")
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.QUEUED, verbose_name="Статус"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name="Максимум попыток")
+    run_at = models.DateTimeField(verbose_name="Выполнить не раньше")
+    locked_by = models.CharField(max_length=64, blank=True, verbose_name="Обработчик")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взята в работу")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+
+    class Meta:
+        indexes = [
+            # Выбор следующей задачи: очередь, приоритет, время запуска
+            models.Index(fields=["status", "queue", "-priority", "run_at"]),
+        ]
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
@@ -0,0 +1,225 @@
+"""
+Очередь фоновых задач в основной базе данных.
+
+Задача — функция модуля, объявленная декоратором @job. Вызов
+func.delay(*args) (или func.enqueue(...)) записывает строку Job в текущей
+транзакции, поэтому задача видна обработчикам только после фиксации и не
+теряется при откате. Аргументы должны сериализоваться в JSON.
+
+Обработчики (команда run_workers) забирают задачи по приоритету и времени
+запуска: на PostgreSQL/MySQL — SELECT ... FOR UPDATE SKIP LOCKED, на SQLite —
+условным UPDATE по статусу, который выигрывает только один обработчик.
+Упавшая задача повторяется с экспоненциальной задержкой до max_attempts раз.
+Лимит одновременно выполняемых задач очереди задаётся в JOB_QUEUES.
+
+При JOB_QUEUE_EAGER = True задачи выполняются сразу в вызывающем потоке.
+"""
+
+import functools
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = 60 * 60
+
+
+class Task:
+    """Функция, которую можно поставить в очередь (см. job)"""
+
+    def __init__(self, func, queue, priority, max_attempts):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.queue = queue
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.enqueue(args, kwargs)
+
+    def enqueue(self, args=(), kwargs=None, key="", countdown=0, priority=None):
+        """
+        Ставит задачу в очередь. key — задача не ставится, если задача с тем же
+        ключом уже ждёт выполнения; countdown — задержка запуска, секунды
+        """
+        if settings.JOB_QUEUE_EAGER:
+            self.func(*args, **(kwargs or {}))
+            return None
+        if key and Job.objects.filter(key=key, status=Job.Status.QUEUED).exists():
+            return None
+        return Job.objects.create(
+            queue=self.queue,
+            name=self.name,
+            args=list(args),
+            kwargs=kwargs or {},
+            key=key,
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=countdown),
+        )
+
+
+def job(queue="default", priority=0, max_attempts=3):
+    """Объявляет функцию фоновой задачей"""
+
+    def decorator(func):
+        return Task(func, queue, priority, max_attempts)
+
+    return decorator
+
+
+def _full_queues() -> list:
+    """Очереди, достигшие лимита одновременно выполняемых задач (JOB_QUEUES)"""
+    limits = {
+        queue: options["concurrency"]
+        for queue, options in settings.JOB_QUEUES.items()
+        if options.get("concurrency")
+    }
+    if not limits:
+        return []
+    running = dict(
+        Job.objects.filter(status=Job.Status.RUNNING, queue__in=list(limits))
+        .order_by()
+        .values("queue")
+        .annotate(count=Count("id"))
+        .values_list("queue", "count")
+    )
+    return [queue for queue, limit in limits.items() if running.get(queue, 0) >= limit]
+
+
+def claim_job(worker_id, queues=None):
+    """
+    Забирает следующую готовую к запуску задачу или возвращает None.
+    Лимиты очередей проверяются перед захватом, поэтому при гонке могут
+    быть ненадолго превышены на число обработчиков
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now).exclude(
+        queue__in=_full_queues()
+    )
+    if queues:
+        candidates = candidates.filter(queue__in=queues)
+    candidates = candidates.order_by("-priority", "run_at", "id")
+    claimed = {
+        "status": Job.Status.RUNNING,
+        "locked_by": worker_id,
+        "locked_at": now,
+        "attempts": F("attempts") + 1,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pk = candidates.select_for_update(skip_locked=True).values_list("pk", flat=True).first()
+            if pk is None:
+                return None
+            Job.objects.filter(pk=pk).update(**claimed)
+        return Job.objects.get(pk=pk)
+
+    # SQLite: из нескольких обработчиков условный UPDATE выигрывает только один
+    for pk in candidates.values_list("pk", flat=True)[:10]:
+        if Job.objects.filter(pk=pk, status=Job.Status.QUEUED).update(**claimed):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def retry_delay(attempts) -> int:
+    return min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def run_job(job, worker_id):
+    """Выполняет захваченную задачу и записывает результат"""
+    started = time.monotonic()
+    try:
+        import_string(job.name)(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("Задача %s #%s не выполнена: %s", job.name, job.pk, error)
+            Job.objects.filter(pk=job.pk, locked_by=worker_id).update(
+                status=Job.Status.FAILED, last_error=error, finished_at=timezone.now()
+            )
+            return False
+        delay = retry_delay(job.attempts)
+        logger.warning(
+            "Задача %s #%s упала (попытка %d), повтор через %d с",
+            job.name,
+            job.pk,
+            job.attempts,
+            delay,
+        )
+        Job.objects.filter(pk=job.pk, locked_by=worker_id).update(
+            status=Job.Status.QUEUED,
+            last_error=error,
+            locked_by="",
+            locked_at=None,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+        return False
+    Job.objects.filter(pk=job.pk, locked_by=worker_id).update(
+        status=Job.Status.DONE, finished_at=timezone.now()
+    )
+    logger.debug("Задача %s #%s выполнена за %.3f с", job.name, job.pk, time.monotonic() - started)
+    return True
+
+
+def requeue_stale() -> int:
+    """
+    Возвращает в очередь задачи обработчиков, не ответивших за JOB_LOCK_TIMEOUT.
+    Задачи, исчерпавшие max_attempts (например, каждый раз роняющие обработчик),
+    помечаются упавшими
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.Status.RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    )
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.Status.FAILED,
+        last_error="Обработчик не ответил за JOB_LOCK_TIMEOUT",
+        finished_at=now,
+    )
+    if failed:
+        logger.error("Зависших задач, исчерпавших попытки: %d", failed)
+    count = stale.update(status=Job.Status.QUEUED, locked_by="", locked_at=None)
+    if count:
+        logger.warning("Возвращено в очередь зависших задач: %d", count)
+    return count
+
+
+def purge_finished(days) -> int:
+    """Удаляет выполненные задачи старше days дней; упавшие остаются для разбора"""
+    cutoff = timezone.now() - timedelta(days=days)
+    count, _ = Job.objects.filter(status=Job.Status.DONE, finished_at__lt=cutoff).delete()
+    return count
+
+
+def work(worker_id, queues=None, burst=False, should_stop=lambda: False) -> int:
+    """
+    Цикл обработчика. burst — завершиться, когда готовых задач не осталось.
+    Возвращает число выполненных задач
+    """
+    processed = 0
+    while not should_stop():
+        job = claim_job(worker_id, queues)
+        if job is None:
+            if burst:
+                break
+            requeue_stale()
+            time.sleep(settings.JOB_POLL_INTERVAL)
+            continue
+        run_job(job, worker_id)
+        processed += 1
+    return processed
@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api_product.models import Category, Product, Review
+from .models import Job
+from .queue import claim_job, job, requeue_stale, work
+
+calls = []
+
+
+@job(max_attempts=2)
+def flaky(value):
+    calls.append(value)
+    if len(calls) == 1:
+        raise RuntimeError("first attempt fails")
+
+
+@job(queue="media")
+def record(value):
+    calls.append(value)
+
+
+class JobQueueTestCase(TestCase):
+    """
+    Очередь задач: захват, повтор с задержкой, приоритеты и лимиты очередей
+    """
+
+    def setUp(self):
+        calls.clear()
+
+    def test_review_rating_is_updated_by_worker(self):
+        first = User.objects.create_user(username="first")
+        second = User.objects.create_user(username="second")
+        category = Category.objects.create(title="Electronics")
+        product = Product.objects.create(category=category, title="Phone", price=10)
+        Review.objects.create(product=product, user=first, author="A", email="a@a.ru", rate=5)
+        Review.objects.create(product=product, user=second, author="B", email="b@b.ru", rate=3)
+
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertEqual(work("test", burst=True), 1)
+
+        product.refresh_from_db()
+        self.assertEqual((product.rating, product.reviews_count), (4, 2))
+        self.assertEqual(Job.objects.get().status, Job.Status.DONE)
+
+        # Загрузка фикстур (raw) пересчёт не ставит
+        review = Review.objects.first()
+        post_save.send(sender=Review, instance=review, created=True, raw=True)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        flaky.delay(1)
+
+        work("test", burst=True)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn("first attempt fails", job.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        work("test", burst=True)
+        self.assertEqual(Job.objects.get().status, Job.Status.DONE)
+        self.assertEqual(calls, [1, 1])
+
+    def test_stale_jobs_are_requeued_until_attempts_run_out(self):
+        retry = flaky.delay(1)
+        exhausted = flaky.delay(2)
+        claim_job("dead")
+        claim_job("dead")
+        Job.objects.filter(pk=exhausted.pk).update(attempts=2)
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(requeue_stale(), 1)
+
+        retry.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual((retry.status, retry.locked_by), (Job.Status.QUEUED, ""))
+        self.assertEqual(exhausted.status, Job.Status.FAILED)
+        self.assertIsNotNone(exhausted.finished_at)
+
+    @override_settings(JOB_QUEUES={"media": {"concurrency": 1}})
+    def test_priority_and_queue_limits(self):
+        record.enqueue(args=[0], priority=10)
+        low = flaky.enqueue(args=[1])
+        high = flaky.enqueue(args=[2], priority=5)
+
+        self.assertEqual(claim_job("a").queue, "media")
+        # очередь media занята, дальше — по приоритету
+        self.assertEqual(claim_job("b").pk, high.pk)
+        self.assertEqual(claim_job("c").pk, low.pk)
+        self.assertIsNone(claim_job("d"))
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        record.enqueue(args=[1], key="same")
+        record.enqueue(args=[2], key="same")
+
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(calls, [1, 2])
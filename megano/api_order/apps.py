@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ApiOrderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api_order'
+
+    def ready(self):
+        import api_order.signals
@@ -0,0 +1,61 @@
+"""
+Перенос завершённых заказов в архивные таблицы.
+
+Горячие таблицы Order/OrderItem содержат только недавние и незавершённые
+заказы, поэтому история, индекс -createdAt и список в админке не платят за
+все прошлые заказы. История заказов читает архив, только когда горячие
+заказы пользователя закончились (OrderHistoryPagination).
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+ORDER_FIELDS = (
+    "id",
+    "user_id",
+    "createdAt",
+    "deliveryType",
+    "paymentType",
+    "totalCost",
+    "status",
+    "city",
+    "address",
+)
+ITEM_FIELDS = ("order_id", "product_id", "price", "count", "snapshot")
+
+
+def archivable_orders(days):
+    """Завершённые заказы старше days дней"""
+    cutoff = timezone.now() - timedelta(days=days)
+    return Order.objects.filter(createdAt__lt=cutoff, status__in=Order.FINAL_STATUSES)
+
+
+def archive_batch(order_ids) -> tuple:
+    """
+    Копирует заказы с позициями в архив и удаляет их из горячих таблиц в одной
+    транзакции. Возвращает (заказов, позиций)
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects.filter(pk__in=list(order_ids), status__in=Order.FINAL_STATUSES)
+            .order_by()
+            .values(*ORDER_FIELDS)
+        )
+        if not orders:
+            return 0, 0
+        ids = [order["id"] for order in orders]
+        items = list(OrderItem.objects.filter(order_id__in=ids).values(*ITEM_FIELDS))
+
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**order) for order in orders])
+        ArchivedOrderItem.objects.bulk_create([ArchivedOrderItem(**item) for item in items])
+        # Позиции удаляются каскадом, без пересчёта итогов (см. signals.update_order_totals)
+        Order.objects.filter(pk__in=ids).delete()
+    logger.debug("Архивировано заказов: %d, позиций: %d", len(orders), len(items))
+    return len(orders), len(items)
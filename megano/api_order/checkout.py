@@ -0,0 +1,240 @@
+"""
+Оформление заказа набором операций над множеством строк.
+
+Для заказа из N позиций выполняется фиксированное число запросов:
+цены берутся на стороне сервера одним запросом, остатки всех товаров
+списываются одним условным UPDATE (при нехватке хотя бы одного товара
+транзакция откатывается целиком), позиции заказа записываются одной
+вставкой с обновлением при конфликте, корзина очищается в той же транзакции.
+Списанный остаток возвращается на склад при отмене заказа (Order.transition);
+неподтверждённые и неоплаченные заказы отменяет команда expire_orders.
+
+Каждая позиция хранит снимок товара (название, цена, первое изображение,
+категория, теги), поэтому заказы отображаются без обращения к каталогу.
+"""
+
+import logging
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from api_product.models import Product, ProductImage
+from api_transaction.models import StockReservation
+from api_transaction.reservations import release_owner
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FIELDS = ('title', 'description', 'category_id', 'freeDelivery')
+
+
+class CheckoutError(Exception):
+    """Заказ не может быть оформлен; product_ids — проблемные товары"""
+
+    def __init__(self, message, product_ids=()):
+        super().__init__(message)
+        self.message = message
+        self.product_ids = list(product_ids)
+
+
+def effective_price():
+    """Действующая цена товара: цена со скидкой в период акции, иначе обычная"""
+    now = timezone.now()
+    return Case(
+        When(
+            salePrice__gt=0,
+            dateFrom__lte=now,
+            dateTo__gte=now,
+            then=F('salePrice'),
+        ),
+        default=F('price'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def _per_product(values: dict):
+    return Case(
+        *[When(pk=product_id, then=Value(value)) for product_id, value in values.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def product_snapshots(rows) -> dict:
+    """
+    Компактные снимки товаров для позиций заказа {product_id: snapshot}.
+    rows — словари с полями SNAPSHOT_FIELDS и effective_price. Первое
+    изображение и теги всех товаров читаются двумя запросами
+    """
+    if not rows:
+        return {}
+    product_ids = [row['id'] for row in rows]
+    images = {}
+    for product_id, src, alt in (
+        ProductImage.objects.filter(product_id__in=product_ids)
+        .order_by('product_id', 'pk')
+        .values_list('product_id', 'src', 'alt')
+    ):
+        images.setdefault(product_id, {'src': src, 'alt': alt})
+    tags = {}
+    for product_id, tag_id, name in Product.tags.through.objects.filter(
+        product_id__in=product_ids
+    ).values_list('product_id', 'tag_id', 'tag__name'):
+        tags.setdefault(product_id, []).append({'id': tag_id, 'name': name})
+
+    return {
+        row['id']: {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'] or '',
+            'category': row['category_id'],
+            'freeDelivery': row['freeDelivery'],
+            'price': str(row['effective_price']),
+            'image': images.get(row['id']),
+            'tags': tags.get(row['id'], []),
+        }
+        for row in rows
+    }
+
+
+def parse_lines(items) -> dict:
+    """
+    Приводит позиции из запроса [{"id": .., "count": ..}, ...] к {product_id: count}.
+    Цены из запроса игнорируются
+    """
+    lines = {}
+    try:
+        for item in items:
+            product_id, count = int(item['id']), int(item['count'])
+            if count <= 0:
+                raise CheckoutError('Количество должно быть от 1 и больше', [product_id])
+            lines[product_id] = lines.get(product_id, 0) + count
+    except (KeyError, TypeError, ValueError):
+        raise CheckoutError('Неверные данные позиций заказа')
+    if not lines:
+        raise CheckoutError('Заказ не может быть пустым')
+    return lines
+
+
+def apply_order_lines(order: Order, lines: dict, owner=None, basket=None, existing=None):
+    """
+    Приводит позиции заказа к lines {product_id: count}, списывая или возвращая
+    на склад разницу с уже записанными позициями.
+
+    owner — владелец корзины, чьи резервы засчитываются при проверке остатка;
+    basket — хранилище корзины, очищаемое при успешном оформлении;
+    existing — уже записанные позиции {product_id: count}, если известны заранее
+    (для нового заказа — пустой словарь, запрос не нужен)
+    """
+    with transaction.atomic():
+        if existing is None:
+            existing = dict(order.items.values_list('product_id', 'count'))
+
+        products = {
+            row['id']: row
+            for row in Product.objects.filter(id__in=list(lines), available=True)
+            .annotate(effective_price=effective_price())
+            .values('id', 'effective_price', *SNAPSHOT_FIELDS)
+        }
+        prices = {product_id: row['effective_price'] for product_id, row in products.items()}
+        missing = set(lines) - set(prices)
+        if missing:
+            raise CheckoutError(
+                'Товары с ID %s не найдены или недоступны' % sorted(missing), missing
+            )
+
+        deltas = {
+            product_id: lines.get(product_id, 0) - existing.get(product_id, 0)
+            for product_id in set(lines) | set(existing)
+        }
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+
+        if deltas:
+            reservations = []
+            if owner:
+                reservations = list(
+                    StockReservation.objects.filter(
+                        owner=owner, product_id__in=[pid for pid, d in deltas.items() if d > 0]
+                    )
+                )
+            held = {r.product_id: r.quantity for r in reservations}
+            consumed = {
+                product_id: min(held.get(product_id, 0), delta)
+                for product_id, delta in deltas.items()
+                if delta > 0
+            }
+
+            # Свободный остаток плюс собственный резерв покупателя должен покрывать списание
+            condition = reduce(
+                or_,
+                (
+                    (
+                        Q(pk=product_id, count__gte=F('reserved') - consumed[product_id] + delta)
+                        if delta > 0
+                        else Q(pk=product_id)
+                    )
+                    for product_id, delta in deltas.items()
+                ),
+            )
+            updated = Product.objects.filter(condition).update(
+                count=F('count') - _per_product(deltas),
+                reserved=Greatest(F('reserved') - _per_product(consumed), Value(0)),
+            )
+            if updated != len(deltas):
+                short = list(
+                    Product.objects.filter(pk__in=list(deltas))
+                    .exclude(condition)
+                    .values_list('pk', flat=True)
+                )
+                raise CheckoutError('Недостаточно товара на складе', short)
+
+            spent = []
+            for reservation in reservations:
+                reservation.quantity -= consumed[reservation.product_id]
+                spent.append(reservation)
+            if spent:
+                StockReservation.objects.filter(
+                    pk__in=[r.pk for r in spent if r.quantity <= 0]
+                ).delete()
+                StockReservation.objects.bulk_update(
+                    [r for r in spent if r.quantity > 0], ['quantity']
+                )
+
+        # Снимок и цена пишутся только для новых позиций: у существующих меняется
+        # лишь количество, они сохраняют состояние каталога на момент оформления
+        snapshots = product_snapshots(
+            [row for product_id, row in products.items() if product_id not in existing]
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order,
+                    product_id=product_id,
+                    count=count,
+                    price=prices[product_id],
+                    snapshot=snapshots.get(product_id, {}),
+                )
+                for product_id, count in lines.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['order', 'product'],
+            update_fields=['count'],
+        )
+        removed = [product_id for product_id in existing if product_id not in lines]
+        if removed:
+            order.items.filter(product_id__in=removed).delete()
+
+        order.recalculate_totals()
+
+        if basket is not None:
+            basket.clear()
+            if owner:
+                # Корзина пуста — резервы на неоформленные товары больше не нужны
+                release_owner(owner)
+
+    logger.info("Заказ %s оформлен: %d позиций", order.pk, len(lines))
+    return order
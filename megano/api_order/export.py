@@ -0,0 +1,184 @@
+"""
+Потоковая выгрузка заказов для бухгалтерии и аналитики.
+
+Одна строка выгрузки — одна позиция заказа вместе с данными заказа и
+покупателя. Строки читаются проекцией values() через iterator(chunk_size=...),
+поэтому память не растёт с объёмом выгрузки. Используется командой
+export_orders и представлением OrderExportView.
+
+Позиции архивных заказов (ArchivedOrderItem) читаются тем же способом и
+сливаются с горячими по (id заказа, id позиции): незавершённые старые заказы
+остаются в горячей таблице, поэтому id из двух таблиц перемежаются.
+
+Инкрементальная выгрузка: при указании водяной отметки (ExportWatermark)
+выгружаются только заказы с id больше сохранённого, а отметка сдвигается
+после того, как выгрузка прошла целиком.
+"""
+
+import csv
+import heapq
+import json
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+
+from api_auth.models import Profile
+from .models import ArchivedOrder, ArchivedOrderItem, ExportWatermark, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+CHUNK_SIZE = 2000
+
+# Колонка выгрузки -> поле values()
+EXPORT_COLUMNS = {
+    "orderId": "order_id",
+    "createdAt": "order__createdAt",
+    "status": "order__status",
+    "deliveryType": "order__deliveryType",
+    "paymentType": "order__paymentType",
+    "totalCost": "order__totalCost",
+    "city": "order__city",
+    "address": "order__address",
+    "userId": "order__user__user_id",
+    "username": "order__user__user__username",
+    "email": "order__user__user__email",
+    "fullName": "order__user__fullName",
+    "phone": "order__user__phone",
+    "productId": "product_id",
+    "title": "snapshot__title",
+    "category": "snapshot__category",
+    "price": "price",
+    "count": "count",
+}
+
+# У архивного заказа покупатель хранится числом: его поля читаются подзапросами
+ARCHIVE_PROFILE_FIELDS = {
+    "userId": "user_id",
+    "username": "user__username",
+    "email": "user__email",
+    "fullName": "fullName",
+    "phone": "phone",
+}
+ARCHIVE_COLUMNS = {
+    **EXPORT_COLUMNS,
+    **{column: f"buyer_{column}" for column in ARCHIVE_PROFILE_FIELDS},
+}
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def parse_date_range(date_from=None, date_to=None) -> tuple:
+    """Границы [начало date_from, начало дня после date_to) в текущем часовом поясе"""
+    start = end = None
+    if date_from:
+        start = timezone.make_aware(datetime.combine(date_from, time.min))
+    if date_to:
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return start, end
+
+
+def _item_rows(items, columns, start, end, after_id, until_id, chunk_size):
+    """((id заказа, id позиции), строка) в порядке (заказ, позиция)"""
+    if start:
+        items = items.filter(order__createdAt__gte=start)
+    if end:
+        items = items.filter(order__createdAt__lt=end)
+    if after_id is not None:
+        items = items.filter(order_id__gt=after_id)
+    if until_id is not None:
+        items = items.filter(order_id__lte=until_id)
+    rows = (
+        items.order_by("order_id", "id")
+        .values_list("order_id", "id", *columns.values())
+        .iterator(chunk_size=chunk_size)
+    )
+    for order_id, item_id, *row in rows:
+        yield (order_id, item_id), dict(zip(columns, row))
+
+
+def export_rows(start=None, end=None, after_id=None, until_id=None, chunk_size=CHUNK_SIZE):
+    """Словари строк выгрузки горячих и архивных заказов в порядке (заказ, позиция)"""
+    archived = ArchivedOrderItem.objects.annotate(
+        **{
+            f"buyer_{column}": Subquery(
+                Profile.objects.filter(pk=OuterRef("order__user_id")).values(field)[:1]
+            )
+            for column, field in ARCHIVE_PROFILE_FIELDS.items()
+        }
+    )
+    bounds = (start, end, after_id, until_id, chunk_size)
+    for _, row in heapq.merge(
+        _item_rows(OrderItem.objects.all(), EXPORT_COLUMNS, *bounds),
+        _item_rows(archived, ARCHIVE_COLUMNS, *bounds),
+        key=lambda pair: pair[0],
+    ):
+        yield row
+
+
+def render_lines(rows, fmt):
+    """Строки выгрузки в выбранном формате, по одной строке текста на позицию"""
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(list(EXPORT_COLUMNS))
+        for row in rows:
+            yield writer.writerow(
+                [row[column] if row[column] is not None else "" for column in EXPORT_COLUMNS]
+            )
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+
+
+def stream_export(fmt, start=None, end=None, watermark=None, after_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Генератор строк выгрузки. Верхняя граница id фиксируется в начале, поэтому
+    заказы, созданные во время выгрузки, попадут в следующую. Если задана
+    водяная отметка, она сдвигается только после выдачи последней строки
+    """
+    if fmt not in FORMATS:
+        raise ValueError("Неизвестный формат выгрузки: %s" % fmt)
+    if watermark:
+        after_id = (
+            ExportWatermark.objects.filter(name=watermark)
+            .values_list("last_order_id", flat=True)
+            .first()
+        )
+    # Последний заказ мог уже уйти в архив
+    until_id = max(
+        filter(
+            None,
+            (
+                Order.objects.aggregate(last=Max("id"))["last"],
+                ArchivedOrder.objects.aggregate(last=Max("id"))["last"],
+            ),
+        ),
+        default=None,
+    )
+
+    exported = 0
+
+    def counted(rows):
+        nonlocal exported
+        for row in rows:
+            exported += 1
+            yield row
+
+    yield from render_lines(
+        counted(export_rows(start, end, after_id, until_id, chunk_size=chunk_size)), fmt
+    )
+
+    if watermark and until_id is not None:
+        with transaction.atomic():
+            ExportWatermark.objects.update_or_create(
+                name=watermark, defaults={"last_order_id": until_id}
+            )
+    logger.info("Выгрузка заказов (%s): %d строк, id в (%s, %s]", fmt, exported, after_id, until_id)
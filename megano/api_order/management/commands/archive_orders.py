@@ -0,0 +1,59 @@
+import time
+
+from django.core.management import BaseCommand
+
+from api_order.archive import archivable_orders, archive_batch
+
+
+class Command(BaseCommand):
+    """
+    Переносит завершённые (выполненные и отменённые) заказы старше --days дней
+    в архивные таблицы пачками в коротких транзакциях.
+    """
+
+    help = "Move old completed and cancelled orders to the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Архивировать заказы старше указанного количества дней",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество заказов, переносимых в одной транзакции",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0 or options["days"] < 0:
+            self.stdout.write(
+                self.style.ERROR("--batch-size должен быть больше 0, --days — не меньше 0")
+            )
+            return
+
+        started = time.monotonic()
+        orders = items = 0
+        last_pk = 0
+        candidates = archivable_orders(options["days"])
+        while True:
+            batch = list(
+                candidates.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]
+            archived_orders, archived_items = archive_batch(batch)
+            orders += archived_orders
+            items += archived_items
+
+        self.stdout.write(
+            "Архивировано заказов: %d, позиций: %d за %.3f c"
+            % (orders, items, time.monotonic() - started)
+        )
+        self.stdout.write(self.style.SUCCESS("Orders archived."))
@@ -0,0 +1,136 @@
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Sum
+
+from api_auth.models import Profile
+from api_order.checkout import CheckoutError, apply_order_lines
+from api_order.models import DeliverySettings, Order, OrderItem
+from api_product.models import Category, Product
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочная проверка оформления заказов: параллельные потоки оформляют
+    заказы по --lines позиций на одни и те же товары. Выводит задержки, число
+    отказов из-за нехватки остатка и блокировок, проверяет, что списанный остаток
+    совпадает с количеством в заказах. Все созданные данные удаляются.
+    """
+
+    help = "Benchmark concurrent checkouts with multi-line orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=200, help="Всего заказов")
+        parser.add_argument("--threads", type=int, default=8, help="Параллельных покупателей")
+        parser.add_argument("--lines", type=int, default=50, help="Позиций в заказе")
+        parser.add_argument(
+            "--stock",
+            type=int,
+            default=100,
+            help="Начальный остаток каждого товара (меньше --orders — часть заказов получит отказ)",
+        )
+
+    def handle(self, *args, **options):
+        orders, threads = options["orders"], options["threads"]
+        lines, stock = options["lines"], options["stock"]
+        if min(orders, threads, lines, stock) <= 0:
+            self.stdout.write(self.style.ERROR("Все параметры должны быть больше 0"))
+            return
+
+        prefix = "bench-%s" % uuid.uuid4().hex[:8]
+        category = Category.objects.create(title=prefix)
+        products = Product.objects.bulk_create(
+            Product(category=category, title=f"{prefix}-{i}", price=10 + i, count=stock)
+            for i in range(lines)
+        )
+        product_ids = [product.pk for product in products]
+        profiles = []
+        for i in range(threads):
+            user = User.objects.create_user(username=f"{prefix}-{i}")
+            profiles.append(Profile.objects.create(user=user, fullName=user.username))
+        created_settings = None
+        if not DeliverySettings.objects.exists():
+            created_settings = DeliverySettings.objects.create()
+
+        results = {"ok": 0, "shortage": 0, "locked": 0}
+        latencies = []
+        lock = threading.Lock()
+        basket = {product_id: 1 for product_id in product_ids}
+
+        def checkout(profile, count):
+            try:
+                for _ in range(count):
+                    tick = time.monotonic()
+                    try:
+                        with transaction.atomic():
+                            order = Order.objects.create(user=profile)
+                            apply_order_lines(order, basket, existing={})
+                        outcome = "ok"
+                    except CheckoutError:
+                        outcome = "shortage"
+                    except (DatabaseError, ValidationError):
+                        # Order.save() оборачивает ошибки БД в ValidationError
+                        outcome = "locked"
+                    elapsed = time.monotonic() - tick
+                    with lock:
+                        results[outcome] += 1
+                        latencies.append(elapsed)
+            finally:
+                connection.close()
+
+        shares = [orders // threads + (1 if i < orders % threads else 0) for i in range(threads)]
+        try:
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                for future in [
+                    executor.submit(checkout, profile, share)
+                    for profile, share in zip(profiles, shares)
+                ]:
+                    future.result()
+            total_time = time.monotonic() - started
+
+            sold = dict(
+                OrderItem.objects.filter(product_id__in=product_ids)
+                .values("product_id")
+                .annotate(total=Sum("count"))
+                .values_list("product_id", "total")
+            )
+            remaining = dict(Product.objects.filter(pk__in=product_ids).values_list("pk", "count"))
+            broken = [pid for pid in product_ids if remaining[pid] + sold.get(pid, 0) != stock]
+
+            latencies.sort()
+            self.stdout.write(
+                "Заказов: %d по %d позиций, потоков: %d, время: %.3f c (%.1f заказов/с)"
+                % (orders, lines, threads, total_time, orders / total_time)
+            )
+            self.stdout.write(
+                "Оформлено: %(ok)d, нехватка остатка: %(shortage)d, ошибки блокировок: %(locked)d"
+                % results
+            )
+            self.stdout.write(
+                "Задержка, мс: p50 %.1f, p95 %.1f, p99 %.1f, max %.1f"
+                % (
+                    statistics.median(latencies) * 1000,
+                    latencies[int(len(latencies) * 0.95) - 1] * 1000,
+                    latencies[int(len(latencies) * 0.99) - 1] * 1000,
+                    latencies[-1] * 1000,
+                )
+            )
+            if broken or min(remaining.values()) < 0:
+                self.stdout.write(self.style.ERROR("Остаток не сходится у товаров: %s" % broken))
+            else:
+                self.stdout.write(self.style.SUCCESS("Остатки сходятся с позициями заказов."))
+        finally:
+            Order.objects.filter(user__in=profiles).delete()
+            Product.objects.filter(pk__in=product_ids).delete()
+            category.delete()
+            User.objects.filter(profile__in=profiles).delete()
+            if created_settings:
+                created_settings.delete()
@@ -0,0 +1,64 @@
+import time
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from api_order.models import Order
+
+UNCONFIRMED_STATUSES = (Order.Status.NEW, Order.Status.AWAITING_PAYMENT)
+
+
+class Command(BaseCommand):
+    """
+    Отменяет заказы, которые не подтвердили или не оплатили дольше --hours часов.
+    Остаток списывается при оформлении заказа, поэтому без отмены брошенные
+    заказы навсегда забирали бы товар со склада; Order.transition возвращает
+    его обратно. Заказы с платежом в процессе не затрагиваются.
+    """
+
+    help = "Cancel unconfirmed and unpaid orders and return their items to stock"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=24,
+            help="Через сколько часов неподтверждённый или неоплаченный заказ отменяется",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество заказов, читаемых за один проход",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0 or options["hours"] <= 0:
+            self.stdout.write(self.style.ERROR("--batch-size и --hours должны быть больше 0"))
+            return
+
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(hours=options["hours"])
+        candidates = Order.objects.filter(createdAt__lt=cutoff, status__in=UNCONFIRMED_STATUSES)
+        cancelled = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                candidates.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "status")[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            for pk, status in batch:
+                # Условный переход: заказ, который успели подтвердить, не отменяется
+                if Order.transition(pk, status, Order.Status.CANCELLED):
+                    cancelled += 1
+
+        self.stdout.write(
+            "Отменено заказов: %d за %.3f c" % (cancelled, time.monotonic() - started)
+        )
+        self.stdout.write(self.style.SUCCESS("Unconfirmed orders expired."))
@@ -0,0 +1,50 @@
+import sys
+from datetime import date
+
+from django.core.management import BaseCommand, CommandError
+
+from api_order.export import CHUNK_SIZE, FORMATS, parse_date_range, stream_export
+
+
+class Command(BaseCommand):
+    """
+    Выгружает позиции заказов с данными заказа и покупателя в CSV или JSONL.
+    Строки пишутся потоком, память не зависит от объёма выгрузки.
+    """
+
+    help = "Export orders with their items as CSV or JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="csv", help="Формат выгрузки")
+        parser.add_argument("--output", help="Файл для записи (по умолчанию stdout)")
+        parser.add_argument(
+            "--date-from", type=date.fromisoformat, help="Начальная дата заказа (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--date-to", type=date.fromisoformat, help="Конечная дата заказа включительно"
+        )
+        parser.add_argument(
+            "--watermark",
+            help="Имя инкрементальной выгрузки: только заказы после прошлого запуска",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=CHUNK_SIZE, help="Строк за одно чтение из БД"
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] <= 0:
+            raise CommandError("--chunk-size должен быть больше 0")
+        start, end = parse_date_range(options["date_from"], options["date_to"])
+        lines = stream_export(
+            options["format"],
+            start,
+            end,
+            watermark=options["watermark"],
+            chunk_size=options["chunk_size"],
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                output.writelines(lines)
+            self.stderr.write(self.style.SUCCESS("Orders exported to %s." % options["output"]))
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0003_alter_profile_options'),
+        ('api_order', '0001_initial'),
+        ('api_product', '0007_product_reserved'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(
+                fields=['user', '-createdAt', '-id'], name='api_order_o_user_id_ebb02e_idx'
+            ),
+        ),
+    ]
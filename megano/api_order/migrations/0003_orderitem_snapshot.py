@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def backfill_snapshots(apps, schema_editor):
+    """Снимки для уже оформленных позиций: цена — та, по которой товар продан"""
+    OrderItem = apps.get_model('api_order', 'OrderItem')
+    ProductImage = apps.get_model('api_product', 'ProductImage')
+    Product = apps.get_model('api_product', 'Product')
+
+    last_pk = 0
+    while True:
+        items = list(
+            OrderItem.objects.filter(pk__gt=last_pk, snapshot={}, product__isnull=False)
+            .select_related('product')
+            .order_by('pk')[:BATCH_SIZE]
+        )
+        if not items:
+            break
+        last_pk = items[-1].pk
+        product_ids = {item.product_id for item in items}
+        images = {}
+        for product_id, src, alt in (
+            ProductImage.objects.filter(product_id__in=product_ids)
+            .order_by('product_id', 'pk')
+            .values_list('product_id', 'src', 'alt')
+        ):
+            images.setdefault(product_id, {'src': src, 'alt': alt})
+        tags = {}
+        for product_id, tag_id, name in Product.tags.through.objects.filter(
+            product_id__in=product_ids
+        ).values_list('product_id', 'tag_id', 'tag__name'):
+            tags.setdefault(product_id, []).append({'id': tag_id, 'name': name})
+
+        for item in items:
+            product = item.product
+            item.snapshot = {
+                'id': product.pk,
+                'title': product.title,
+                'description': product.description or '',
+                'category': product.category_id,
+                'freeDelivery': product.freeDelivery,
+                'price': str(item.price),
+                'image': images.get(product.pk),
+                'tags': tags.get(product.pk, []),
+            }
+        OrderItem.objects.bulk_update(items, ['snapshot'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_order', '0002_order_user_history_index'),
+        ('api_product', '0007_product_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='snapshot',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Снимок товара'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='order_items',
+                to='api_product.product',
+                verbose_name='Товар',
+            ),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
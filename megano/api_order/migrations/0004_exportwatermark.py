@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_order', '0003_orderitem_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportWatermark',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                (
+                    'name',
+                    models.CharField(max_length=64, unique=True, verbose_name='Название выгрузки'),
+                ),
+                (
+                    'last_order_id',
+                    models.PositiveBigIntegerField(default=0, verbose_name='Последний заказ'),
+                ),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Отметка выгрузки заказов',
+                'verbose_name_plural': 'Отметки выгрузки заказов',
+            },
+        ),
+    ]
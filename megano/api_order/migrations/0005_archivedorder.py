@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_order', '0004_exportwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                (
+                    'id',
+                    models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID'),
+                ),
+                ('user_id', models.PositiveBigIntegerField(verbose_name='Профиль пользователя')),
+                ('createdAt', models.DateTimeField(verbose_name='Дата создания')),
+                (
+                    'deliveryType',
+                    models.CharField(default='', max_length=255, verbose_name='Тип доставки'),
+                ),
+                (
+                    'paymentType',
+                    models.CharField(default='', max_length=255, verbose_name='Тип оплаты'),
+                ),
+                (
+                    'totalCost',
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=10, verbose_name='Сумма заказа'
+                    ),
+                ),
+                (
+                    'status',
+                    models.CharField(default='', max_length=255, verbose_name='Статус заказа'),
+                ),
+                ('city', models.CharField(default='', max_length=255, verbose_name='Город')),
+                ('address', models.CharField(default='', max_length=255, verbose_name='Адрес')),
+                (
+                    'archivedAt',
+                    models.DateTimeField(auto_now_add=True, verbose_name='Дата архивирования'),
+                ),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архивные заказы',
+                'indexes': [
+                    models.Index(
+                        fields=['user_id', '-createdAt', '-id'],
+                        name='api_order_a_user_id_ba85f6_idx',
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                (
+                    'product_id',
+                    models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Товар'),
+                ),
+                (
+                    'price',
+                    models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена'),
+                ),
+                ('count', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                (
+                    'snapshot',
+                    models.JSONField(blank=True, default=dict, verbose_name='Снимок товара'),
+                ),
+                (
+                    'order',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='items',
+                        to='api_order.archivedorder',
+                        verbose_name='Заказ',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Товар в архивном заказе',
+                'verbose_name_plural': 'Товары в архивных заказах',
+            },
+        ),
+    ]
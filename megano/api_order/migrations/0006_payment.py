@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_order', '0005_archivedorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                (
+                    'amount',
+                    models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма'),
+                ),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('pending', 'В очереди'),
+                            ('processing', 'Обрабатывается'),
+                            ('succeeded', 'Успешно'),
+                            ('failed', 'Ошибка'),
+                        ],
+                        default='pending',
+                        max_length=16,
+                        verbose_name='Статус',
+                    ),
+                ),
+                (
+                    'card_last4',
+                    models.CharField(
+                        blank=True, max_length=4, verbose_name='Последние цифры карты'
+                    ),
+                ),
+                (
+                    'transaction_id',
+                    models.CharField(
+                        blank=True, max_length=64, verbose_name='Идентификатор транзакции'
+                    ),
+                ),
+                (
+                    'error',
+                    models.CharField(blank=True, max_length=255, verbose_name='Ошибка оплаты'),
+                ),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Изменён')),
+                (
+                    'order',
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name='payments',
+                        to='api_order.order',
+                        verbose_name='Заказ',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Платёж',
+                'verbose_name_plural': 'Платежи',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -1,12 +1,50 @@
-from django.db import models
+import threading
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
 
+from api_product.models import Product
+
+DELIVERY_SETTINGS_VERSION_KEY = "delivery_settings:version"
+
+# Настройки доставки в памяти процесса: (версия, экземпляр)
+_delivery_settings = None
+_delivery_settings_lock = threading.Lock()
+
 
 class Order(models.Model):
     """
     Модель заказа
     """
 
+    class Status(models.TextChoices):
+        # Заказ создан из корзины, покупатель ещё не подтвердил доставку и оплату
+        NEW = "", "Оформляется"
+        AWAITING_PAYMENT = "Ожидает оплаты", "Ожидает оплаты"
+        PAYMENT_PROCESSING = "Оплачивается", "Оплачивается"
+        PAID = "Оплачен", "Оплачен"
+        COMPLETED = "Выполнен", "Выполнен"
+        CANCELLED = "Отменён", "Отменён"
+
+    # Статусы, после которых заказ больше не меняется и может быть архивирован
+    FINAL_STATUSES = (Status.COMPLETED, Status.CANCELLED)
+
+    # Допустимые переходы статусов (см. api_order.payment)
+    TRANSITIONS = {
+        Status.NEW: (Status.AWAITING_PAYMENT, Status.CANCELLED),
+        Status.AWAITING_PAYMENT: (Status.PAYMENT_PROCESSING, Status.CANCELLED),
+        Status.PAYMENT_PROCESSING: (Status.PAID, Status.AWAITING_PAYMENT),
+        Status.PAID: (Status.COMPLETED, Status.CANCELLED),
+    }
+
     user = models.ForeignKey(
         "api_auth.Profile",
         on_delete=models.PROTECT,
@@ -30,6 +68,8 @@ class Order(models.Model):
         ordering = ["-createdAt"]
         indexes = [
             models.Index(fields=["-createdAt"]),
+            # История заказов пользователя: keyset-пагинация по (createdAt, id)
+            models.Index(fields=["user", "-createdAt", "-id"]),
         ]
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
@@ -62,9 +102,7 @@ class Order(models.Model):
         try:
             if not self.pk:  # Если заказ ещё не сохранён
                 return 0
-            delivery_settings = DeliverySettings.objects.first()
-            if not delivery_settings:
-                raise ValidationError("Настройки доставки не найдены")
+            delivery_settings = DeliverySettings.get_solo()
 
             if self.deliveryType == "express":
                 return delivery_settings.EXPRESS_DELIVERY_COST
@@ -74,19 +112,116 @@ class Order(models.Model):
         except Exception as e:
             raise ValidationError(f"Ошибка расчета стоимости доставки: {str(e)}")
 
+    @staticmethod
+    def update_totals(order_ids):
+        """
+        Пересчитывает totalCost заказов одним UPDATE: стоимость позиций
+        агрегируется в БД, стоимость доставки берётся из кэшированных настроек
+        """
+        delivery_settings = DeliverySettings.get_solo()
+        money = models.DecimalField(max_digits=10, decimal_places=2)
+        items_cost = Coalesce(
+            Subquery(
+                OrderItem.objects.filter(order=OuterRef('pk'))
+                .order_by()
+                .values('order')
+                .annotate(total=Sum(F('price') * F('count'), output_field=money))
+                .values('total')
+            ),
+            Value(Decimal(0)),
+            output_field=money,
+        )
+        delivery_cost = Case(
+            When(deliveryType="express", then=Value(delivery_settings.EXPRESS_DELIVERY_COST)),
+            When(
+                LessThan(items_cost, Value(delivery_settings.FREE_DELIVERY_THRESHOLD)),
+                then=Value(delivery_settings.REGULAR_DELIVERY_COST),
+            ),
+            default=Value(Decimal(0)),
+            output_field=money,
+        )
+        Order.objects.filter(pk__in=order_ids).update(totalCost=items_cost + delivery_cost)
+
+    def recalculate_totals(self):
+        Order.update_totals([self.pk])
+        self.refresh_from_db(fields=["totalCost"])
+
+    @staticmethod
+    def restock(order_ids):
+        """
+        Возвращает на склад товары заказов одним UPDATE (count = count + n).
+        Вызывается один раз при отмене: остаток списывается при оформлении заказа
+        """
+        quantities = dict(
+            OrderItem.objects.filter(order_id__in=list(order_ids), product__isnull=False)
+            .order_by()
+            .values("product_id")
+            .annotate(total=Sum("count"))
+            .values_list("product_id", "total")
+        )
+        if quantities:
+            Product.objects.filter(pk__in=list(quantities)).update(
+                count=F("count")
+                + Case(
+                    *[When(pk=pk, then=Value(n)) for pk, n in quantities.items()],
+                    default=Value(0),
+                    output_field=models.IntegerField(),
+                )
+            )
+
+    @classmethod
+    def transition(cls, pk, source, target, **filters) -> bool:
+        """
+        Переводит заказ из статуса source в target условным UPDATE.
+        Возвращает False, если заказ уже не в статусе source (переход сделал
+        другой запрос или процесс). При отмене товары возвращаются на склад
+        в той же транзакции. Сигналы post_save не отправляются
+        """
+        if target not in cls.TRANSITIONS.get(source, ()):
+            raise ValueError(f"Недопустимый переход статуса заказа: {source} -> {target}")
+        with transaction.atomic():
+            moved = bool(cls.objects.filter(pk=pk, status=source, **filters).update(status=target))
+            if moved and target == cls.Status.CANCELLED:
+                cls.restock([pk])
+        return moved
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_delivery_type = instance.__dict__.get("deliveryType")
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
     def save(self, *args, **kwargs):
         try:
-            # if not self.pk:
-            #     super().save(*args, **kwargs)
-            # self.totalCost = self.get_total_cost() + self.calculate_delivery_cost()
-            # if self.pk:  # Убедимся, что запись существует
-            #     kwargs.pop('force_insert', None)  # Удаляем force_insert, если он есть
-            #     super().save(update_fields=['totalCost'], *args, **kwargs)
-
-            # Всегда рассчитываем стоимость
-            self.totalCost = self.get_total_cost() + self.calculate_delivery_cost()
-            # Сохраняем все поля
-            super().save(*args, **kwargs)
+            # Итоги меняются только вместе с позициями (их пересчитывают сигналы
+            # OrderItem и оформление заказа) или со способом доставки, поэтому
+            # смена статуса или адреса сохраняется без чтения позиций
+            recalculate = self.pk is not None and self.deliveryType != getattr(
+                self, "_loaded_delivery_type", self.deliveryType
+            )
+            cancelled = (
+                self.pk is not None
+                and self.status == Order.Status.CANCELLED
+                and getattr(self, "_loaded_status", self.status) != self.status
+            )
+            if cancelled:
+                with transaction.atomic():
+                    # Отмена в админке: условный UPDATE гарантирует, что товары вернутся
+                    # на склад один раз, даже если заказ отменяют одновременно
+                    if (
+                        Order.objects.filter(pk=self.pk)
+                        .exclude(status=Order.Status.CANCELLED)
+                        .update(status=Order.Status.CANCELLED)
+                    ):
+                        Order.restock([self.pk])
+                    super().save(*args, **kwargs)
+            else:
+                super().save(*args, **kwargs)
+            self._loaded_delivery_type = self.deliveryType
+            self._loaded_status = self.status
+            if recalculate:
+                self.recalculate_totals()
         except Exception as e:
             raise ValidationError(f"Ошибка сохранения заказа: {str(e)}")
 
@@ -104,12 +239,17 @@ class OrderItem(models.Model):
     )
     product = models.ForeignKey(
         "api_product.Product",
-        on_delete=models.PROTECT,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
         related_name="order_items",
         verbose_name="Товар",
     )
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
     count = models.PositiveIntegerField(default=1, verbose_name="Количество")
+    # Снимок товара на момент оформления: заказ отображается без чтения каталога
+    # и переживает изменение или удаление товара
+    snapshot = models.JSONField(default=dict, blank=True, verbose_name="Снимок товара")
 
     class Meta:
         unique_together = ('order', 'product')
@@ -137,5 +277,147 @@ class DeliverySettings(models.Model):
         max_digits=10, decimal_places=2, verbose_name="Стоимость обычной доставки", default=200
     )
 
+    @classmethod
+    def get_solo(cls):
+        """
+        Настройки доставки из памяти процесса. Экземпляр перечитывается, когда
+        меняется версия в общем кэше DELIVERY_SETTINGS_CACHE_ALIAS (bump_version).
+        Версия — случайный токен: вытесненный ключ не совпадёт со старой версией.
+        Если настройки не заданы, используются значения по умолчанию
+        """
+        global _delivery_settings
+        cache = caches[settings.DELIVERY_SETTINGS_CACHE_ALIAS]
+        version = cache.get(DELIVERY_SETTINGS_VERSION_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(DELIVERY_SETTINGS_VERSION_KEY, version, timeout=None):
+                version = cache.get(DELIVERY_SETTINGS_VERSION_KEY, version)
+        cached = _delivery_settings
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with _delivery_settings_lock:
+            instance = cls.objects.order_by("pk").first() or cls()
+            _delivery_settings = (version, instance)
+        return instance
+
+    @staticmethod
+    def bump_version():
+        """Сбрасывает кэшированные настройки во всех процессах"""
+        caches[settings.DELIVERY_SETTINGS_CACHE_ALIAS].set(
+            DELIVERY_SETTINGS_VERSION_KEY, uuid.uuid4().hex, timeout=None
+        )
+
     def __str__(self):
         return "Настройки доставки"
+
+
+class ExportWatermark(models.Model):
+    """
+    Водяная отметка инкрементальной выгрузки заказов: id последнего выгруженного заказа
+    """
+
+    name = models.CharField(max_length=64, unique=True, verbose_name="Название выгрузки")
+    last_order_id = models.PositiveBigIntegerField(default=0, verbose_name="Последний заказ")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Отметка выгрузки заказов"
+        verbose_name_plural = "Отметки выгрузки заказов"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_order_id}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    Архивная копия завершённого заказа (см. команду archive_orders).
+    id совпадает с id исходного заказа, покупатель хранится числом
+    """
+
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    user_id = models.PositiveBigIntegerField(verbose_name="Профиль пользователя")
+    createdAt = models.DateTimeField(verbose_name="Дата создания")
+    deliveryType = models.CharField(max_length=255, verbose_name="Тип доставки", default="")
+    paymentType = models.CharField(max_length=255, verbose_name="Тип оплаты", default="")
+    totalCost = models.DecimalField(
+        max_digits=10, decimal_places=2, verbose_name="Сумма заказа", default=0
+    )
+    status = models.CharField(max_length=255, verbose_name="Статус заказа", default="")
+    city = models.CharField(max_length=255, verbose_name="Город", default="")
+    address = models.CharField(max_length=255, verbose_name="Адрес", default="")
+    archivedAt = models.DateTimeField(auto_now_add=True, verbose_name="Дата архивирования")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_id", "-createdAt", "-id"]),
+        ]
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архивные заказы"
+
+    def __str__(self):
+        return f"Архивный заказ No{self.id}"
+
+
+class ArchivedOrderItem(models.Model):
+    """
+    Позиция архивного заказа со снимком товара
+    """
+
+    order = models.ForeignKey(
+        ArchivedOrder, on_delete=models.CASCADE, related_name="items", verbose_name="Заказ"
+    )
+    product_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="Товар")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
+    count = models.PositiveIntegerField(default=1, verbose_name="Количество")
+    snapshot = models.JSONField(default=dict, blank=True, verbose_name="Снимок товара")
+
+    class Meta:
+        verbose_name = "Товар в архивном заказе"
+        verbose_name_plural = "Товары в архивных заказах"
+
+    def __str__(self):
+        return f"Архивный товар No{self.id}"
+
+
+class Payment(models.Model):
+    """
+    Попытка оплаты заказа. Данные карты не хранятся: в базе остаются только
+    последние цифры номера и ответ платёжной системы
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        PROCESSING = "processing", "Обрабатывается"
+        SUCCEEDED = "succeeded", "Успешно"
+        FAILED = "failed", "Ошибка"
+
+    FINAL_STATUSES = (Status.SUCCEEDED, Status.FAILED)
+
+    # Без ограничения внешнего ключа: архивирование удаляет заказ из горячей
+    # таблицы, а платёж должен остаться с тем же id заказа
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="payments",
+        verbose_name="Заказ",
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Сумма")
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING, verbose_name="Статус"
+    )
+    card_last4 = models.CharField(max_length=4, blank=True, verbose_name="Последние цифры карты")
+    transaction_id = models.CharField(
+        max_length=64, blank=True, verbose_name="Идентификатор транзакции"
+    )
+    error = models.CharField(max_length=255, blank=True, verbose_name="Ошибка оплаты")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменён")
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Платёж"
+        verbose_name_plural = "Платежи"
+
+    def __str__(self):
+        return f"Платёж No{self.id} по заказу No{self.order_id}"
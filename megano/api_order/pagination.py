@@ -0,0 +1,123 @@
+import base64
+import binascii
+import logging
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+logger = logging.getLogger(__name__)
+
+
+class OrderHistoryPagination:
+    """
+    Keyset-пагинация истории заказов по (createdAt, id) в порядке убывания.
+
+    Страница читается по индексу (user, -createdAt, -id) без OFFSET, поэтому
+    стоимость не зависит от глубины листания. Тело ответа остаётся списком
+    заказов (как ждёт фронтенд), ссылка на следующую страницу передаётся в
+    заголовке Link: <...?cursor=...>; rel="next".
+
+    Фронтенд (historyOrder.js) заголовок Link не читает и параметров не передаёт,
+    поэтому запрос без cursor и limit возвращает всю историю одним списком
+    """
+
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    ordering = ("-createdAt", "-id")
+
+    @staticmethod
+    def encode_cursor(created_at, pk) -> str:
+        raw = f"{created_at.isoformat()}|{pk}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, pk = raw.split("|")
+            return datetime.fromisoformat(created_at), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            logger.warning("Некорректный курсор истории заказов: %s", cursor)
+            raise ValidationError({"cursor": "Некорректный курсор"})
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    @staticmethod
+    def after(cursor: tuple) -> Q:
+        """Условие «строго после курсора» в порядке (-createdAt, -id)"""
+        created_at, pk = cursor
+        return Q(createdAt__lt=created_at) | Q(createdAt=created_at, id__lt=pk)
+
+    def paginate_queryset(self, queryset, request, view=None, fallback=None) -> list:
+        """
+        Страница заказов из queryset. fallback — более старые заказы (архив) с теми
+        же полями createdAt и pk. Незавершённые старые заказы остаются в горячей
+        таблице, поэтому выборки могут перемежаться: архивная страница читается,
+        только если самый новый ещё не показанный архивный заказ попадает на эту
+        страницу — новее последнего её заказа или страница неполная
+        """
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None and self.page_size_query_param not in request.query_params:
+            self.next_cursor = None
+            orders = list(queryset.order_by(*self.ordering))
+            if fallback is not None:
+                orders.extend(fallback.order_by(*self.ordering))
+                orders.sort(key=lambda order: (order.createdAt, order.pk), reverse=True)
+            return orders
+
+        page_size = self.get_page_size(request)
+        after = self.after(self.decode_cursor(cursor)) if cursor else None
+        if after is not None:
+            queryset = queryset.filter(after)
+
+        # Лишняя строка показывает, есть ли следующая страница, без COUNT(*)
+        page = list(queryset.order_by(*self.ordering)[: page_size + 1])
+        if fallback is not None:
+            if after is not None:
+                fallback = fallback.filter(after)
+            # Проверка по индексу без чтения позиций заказа
+            newest = fallback.order_by(*self.ordering).values_list("createdAt", "pk").first()
+            if newest is not None and (
+                len(page) <= page_size
+                or newest > (page[page_size - 1].createdAt, page[page_size - 1].pk)
+            ):
+                page.extend(fallback.order_by(*self.ordering)[: page_size + 1])
+                page.sort(key=lambda order: (order.createdAt, order.pk), reverse=True)
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = (
+            self.encode_cursor(page[-1].createdAt, page[-1].pk) if self.has_next else None
+        )
+        return page
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_schema_operation_parameters(self, view) -> list:
+        # Параметры cursor и limit описаны в extend_schema представления
+        return []
+
+    def get_paginated_response_schema(self, schema) -> dict:
+        # Тело ответа — обычный список, курсор передаётся в заголовке Link
+        return schema
+
+    def get_paginated_response(self, data) -> Response:
+        headers = {}
+        next_link = self.get_next_link()
+        if next_link:
+            headers["Link"] = f'<{next_link}>; rel="next"'
+        return Response(data, headers=headers)
@@ -0,0 +1,204 @@
+"""
+Асинхронная оплата заказов.
+
+POST /api/payment/<id> только ставит платёж в очередь: данные карты
+передаются платёжной системе в обмен на токен (tokenize), заказ переводится в
+статус «Оплачивается», создаётся Payment и в той же транзакции — задача
+process_payment очереди api_job «payments», поэтому перезапуск процесса не
+теряет платежи. Ни номер карты, ни CVV в базу не попадают: задача получает
+только токен. Клиент опрашивает дешёвый эндпоинт статуса.
+
+Задача выполняется не более одного раза (max_attempts=1): повтор мог бы
+списать деньги дважды. Платёж без ответа дольше PAYMENT_TIMEOUT завершается
+ошибкой (expire_payment), но успешный ответ, пришедший позже, принимается и
+заказ становится оплаченным (finish_payment).
+
+Статусы заказа (Order.TRANSITIONS):
+    Ожидает оплаты -> Оплачивается -> Оплачен
+                      Оплачивается -> Ожидает оплаты (ошибка, можно повторить)
+
+Платёжная система подключается настройкой PAYMENT_PROCESSOR — путь к классу
+с методом charge(); FakePaymentProcessor работает без внешних сервисов.
+"""
+
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api_job.queue import job
+from .models import Order, Payment
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_ERROR = "Истекло время ожидания оплаты"
+
+
+class PaymentRejected(Exception):
+    """Заказ нельзя оплатить в текущем статусе"""
+
+
+@dataclass(frozen=True)
+class Card:
+    number: str
+    name: str
+    month: str
+    year: str
+    code: str
+
+
+@dataclass(frozen=True)
+class ChargeResult:
+    success: bool
+    transaction_id: str = ""
+    error: str = ""
+
+
+class PaymentProcessor:
+    """Интерфейс платёжной системы"""
+
+    def tokenize(self, card: Card) -> str:
+        """Передаёт данные карты платёжной системе и возвращает токен для charge()"""
+        raise NotImplementedError
+
+    def charge(self, amount, token: str, reference: str) -> ChargeResult:
+        raise NotImplementedError
+
+
+class FakePaymentProcessor(PaymentProcessor):
+    """
+    Платёжная система для разработки и тестов: оплата проходит, если номер
+    карты чётный и не оканчивается нулём. PAYMENT_FAKE_DELAY (секунды)
+    имитирует задержку ответа
+    """
+
+    def tokenize(self, card: Card) -> str:
+        # Исход платежа зависит только от последней цифры, её и хранит токен
+        return f"fake_{card.number[-4:]}_{uuid.uuid4().hex[:12]}"
+
+    def charge(self, amount, token: str, reference: str) -> ChargeResult:
+        delay = getattr(settings, "PAYMENT_FAKE_DELAY", 0)
+        if delay:
+            time.sleep(delay)
+        number = int(token.split("_")[1])
+        if number % 2 or number % 10 == 0:
+            return ChargeResult(False, error="Платёж отклонён банком")
+        return ChargeResult(True, transaction_id=f"fake-{reference}-{uuid.uuid4().hex[:12]}")
+
+
+def get_processor() -> PaymentProcessor:
+    return import_string(settings.PAYMENT_PROCESSOR)()
+
+
+def start_payment(order_id, user, card: Card) -> Payment:
+    """
+    Переводит заказ пользователя в «Оплачивается» и ставит платёж в очередь.
+    Условный UPDATE не даёт оплатить заказ дважды параллельными запросами
+    """
+    token = get_processor().tokenize(card)
+    with transaction.atomic():
+        if not Order.transition(
+            order_id,
+            Order.Status.AWAITING_PAYMENT,
+            Order.Status.PAYMENT_PROCESSING,
+            user__user=user,
+        ):
+            raise PaymentRejected(order_id)
+        amount = Order.objects.filter(pk=order_id).values_list("totalCost", flat=True).get()
+        payment = Payment.objects.create(
+            order_id=order_id, amount=amount, card_last4=card.number[-4:]
+        )
+        process_payment.enqueue(args=[payment.pk, token], key=f"payment:{payment.pk}")
+    logger.info("Платёж %s по заказу %s поставлен в очередь", payment.pk, order_id)
+    return payment
+
+
+@job(queue="payments", max_attempts=1)
+def process_payment(payment_id, token):
+    """Проводит платёж через платёжную систему и завершает переходы статусов"""
+    if not Payment.objects.filter(pk=payment_id, status=Payment.Status.PENDING).update(
+        status=Payment.Status.PROCESSING, updated_at=timezone.now()
+    ):
+        return
+    payment = Payment.objects.only("order_id", "amount").get(pk=payment_id)
+    try:
+        result = get_processor().charge(payment.amount, token, reference=str(payment_id))
+    except Exception:
+        logger.exception("Платёжная система не ответила по платежу %s", payment_id)
+        result = ChargeResult(False, error="Платёжная система недоступна")
+    finish_payment(payment, result)
+
+
+def finish_payment(payment: Payment, result: ChargeResult):
+    with transaction.atomic():
+        updated = Payment.objects.filter(pk=payment.pk, status=Payment.Status.PROCESSING).update(
+            status=Payment.Status.SUCCEEDED if result.success else Payment.Status.FAILED,
+            transaction_id=result.transaction_id,
+            error=result.error,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            # Деньги списаны после того, как платёж сочли просроченным: принимаем оплату
+            if not result.success or not Payment.objects.filter(
+                pk=payment.pk, status=Payment.Status.FAILED, error=TIMEOUT_ERROR
+            ).update(
+                status=Payment.Status.SUCCEEDED,
+                transaction_id=result.transaction_id,
+                error="",
+                updated_at=timezone.now(),
+            ):
+                return
+            logger.warning("Платёж %s прошёл после истечения времени ожидания", payment.pk)
+        if result.success:
+            order = Order.objects.select_for_update().get(pk=payment.order_id)
+            # «Ожидает оплаты» — заказ вернули туда по таймауту этого же платежа
+            if order.status in (Order.Status.PAYMENT_PROCESSING, Order.Status.AWAITING_PAYMENT):
+                # Через save(), чтобы оплата попала в отчёты (post_save)
+                order.status = Order.Status.PAID
+                order.save(update_fields=["status"])
+            elif order.status != Order.Status.PAID:
+                logger.error(
+                    "Платёж %s прошёл, но заказ %s уже в статусе «%s»: нужен возврат",
+                    payment.pk,
+                    payment.order_id,
+                    order.status,
+                )
+        else:
+            Order.transition(
+                payment.order_id, Order.Status.PAYMENT_PROCESSING, Order.Status.AWAITING_PAYMENT
+            )
+    logger.info(
+        "Платёж %s по заказу %s: %s %s",
+        payment.pk,
+        payment.order_id,
+        "успешно" if result.success else "ошибка",
+        result.error,
+    )
+
+
+def expire_payment(payment: dict) -> bool:
+    """
+    Завершает ошибкой платёж, не получивший ответа за PAYMENT_TIMEOUT секунд
+    (например, очередь стоит), чтобы заказ можно было оплатить снова. Если
+    платёж всё же пройдёт, finish_payment примет его поздний успешный ответ
+    """
+    if payment["status"] in Payment.FINAL_STATUSES:
+        return False
+    if payment["created_at"] > timezone.now() - timedelta(seconds=settings.PAYMENT_TIMEOUT):
+        return False
+    with transaction.atomic():
+        if not Payment.objects.filter(
+            pk=payment["id"], status__in=[Payment.Status.PENDING, Payment.Status.PROCESSING]
+        ).update(status=Payment.Status.FAILED, error=TIMEOUT_ERROR):
+            return False
+        Order.transition(
+            payment["order_id"], Order.Status.PAYMENT_PROCESSING, Order.Status.AWAITING_PAYMENT
+        )
+    logger.warning("Платёж %s по заказу %s просрочен", payment["id"], payment["order_id"])
+    return True
@@ -1,7 +1,10 @@
 from rest_framework import serializers
 
-from .models import Order
-from api_product.serializers import ProductContractSerializer
+from django.core.files.storage import default_storage
+
+from api_auth.profile_cache import get_profile_data
+
+from .models import ArchivedOrder, Order
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -9,34 +12,109 @@ class OrderSerializer(serializers.ModelSerializer):
     Сериализатор заказа
     """
 
-    # products = ProductContractSerializer(many=True, required=True)
     products = serializers.SerializerMethodField()
-    fullName = serializers.StringRelatedField()
-    email = serializers.StringRelatedField()
-    phone = serializers.StringRelatedField()
+    fullName = serializers.SerializerMethodField()
+    email = serializers.SerializerMethodField()
+    phone = serializers.SerializerMethodField()
     createdAt = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
 
     class Meta:
         model = Order
         fields = "__all__"
 
-    def get_products(self, obj):
-        items = (
-            obj.items.select_related('product')
-            .prefetch_related('product__images', 'product__tags')
-            .all()
-        )
-
-        # Явно передаем контекст с request
-        product_serializer = ProductContractSerializer(
-            [item.product for item in items],
-            many=True,
-            context={'request': self.context.get('request')},  # Критически важно!
-        )
-
-        products_data = product_serializer.data
-        for product_data, item in zip(products_data, items):
-            product_data['count'] = item.count
-            product_data['price'] = item.price
-
-        return products_data
+    def _buyer(self, obj):
+        # Заказы пользователя запроса: данные покупателя из кэша профиля
+        # (context['buyer']), без чтения профиля для каждого заказа
+        buyer = self.context.get('buyer')
+        if buyer is not None and buyer['id'] == obj.user_id:
+            return buyer
+        return {'fullName': obj.fullName, 'email': obj.email, 'phone': obj.phone}
+
+    def get_fullName(self, obj) -> str:
+        return self._buyer(obj)['fullName']
+
+    def get_email(self, obj) -> str:
+        return self._buyer(obj)['email']
+
+    def get_phone(self, obj) -> str | None:
+        phone = self._buyer(obj)['phone']
+        return None if phone is None else str(phone)
+
+    def get_products(self, obj) -> list[dict]:
+        # Товары отображаются из снимков позиций (см. OrdersAPIView.get_queryset):
+        # ни каталог, ни изображения, ни теги не читаются
+        request = self.context.get('request')
+        return [self.render_item(item, request) for item in obj.items.all()]
+
+    @staticmethod
+    def render_item(item, request) -> dict:
+        snapshot = item.snapshot
+        image = snapshot.get('image')
+        images = []
+        if image and image.get('src'):
+            url = default_storage.url(image['src'])
+            images.append(
+                {
+                    'src': request.build_absolute_uri(url) if request else url,
+                    'alt': image.get('alt', ''),
+                }
+            )
+        return {
+            'id': snapshot.get('id', item.product_id),
+            'category': snapshot.get('category'),
+            'title': snapshot.get('title', ''),
+            'description': snapshot.get('description', ''),
+            'freeDelivery': snapshot.get('freeDelivery', False),
+            'images': images,
+            'tags': snapshot.get('tags', []),
+            'count': item.count,
+            'price': item.price,
+        }
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор архивного заказа: те же поля, что у OrderSerializer.
+    Архив доступен только владельцу, поэтому данные покупателя берутся из кэша
+    профиля пользователя запроса
+    """
+
+    products = serializers.SerializerMethodField()
+    fullName = serializers.SerializerMethodField()
+    email = serializers.SerializerMethodField()
+    phone = serializers.SerializerMethodField()
+    user = serializers.IntegerField(source="user_id")
+    createdAt = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
+
+    class Meta:
+        model = ArchivedOrder
+        exclude = ["archivedAt"]
+
+    def _buyer(self):
+        return self.context.get('buyer') or get_profile_data(self.context['request'].user)
+
+    def get_fullName(self, obj) -> str:
+        return self._buyer()['fullName']
+
+    def get_email(self, obj) -> str:
+        return self._buyer()['email']
+
+    def get_phone(self, obj) -> str | None:
+        phone = self._buyer()['phone']
+        return None if phone is None else str(phone)
+
+    def get_products(self, obj) -> list[dict]:
+        request = self.context.get('request')
+        return [OrderSerializer.render_item(item, request) for item in obj.items.all()]
+
+
+class PaymentSerializer(serializers.Serializer):
+    """
+    Данные карты для оплаты заказа (формат фронтенда: payment.js)
+    """
+
+    number = serializers.RegexField(r"^\d{8,19}$")
+    name = serializers.CharField(max_length=255)
+    month = serializers.IntegerField(min_value=1, max_value=12)
+    year = serializers.IntegerField(min_value=2000, max_value=2100)
+    code = serializers.RegexField(r"^\d{3,4}$")
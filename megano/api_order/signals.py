@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import DeliverySettings, Order, OrderItem
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def update_order_totals(sender, instance, raw=False, **kwargs):
+    """
+    Пересчитывает итоги заказа при изменении отдельной позиции (например, в админке).
+    Массовые изменения при оформлении заказа пересчитывают итоги сами
+    """
+    if raw or instance.order_id is None:
+        return
+    # Позиции удаляются каскадом вместе с заказом (например, при архивировании) —
+    # пересчитывать итоги удаляемого заказа незачем
+    origin = kwargs.get("origin")
+    if isinstance(origin, Order) or (isinstance(origin, QuerySet) and origin.model is Order):
+        return
+    Order.update_totals([instance.order_id])
+
+
+@receiver([post_save, post_delete], sender=DeliverySettings)
+def invalidate_delivery_settings(sender, **kwargs):
+    # Сразу — чтобы текущий процесс видел изменения внутри транзакции,
+    # и после фиксации — чтобы другие процессы не закэшировали старые значения
+    DeliverySettings.bump_version()
+    transaction.on_commit(DeliverySettings.bump_version)
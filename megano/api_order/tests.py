@@ -1,3 +1,534 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from api_auth.models import Profile
+from api_job.models import Job
+from api_job.queue import work
+from api_product.models import Category, Product, ProductImage, Tag
+from api_transaction.models import Basket
+from .archive import archive_batch
+from .checkout import apply_order_lines
+from .models import ArchivedOrder, DeliverySettings, ExportWatermark, Order, OrderItem, Payment
+from .payment import ChargeResult, finish_payment
+
+
+class CheckoutTestCase(TestCase):
+    """
+    Оформление заказа: цены с сервера, атомарное списание остатков
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="secret-pass-123")
+        Profile.objects.create(user=cls.user, fullName="Buyer")
+        DeliverySettings.objects.create()
+        category = Category.objects.create(title="Electronics")
+        cls.phone = Product.objects.create(category=category, title="Phone", price=1000, count=5)
+        cls.laptop = Product.objects.create(category=category, title="Laptop", price=3000, count=1)
+        cls.url = reverse("api_order:orders-list")
+
+    def setUp(self):
+        caches[settings.BASKET_CACHE_ALIAS].clear()
+        self.client.force_login(self.user)
+
+    def test_checkout_prices_server_side_and_decrements_stock(self):
+        Basket.objects.create(user=self.user, product=self.phone, count=2)
+
+        response = self.client.post(
+            self.url,
+            [
+                {"id": self.phone.id, "count": 2, "price": 1},
+                {"id": self.laptop.id, "count": 1, "price": 1},
+            ],
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data["orderId"])
+        prices = dict(order.items.values_list("product_id", "price"))
+        self.assertEqual(prices, {self.phone.id: Decimal(1000), self.laptop.id: Decimal(3000)})
+        self.assertEqual(order.totalCost, Decimal(5000))
+        self.phone.refresh_from_db()
+        self.laptop.refresh_from_db()
+        self.assertEqual((self.phone.count, self.laptop.count), (3, 0))
+        self.assertFalse(Basket.objects.filter(user=self.user).exists())
+
+    def test_shortage_rolls_back_whole_order(self):
+        response = self.client.post(
+            self.url,
+            [{"id": self.phone.id, "count": 1}, {"id": self.laptop.id, "count": 2}],
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["products"], [self.laptop.id])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.count, 5)
+
+    def test_confirm_moves_order_to_awaiting_payment(self):
+        order = Order.objects.create(user=self.user.profile)
+        apply_order_lines(order, {self.phone.id: 1}, existing={})
+        url = reverse("api_order:order-detail", args=[order.pk])
+        payload = {
+            "city": "Moscow",
+            "address": "Red Square, 1",
+            "products": [{"id": self.phone.id, "count": 2}],
+        }
+
+        response = self.client.post(url, payload, content_type="application/json")
+
+        self.assertEqual(response.status_code, 201)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.city), (Order.Status.AWAITING_PAYMENT, "Moscow"))
+        self.assertEqual(order.items.get().count, 2)
+
+        # Оплаченный заказ не переписывается
+        Order.objects.filter(pk=order.pk).update(status=Order.Status.PAID)
+        payload["products"] = [{"id": self.phone.id, "count": 5}]
+        response = self.client.post(url, payload, content_type="application/json")
+
+        self.assertEqual(response.status_code, 409)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.PAID)
+        self.assertEqual(order.items.get().count, 2)
+        self.assertEqual(Product.objects.get(pk=self.phone.pk).count, 3)
+
+    def test_changing_lines_keeps_existing_price_and_snapshot(self):
+        order = Order.objects.create(user=self.user.profile)
+        apply_order_lines(order, {self.phone.id: 1}, existing={})
+        Product.objects.filter(pk=self.phone.pk).update(price=1500)
+
+        apply_order_lines(order, {self.phone.id: 2, self.laptop.id: 1})
+
+        items = {item.product_id: item for item in order.items.all()}
+        self.assertEqual(items[self.phone.id].count, 2)
+        self.assertEqual(items[self.phone.id].price, Decimal(1000))
+        self.assertEqual(Decimal(items[self.phone.id].snapshot["price"]), Decimal(1000))
+        self.assertEqual(items[self.laptop.id].price, Decimal(3000))
+        self.assertEqual(order.totalCost, Decimal(5000))
+
+    def stock(self):
+        return dict(
+            Product.objects.filter(pk__in=[self.phone.pk, self.laptop.pk]).values_list(
+                "pk", "count"
+            )
+        )
+
+    def test_cancelled_order_returns_stock_once(self):
+        order = Order.objects.create(user=self.user.profile)
+        apply_order_lines(order, {self.phone.id: 2, self.laptop.id: 1}, existing={})
+        self.assertEqual(self.stock(), {self.phone.pk: 3, self.laptop.pk: 0})
+
+        self.assertTrue(Order.transition(order.pk, Order.Status.NEW, Order.Status.CANCELLED))
+        self.assertFalse(Order.transition(order.pk, Order.Status.NEW, Order.Status.CANCELLED))
+        self.assertEqual(self.stock(), {self.phone.pk: 5, self.laptop.pk: 1})
+
+        # Отмена в админке (сохранение модели) тоже возвращает товар
+        order = Order.objects.create(user=self.user.profile)
+        apply_order_lines(order, {self.phone.id: 1}, existing={})
+        order.refresh_from_db()
+        order.status = Order.Status.CANCELLED
+        order.save()
+        order.save()
+        self.assertEqual(self.stock(), {self.phone.pk: 5, self.laptop.pk: 1})
+
+    def test_unconfirmed_orders_expire(self):
+        stale = Order.objects.create(user=self.user.profile)
+        apply_order_lines(stale, {self.phone.id: 2}, existing={})
+        fresh = Order.objects.create(user=self.user.profile)
+        apply_order_lines(fresh, {self.laptop.id: 1}, existing={})
+        Order.objects.filter(pk=stale.pk).update(createdAt=timezone.now() - timedelta(days=2))
+
+        out = StringIO()
+        call_command("expire_orders", "--hours", "24", stdout=out)
+
+        self.assertIn("Отменено заказов: 1", out.getvalue())
+        statuses = dict(Order.objects.values_list("pk", "status"))
+        self.assertEqual(statuses, {stale.pk: Order.Status.CANCELLED, fresh.pk: Order.Status.NEW})
+        self.assertEqual(self.stock(), {self.phone.pk: 5, self.laptop.pk: 0})
+
+
+class OrderHistoryTestCase(TestCase):
+    """
+    История заказов: фиксированное число запросов и keyset-пагинация
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="secret-pass-123")
+        cls.profile = Profile.objects.create(user=cls.user, fullName="Buyer", phone=79001234567)
+        DeliverySettings.objects.create()
+        category = Category.objects.create(title="Electronics")
+        tags = [Tag.objects.create(name=f"tag-{i}") for i in range(2)]
+        cls.products = []
+        for i in range(3):
+            product = Product.objects.create(
+                category=category, title=f"Product {i}", price=10, count=100
+            )
+            product.tags.set(tags)
+            ProductImage.objects.create(product=product, src=f"products/p{i}.jpg")
+            cls.products.append(product)
+        cls.url = reverse("api_order:orders-list")
+
+    def create_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(user=self.profile)
+            apply_order_lines(order, {product.id: 1 for product in self.products}, existing={})
+
+    # Счётчики лимитов запросов — в общем кэше вне БД, как Redis в production
+    @override_settings(
+        CACHES={
+            **settings.CACHES,
+            "shared": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "test-shared",
+            },
+        }
+    )
+    def test_history_query_count_does_not_grow(self):
+        self.client.force_login(self.user)
+        caches[settings.PROFILE_CACHE_ALIAS].clear()
+        self.client.get(self.url)
+        for count in (11, 10):
+            self.create_orders(count)
+            # сессия из таблицы кэша, пользователь, заказы, самый новый архивный заказ,
+            # позиции со снимками товаров (профиль — из кэша); архивная страница не читается
+            with self.assertNumQueries(5):
+                response = self.client.get(self.url, {"limit": 10})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(response.data[0]["fullName"], "Buyer")
+        self.assertEqual(len(response.data[0]["products"]), 3)
+        self.assertEqual(len(response.data[0]["products"][0]["tags"]), 2)
+
+    def test_order_renders_from_snapshot_after_catalog_changes(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(title="Renamed", price=99)
+        deleted_id = self.products[1].pk
+        Product.objects.filter(pk=deleted_id).delete()
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("api_order:order-detail", args=[order.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        products = {item["id"]: item for item in response.data["products"]}
+        self.assertEqual(products[product.pk]["title"], "Product 0")
+        self.assertEqual(products[product.pk]["price"], Decimal(10))
+        self.assertTrue(products[product.pk]["images"][0]["src"].endswith("products/p0.jpg"))
+        self.assertEqual(products[deleted_id]["title"], "Product 1")
+
+    def test_keyset_pagination_walks_all_orders(self):
+        self.create_orders(5)
+        self.client.force_login(self.user)
+
+        seen = []
+        url, params = self.url, {"limit": 2}
+        while url:
+            response = self.client.get(url, params)
+            seen.extend(order["id"] for order in response.data)
+            link = response.headers.get("Link")
+            url = link[1 : link.index(">")] if link else None
+            params = None
+
+        expected = list(Order.objects.order_by("-createdAt", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_history_without_cursor_or_limit_is_complete(self):
+        # Фронтенд не читает Link: без параметров приходит вся история, а не первые 20
+        self.create_orders(25)
+        self.client.force_login(self.user)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(len(response.data), 25)
+        self.assertNotIn("Link", response.headers)
+
+    def test_history_falls_back_to_archive(self):
+        self.create_orders(5)
+        Order.objects.filter(pk__in=list(Order.objects.values_list("pk", flat=True)[:3])).update(
+            status=Order.Status.COMPLETED, createdAt=timezone.now() - timedelta(days=400)
+        )
+        expected = list(Order.objects.order_by("-createdAt", "-id").values_list("id", flat=True))
+        total = Order.objects.filter(status=Order.Status.COMPLETED).first().totalCost
+
+        call_command("archive_orders", days=365, batch_size=2, stdout=StringIO())
+
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+        self.assertEqual(ArchivedOrder.objects.first().totalCost, total)
+        self.client.force_login(self.user)
+        first = self.client.get(self.url, {"limit": 2})
+        link = first.headers["Link"]
+        second = self.client.get(link[1 : link.index(">")])
+        third = self.client.get(second.headers["Link"][1 : second.headers["Link"].index(">")])
+        seen = [order["id"] for page in (first, second, third) for order in page.data]
+        self.assertEqual(seen, expected)
+        self.assertNotIn("Link", third.headers)
+        archived = third.data[0]
+        self.assertEqual((archived["fullName"], archived["status"]), ("Buyer", "Выполнен"))
+        self.assertEqual(archived["phone"], "79001234567")
+        self.assertEqual(first.data[0]["phone"], "79001234567")
+        self.assertEqual(archived["products"][0]["title"], "Product 0")
+
+        detail = self.client.get(reverse("api_order:order-detail", args=[expected[-1]]))
+        self.assertEqual(detail.status_code, 200)
+        self.assertEqual(len(detail.data["products"]), 3)
+
+    def test_history_merges_interleaved_archive(self):
+        self.create_orders(6)
+        now = timezone.now()
+        # Незавершённые заказы остаются в горячей таблице и перемежаются с архивом
+        orders = list(Order.objects.order_by("id"))
+        for order, days, archived in zip(
+            orders, (600, 500, 450, 420, 1, 0), (False, False, True, False, True, False)
+        ):
+            Order.objects.filter(pk=order.pk).update(
+                createdAt=now - timedelta(days=days),
+                status=Order.Status.COMPLETED if archived else order.status,
+            )
+        expected = list(Order.objects.order_by("-createdAt", "-id").values_list("id", flat=True))
+
+        call_command("archive_orders", days=0, batch_size=10, stdout=StringIO())
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+        self.client.force_login(self.user)
+
+        seen = []
+        url, params = self.url, {"limit": 2}
+        while url:
+            response = self.client.get(url, params)
+            seen.extend(order["id"] for order in response.data)
+            link = response.headers.get("Link")
+            url = link[1 : link.index(">")] if link else None
+            params = None
+
+        self.assertEqual(seen, expected)
+
+
+class OrderTotalsTestCase(TestCase):
+    """
+    Итоги заказа пересчитываются в БД только при изменении позиций или доставки
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="buyer")
+        cls.profile = Profile.objects.create(user=user, fullName="Buyer")
+        category = Category.objects.create(title="Electronics")
+        cls.product = Product.objects.create(category=category, title="Phone", price=500)
+
+    def setUp(self):
+        self.settings = DeliverySettings.objects.create(
+            EXPRESS_DELIVERY_COST=300, FREE_DELIVERY_THRESHOLD=1000, REGULAR_DELIVERY_COST=100
+        )
+        self.order = Order.objects.create(user=self.profile)
+
+    def test_item_changes_update_totals(self):
+        item = OrderItem.objects.create(order=self.order, product=self.product, price=500, count=1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.totalCost, Decimal(600))
+
+        item.count = 3
+        item.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.totalCost, Decimal(1500))
+
+    def test_status_change_does_not_recalculate(self):
+        order = Order.objects.get(pk=self.order.pk)
+        DeliverySettings.get_solo()
+        order.status = Order.Status.AWAITING_PAYMENT
+        with self.assertNumQueries(1):
+            order.save()
+
+    def test_delivery_change_uses_cached_settings(self):
+        OrderItem.objects.create(order=self.order, product=self.product, price=500, count=1)
+        order = Order.objects.get(pk=self.order.pk)
+        self.settings.EXPRESS_DELIVERY_COST = 700
+        self.settings.save()
+        DeliverySettings.get_solo()
+
+        order.deliveryType = "express"
+        # сохранение, версия настроек из таблицы общего кэша (с Redis — без SQL),
+        # пересчёт итогов, чтение totalCost — сами настройки не перечитываются
+        with self.assertNumQueries(4):
+            order.save()
+        self.assertEqual(order.totalCost, Decimal(1200))
+
+    def test_settings_version_is_shared(self):
+        self.assertEqual(DeliverySettings.get_solo().EXPRESS_DELIVERY_COST, 300)
+        # Настройки изменил другой процесс: у этого процесса остался только общий кэш
+        DeliverySettings.objects.filter(pk=self.settings.pk).update(EXPRESS_DELIVERY_COST=900)
+        caches[settings.DELIVERY_SETTINGS_CACHE_ALIAS].set(
+            "delivery_settings:version", "other-worker", None
+        )
+
+        self.assertEqual(DeliverySettings.get_solo().EXPRESS_DELIVERY_COST, 900)
+
+
+class OrderExportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="accountant", is_staff=True)
+        user = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.profile = Profile.objects.create(user=user, fullName="Buyer")
+        DeliverySettings.objects.create()
+        category = Category.objects.create(title="Electronics")
+        cls.product = Product.objects.create(category=category, title="Phone", price=10, count=9)
+        cls.url = reverse("api_order:orders-export")
+
+    def checkout(self):
+        order = Order.objects.create(user=self.profile)
+        apply_order_lines(order, {self.product.id: 1}, existing={})
+        return order
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_requires_staff(self):
+        self.client.force_login(self.profile.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_csv_and_jsonl_export(self):
+        order = self.checkout()
+        self.client.force_login(self.staff)
+
+        header, row = self.export().splitlines()
+        self.assertTrue(header.startswith("orderId,createdAt"))
+        self.assertIn("buyer@example.com", row)
+
+        data = json.loads(self.export(type="jsonl"))
+        self.assertEqual((data["orderId"], data["title"]), (order.pk, "Phone"))
+
+    def test_watermark_exports_only_new_orders(self):
+        self.checkout()
+        self.client.force_login(self.staff)
+        self.assertEqual(len(self.export(type="jsonl", watermark="daily").splitlines()), 1)
+
+        latest = self.checkout()
+        lines = self.export(type="jsonl", watermark="daily").splitlines()
+
+        self.assertEqual([json.loads(line)["orderId"] for line in lines], [latest.pk])
+        self.assertEqual(ExportWatermark.objects.get(name="daily").last_order_id, latest.pk)
+
+    def test_archived_orders_are_exported(self):
+        archived = self.checkout()
+        Order.objects.filter(pk=archived.pk).update(status=Order.Status.COMPLETED)
+        archive_batch([archived.pk])
+        hot = self.checkout()
+        self.client.force_login(self.staff)
+
+        today = timezone.localdate().isoformat()
+        lines = self.export(type="jsonl", dateFrom=today, dateTo=today).splitlines()
+
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["orderId"] for row in rows], [archived.pk, hot.pk])
+        self.assertEqual(rows[0]["status"], Order.Status.COMPLETED)
+        self.assertEqual(
+            (rows[0]["email"], rows[0]["fullName"], rows[0]["title"]),
+            ("buyer@example.com", "Buyer", "Phone"),
+        )
+
+
+@override_settings(PAYMENT_FAKE_DELAY=0)
+class PaymentTestCase(TestCase):
+    """
+    Оплата ставится в очередь, статус заказа меняется по переходам Order.TRANSITIONS
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer")
+        profile = Profile.objects.create(user=cls.user, fullName="Buyer")
+        DeliverySettings.objects.create()
+        category = Category.objects.create(title="Electronics")
+        product = Product.objects.create(category=category, title="Phone", price=10, count=9)
+        cls.order = Order.objects.create(user=profile, status=Order.Status.AWAITING_PAYMENT)
+        apply_order_lines(cls.order, {product.id: 1}, existing={})
+        cls.url = reverse("api_order:payment", args=[cls.order.pk])
+        cls.status_url = reverse("api_order:payment-status", args=[cls.order.pk])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def pay(self, number, execute=True):
+        card = {"number": number, "name": "Buyer", "month": "02", "year": "2030", "code": "123"}
+        response = self.client.post(self.url, card, content_type="application/json")
+        if execute:
+            # Обработчик очереди проводит платёж
+            work("test-worker", burst=True)
+        return response
+
+    def test_successful_payment(self):
+        response = self.pay("12345678")
+
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.headers["Location"].endswith(self.status_url))
+        # сессия из таблицы кэша, пользователь и платёж вместе со статусом заказа
+        with self.assertNumQueries(3):
+            data = self.client.get(self.status_url).data
+        self.assertEqual(data["status"], Order.Status.PAID)
+        self.assertEqual(data["payment"]["status"], Payment.Status.SUCCEEDED)
+        payment = Payment.objects.get()
+        self.assertEqual((payment.amount, payment.card_last4), (self.order.totalCost, "5678"))
+        # В очередь попал только токен платёжной системы
+        job = Job.objects.get()
+        self.assertEqual(job.queue, "payments")
+        self.assertNotIn("12345678", json.dumps(job.args))
+
+    def test_declined_payment_can_be_retried(self):
+        self.pay("12345670")
+
+        detail = self.client.get(reverse("api_order:order-detail", args=[self.order.pk])).data
+        self.assertEqual(detail["status"], Order.Status.AWAITING_PAYMENT)
+        self.assertEqual(detail["paymentError"], "Платёж отклонён банком")
+
+        self.assertEqual(self.pay("12345672").status_code, 202)
+        self.assertEqual(self.client.get(self.status_url).data["status"], Order.Status.PAID)
+
+    def test_order_in_processing_is_not_charged_twice(self):
+        self.pay("12345678", execute=False)
+
+        self.assertEqual(self.pay("12345678", execute=False).status_code, 409)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(
+            self.client.get(self.status_url).data["status"], Order.Status.PAYMENT_PROCESSING
+        )
+
+    def test_late_success_after_timeout_is_accepted(self):
+        self.pay("12345678", execute=False)
+        payment = Payment.objects.get()
+        # Платёж уже у платёжной системы, ответа нет дольше PAYMENT_TIMEOUT
+        Payment.objects.filter(pk=payment.pk).update(
+            status=Payment.Status.PROCESSING,
+            created_at=timezone.now() - timedelta(seconds=settings.PAYMENT_TIMEOUT + 1),
+        )
+        data = self.client.get(self.status_url).data
+        self.assertEqual(data["status"], Order.Status.AWAITING_PAYMENT)
+        self.assertEqual(data["payment"]["status"], Payment.Status.FAILED)
+
+        finish_payment(payment, ChargeResult(True, transaction_id="late"))
+
+        payment.refresh_from_db()
+        self.assertEqual(
+            (payment.status, payment.transaction_id), (Payment.Status.SUCCEEDED, "late")
+        )
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, Order.Status.PAID)
+        # Задача просроченного платежа больше не списывает деньги
+        work("test-worker", burst=True)
+        self.assertEqual(Payment.objects.get().status, Payment.Status.SUCCEEDED)
@@ -1,10 +1,19 @@
 from django.urls import path
 
-from .views import OrdersAPIView, OrderDetailAPIView
+from .views import (
+    OrdersAPIView,
+    OrderDetailAPIView,
+    OrderExportView,
+    PaymentAPIView,
+    PaymentStatusAPIView,
+)
 
 app_name = "api_order"
 
 urlpatterns = [
     path('orders', OrdersAPIView.as_view(), name='orders-list'),
     path('order/<int:pk>', OrderDetailAPIView.as_view(), name='order-detail'),
+    path('orders/export', OrderExportView.as_view(), name='orders-export'),
+    path('payment/<int:pk>', PaymentAPIView.as_view(), name='payment'),
+    path('payment/<int:pk>/status', PaymentStatusAPIView.as_view(), name='payment-status'),
 ]
@@ -3,155 +3,324 @@ import logging
 from rest_framework.request import Request
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import status, permissions
+
+from datetime import date
 
 from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.db.models import Prefetch
+
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 
-from .models import Order, OrderItem
-from .serializers import OrderSerializer
-from api_product.models import Product
-from api_transaction.models import Basket
+from .checkout import CheckoutError, apply_order_lines, parse_lines
+from .export import FORMATS, parse_date_range, stream_export
+from .models import ArchivedOrder, Order, OrderItem, Payment
+from .pagination import OrderHistoryPagination
+from .payment import Card, PaymentRejected, expire_payment, start_payment
+from .serializers import ArchivedOrderSerializer, OrderSerializer, PaymentSerializer
+from api_auth.profile_cache import get_profile_data, get_profile_id
+from api_transaction.storage import get_basket_storage
 
 
 logger = logging.getLogger(__name__)
 
 
+def archived_orders(user):
+    """Архивные заказы пользователя"""
+    return ArchivedOrder.objects.filter(user_id=get_profile_id(user)).prefetch_related('items')
+
+
+def serialize_orders(orders, request) -> list:
+    """Сериализует страницу, в которой могут быть и горячие, и архивные заказы"""
+    context = {'request': request, 'buyer': get_profile_data(request.user)}
+    return [
+        (
+            ArchivedOrderSerializer(order, context=context)
+            if isinstance(order, ArchivedOrder)
+            else OrderSerializer(order, context=context)
+        ).data
+        for order in orders
+    ]
+
+
 class OrdersAPIView(APIView):
 
+    pagination_class = OrderHistoryPagination
+    throttle_scope = 'orders'
+
+    def get_queryset(self):
+        """
+        Заказы пользователя со всем, что нужно сериализатору: позиции со снимками
+        товаров подгружаются одним запросом на страницу, каталог не читается,
+        данные покупателя берутся из кэша профиля
+        """
+        return Order.objects.filter(user_id=get_profile_id(self.request.user)).prefetch_related(
+            Prefetch(
+                'items',
+                queryset=OrderItem.objects.only(
+                    'order_id', 'product_id', 'count', 'price', 'snapshot'
+                ),
+            )
+        )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("cursor", str, description="Курсор из заголовка Link"),
+            OpenApiParameter("limit", int, description="Заказов на странице (до 100)"),
+        ],
+        responses=OrderSerializer(many=True),
+        description=(
+            "История заказов вместе с архивными, новые сначала. Без cursor и limit "
+            "возвращается вся история, иначе страница; следующая — в заголовке Link"
+        ),
+    )
     def get(self, request: Request, pk=None):
-        data = Order.objects.filter(user_id=request.user.profile.pk)
-        for i in data:
-            print("\ndata", i.pk, i.city, i.products.all(), "\n")
-            # logger.debug("GET order data: %s", i)
-        serializer = OrderSerializer(data, many=True, context={'request': request})
-        print("\nserializer.data", serializer.data, "\n")
-        # logger.debug("\nGET orders data: \n%s", "\n".join(map(str, serializer.data)))
-        return Response(serializer.data)
+        paginator = self.pagination_class()
+        orders = paginator.paginate_queryset(
+            self.get_queryset(), request, view=self, fallback=archived_orders(request.user)
+        )
+        return paginator.get_paginated_response(serialize_orders(orders, request))
 
-    @transaction.atomic
     def post(self, request: Request, *args, **kwargs):
-        print("\nrequest data", request.data, "\n")
-        # logger.debug("\nPOST order data: %s", request.data, "\n")
-
-        products_in_order = [(obj["id"], obj["count"], obj["price"]) for obj in request.data]
-        if not products_in_order:
-            return Response(
-                {"error": "Заказ не может быть пустым"}, status=status.HTTP_400_BAD_REQUEST
-            )
-        products = Product.objects.filter(id__in=[obj[0] for obj in products_in_order])
-        if products.count() != len(products_in_order):
-            missing_ids = set([obj[0] for obj in products_in_order]) - set(
-                products.values_list("id", flat=True)
-            )
+        logger.debug("POST order data: %s", request.data)
+        storage = get_basket_storage(request)
+        try:
+            lines = parse_lines(request.data)
+            with transaction.atomic():
+                order = Order.objects.create(user_id=get_profile_id(request.user))
+                apply_order_lines(order, lines, owner=storage.owner, basket=storage, existing={})
+        except CheckoutError as e:
+            logger.warning("Checkout rejected: %s %s", e.message, e.product_ids)
             return Response(
-                {"error": f"Товары с ID {missing_ids} не найдены"},
+                {"error": e.message, "products": e.product_ids},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        # Создаем словарь для быстрого доступа к цене и количеству по ID товара
-        product_info = {pid: (count, price) for pid, count, price in products_in_order}
-
-        order = Order.objects.create(
-            user=request.user.profile,
-            totalCost=sum([obj[1] * obj[2] for obj in products_in_order]),
-        )
-        data = {
-            "orderId": order.pk,
-        }
-        print("\n", products, "\n")
-        # logger.debug("\nPOST order products: %s", products.all(), "\n")
-        # Создаем OrderItem с указанием цены для каждого товара
-        order_items = [
-            OrderItem(
-                order=order,
-                product=product,
-                count=product_info[product.id][0],
-                price=product_info[product.id][1],
-            )
-            for product in products
-        ]
-        OrderItem.objects.bulk_create(order_items)
-        order.products.set(products)  # Явно устанавливаем связь между заказом и товарами
-        return Response(data, status=status.HTTP_201_CREATED)
+        return Response({"orderId": order.pk}, status=status.HTTP_201_CREATED)
 
 
 class OrderDetailAPIView(APIView):
 
+    throttle_scope = 'orders'
+
     def get(self, request: Request, pk):
         if pk:
             # Детали одного заказа
             try:
-                order = Order.objects.get(id=pk, user=request.user.profile)
-                print("\norder", order.pk, order.city, order.products.all(), "\n")
-                for i in order.products.all():
-                    print("\norder", i.pk, i.title, i.count, i.price, i.images.all(), "\n")
-                serializer = OrderSerializer(order, context={'request': request})
-                return Response(serializer.data)
+                buyer = get_profile_data(request.user)
+                order = Order.objects.prefetch_related('items').get(id=pk, user_id=buyer['id'])
+                serializer = OrderSerializer(order, context={'request': request, 'buyer': buyer})
+                data = serializer.data
+                if order.status == Order.Status.AWAITING_PAYMENT:
+                    # Причина неудачной оплаты для страницы заказа (order-detail.js)
+                    error = (
+                        order.payments.filter(status=Payment.Status.FAILED)
+                        .values_list('error', flat=True)
+                        .first()
+                    )
+                    if error:
+                        data['paymentError'] = error
+                return Response(data)
             except Order.DoesNotExist:
+                pass
+            # Завершённые старые заказы могут быть уже перенесены в архив
+            try:
+                order = archived_orders(request.user).get(id=pk)
+            except ArchivedOrder.DoesNotExist:
                 return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+            serializer = ArchivedOrderSerializer(order, context={'request': request})
+            return Response(serializer.data)
         else:
             # Список заказов
-            orders = Order.objects.filter(user=request.user.profile)
+            orders = Order.objects.filter(user_id=get_profile_id(request.user))
             serializer = OrderSerializer(orders, many=True)
             return Response(serializer.data)
 
+    # Подтверждать и менять можно только заказ, который ещё не оплачивается
+    EDITABLE_STATUSES = (Order.Status.NEW, Order.Status.AWAITING_PAYMENT)
+
     @transaction.atomic
     def post(self, request: Request, pk=None):
         try:
             data = request.data
-            print("\ndata", data, "\n")
-            # logger.debug("\nPOST order data: \n%s", "\n".join(map(str, data)), "\n")
+            logger.debug("POST order %s data: %s", pk, data)
             # Для гостевых заказов
             if not request.user.is_authenticated:
                 return Response(
                     {'error': 'Authentication required', 'redirect': '/sign-in/?next=/orders/'},
                     status=status.HTTP_403_FORBIDDEN,
                 )
-            # Создание заказа
             order_data = {
-                'user': request.user.profile,
-                # 'fullName': data.get('fullName'),
-                # 'phone': data.get('phone'),
-                # 'email': data.get('email'),
                 'deliveryType': data.get('deliveryType', 'ordinary'),
                 'city': data.get('city'),
                 'address': data.get('address'),
                 'paymentType': data.get('paymentType', 'online'),
-                'status': 'Ожидает оплаты',
             }
-            print("\norder_data", order_data, "\n")
-            # Код не сохраняет заказ
+            user_id = get_profile_id(request.user)
             if pk:
-                order = Order.objects.get(pk=pk, user=request.user.profile)
+                order = Order.objects.select_for_update().get(pk=pk, user_id=user_id)
+                if order.status not in self.EDITABLE_STATUSES:
+                    return Response(
+                        {'error': 'Заказ в статусе «%s» изменить нельзя' % order.status},
+                        status=status.HTTP_409_CONFLICT,
+                    )
                 for key, value in order_data.items():
                     setattr(order, key, value)
-                order.save()
+                order.save(update_fields=list(order_data))
             else:
-                order = Order.objects.create(**order_data)
+                order = Order.objects.create(user_id=user_id, **order_data)
 
-            # Добавление товаров
+            # Добавление товаров: цены и остатки проверяются на сервере
             products = data.get('products', [])
             if not products:
                 return Response(
                     {"error": "Заказ не может быть пустым"}, status=status.HTTP_400_BAD_REQUEST
                 )
-            for product in products:
-                OrderItem.objects.update_or_create(
-                    order=order, product_id=product['id'], defaults={'count': product['count']}
-                )
-            # Обновляем связь между заказом и товарами
-            product_ids = [product['id'] for product in products]
-            order.products.set(Product.objects.filter(id__in=product_ids))
-
-            # Очистка корзины
-            if request.user.is_authenticated:
-                Basket.objects.filter(user=request.user).delete()
-            elif 'basket' in request.session:
-                del request.session['basket']
+            storage = get_basket_storage(request)
+            apply_order_lines(order, parse_lines(products), owner=storage.owner, basket=storage)
+            if order.status == Order.Status.NEW:
+                Order.transition(order.pk, Order.Status.NEW, Order.Status.AWAITING_PAYMENT)
 
             return Response({'orderId': order.id}, status=status.HTTP_201_CREATED)
+        except Order.DoesNotExist:
+            return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+        except CheckoutError as e:
+            transaction.set_rollback(True)
+            logger.warning("Order update rejected: %s %s", e.message, e.product_ids)
+            return Response(
+                {"error": e.message, "products": e.product_ids},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         except Exception as e:
+            transaction.set_rollback(True)
             logger.error(f"Order error: {str(e)}")
             return Response(
                 {'error': 'Order processing failed'}, status=status.HTTP_400_BAD_REQUEST
             )
+
+
+class OrderExportView(APIView):
+    """
+    Потоковая выгрузка заказов для сотрудников
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    content_types = {
+        "csv": "text/csv; charset=utf-8",
+        "jsonl": "application/x-ndjson; charset=utf-8",
+    }
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("type", str, enum=FORMATS, description="csv (по умолчанию) или jsonl"),
+            OpenApiParameter("dateFrom", str, description="Начальная дата, YYYY-MM-DD"),
+            OpenApiParameter("dateTo", str, description="Конечная дата включительно"),
+            OpenApiParameter("afterId", int, description="Только заказы с большим id"),
+            OpenApiParameter(
+                "watermark", str, description="Имя инкрементальной выгрузки (вместо afterId)"
+            ),
+        ],
+        responses={200: None},
+        description="Выгрузка позиций заказов с данными заказа и покупателя (CSV/JSONL)",
+    )
+    def get(self, request: Request):
+        params = request.query_params
+        fmt = params.get("type", "csv")
+        if fmt not in FORMATS:
+            return Response(
+                {"error": "Формат должен быть одним из: %s" % ", ".join(FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            date_from = date.fromisoformat(params["dateFrom"]) if params.get("dateFrom") else None
+            date_to = date.fromisoformat(params["dateTo"]) if params.get("dateTo") else None
+            after_id = int(params["afterId"]) if params.get("afterId") else None
+        except ValueError:
+            return Response(
+                {"error": "Неверные параметры выгрузки"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        start, end = parse_date_range(date_from, date_to)
+        logger.info("Order export by %s: %s", request.user, dict(params))
+        response = StreamingHttpResponse(
+            stream_export(fmt, start, end, watermark=params.get("watermark"), after_id=after_id),
+            content_type=self.content_types[fmt],
+        )
+        response["Content-Disposition"] = 'attachment; filename="orders.%s"' % fmt
+        return response
+
+
+class PaymentAPIView(APIView):
+    """
+    Оплата заказа: платёж ставится в очередь, ответ возвращается сразу.
+    Результат — через PaymentStatusAPIView
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'orders'
+
+    @extend_schema(
+        request=PaymentSerializer,
+        responses={202: None, 400: None, 409: None},
+        description="Поставить оплату заказа в очередь",
+    )
+    def post(self, request: Request, pk):
+        serializer = PaymentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        card = Card(**{key: str(value) for key, value in serializer.validated_data.items()})
+        try:
+            payment = start_payment(pk, request.user, card)
+        except PaymentRejected:
+            if not Order.objects.filter(pk=pk, user__user=request.user).exists():
+                return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(
+                {"error": "Заказ уже оплачивается или не ожидает оплаты"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        status_url = reverse('api_order:payment-status', args=[pk])
+        return Response(
+            {"orderId": pk, "paymentId": payment.pk, "status": payment.status},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": request.build_absolute_uri(status_url)},
+        )
+
+
+class PaymentStatusAPIView(APIView):
+    """
+    Статус оплаты заказа для опроса клиентом: один запрос к БД
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(responses={200: None, 404: None}, description="Статус оплаты заказа")
+    def get(self, request: Request, pk):
+        payment = (
+            Payment.objects.filter(order_id=pk, order__user__user=request.user)
+            .order_by('-created_at', '-id')
+            .values('id', 'order_id', 'status', 'error', 'created_at', 'order__status')
+            .first()
+        )
+        if payment is None:
+            order_status = (
+                Order.objects.filter(pk=pk, user__user=request.user)
+                .values_list('status', flat=True)
+                .first()
+            )
+            if order_status is None:
+                return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"orderId": pk, "status": order_status, "payment": None})
+        if expire_payment(payment):
+            return self.get(request, pk)
+        return Response(
+            {
+                "orderId": pk,
+                "status": payment['order__status'],
+                "payment": {
+                    "id": payment['id'],
+                    "status": payment['status'],
+                    "error": payment['error'],
+                },
+            }
+        )
@@ -0,0 +1,205 @@
+"""
+Дерево категорий в памяти процесса.
+
+Всё дерево (связи родитель/потомки, изображения и количество товаров по узлам)
+загружается одним запросом и живёт в памяти до тех пор, пока не изменится версия
+в общем кэше (settings.CATEGORY_TREE_CACHE_ALIAS). Версию меняют сигналы при записи
+Category/CategoryImage, поэтому все процессы перестраивают дерево согласованно.
+Версия — случайный токен, а не счётчик: если кэш вытеснит ключ, новое значение
+не совпадёт ни с одним построенным деревом.
+"""
+
+import logging
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count
+
+from megano.images import srcset, variant_urls
+from .models import Category, CategoryImage
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = "api_product:category_tree:version"
+
+_lock = threading.Lock()
+_tree = None
+
+
+class CategoryTree:
+    """
+    Неизменяемый снимок дерева категорий произвольной глубины
+    """
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.nodes = {}
+        self.children = defaultdict(list)
+        self.roots = []
+        self._rendered = {}
+
+        storage = CategoryImage._meta.get_field("src").storage
+        for row in rows:
+            self.nodes[row["id"]] = {
+                "id": row["id"],
+                "title": row["title"],
+                "parent_id": row["parent_id"],
+                "image_url": storage.url(row["image__src"]) if row["image__src"] else None,
+                "image_alt": row["image__alt"],
+                "image_variants": row["image__variants"],
+                "products_count": row["products_count"],
+            }
+
+        for node_id, node in self.nodes.items():
+            parent_id = node["parent_id"]
+            if parent_id is None or parent_id not in self.nodes:
+                self.roots.append(node_id)
+            else:
+                self.children[parent_id].append(node_id)
+        self._break_cycles()
+
+        # Количество товаров в поддереве считаем один раз при построении
+        self.total_products = {}
+        for root_id in self.roots:
+            self._count_products(root_id)
+
+    def _walk(self, root_ids, seen):
+        stack = list(root_ids)
+        while stack:
+            node_id = stack.pop()
+            seen.add(node_id)
+            stack.extend(self.children[node_id])
+
+    def _break_cycles(self):
+        """
+        Узлы цикла в parent (A → B → A) недостижимы из корней, и обходы по ним не
+        завершились бы. Первый такой узел становится корнем, что разрывает цикл
+        """
+        seen = set()
+        self._walk(self.roots, seen)
+        for node_id, node in self.nodes.items():
+            if node_id in seen:
+                continue
+            logger.warning("Категория %s входит в цикл parent, показана как корневая", node_id)
+            self.children[node["parent_id"]].remove(node_id)
+            node["parent_id"] = None
+            self.roots.append(node_id)
+            self._walk([node_id], seen)
+
+    def _count_products(self, root_id):
+        stack = [(root_id, False)]
+        while stack:
+            node_id, visited = stack.pop()
+            if visited:
+                self.total_products[node_id] = self.nodes[node_id]["products_count"] + sum(
+                    self.total_products[child] for child in self.children[node_id]
+                )
+                continue
+            stack.append((node_id, True))
+            stack.extend((child, False) for child in self.children[node_id])
+
+    def __contains__(self, category_id):
+        return category_id in self.nodes
+
+    def subtree_ids(self, category_id) -> list:
+        """Идентификаторы категории и всех её потомков"""
+        if category_id not in self.nodes:
+            return []
+        result, stack = [], [category_id]
+        while stack:
+            node_id = stack.pop()
+            result.append(node_id)
+            stack.extend(self.children[node_id])
+        return result
+
+    def breadcrumbs(self, category_id) -> list:
+        """Путь от корня до категории: [{"id", "title"}, ...]"""
+        path = []
+        node = self.nodes.get(category_id)
+        while node is not None:
+            path.append({"id": node["id"], "title": node["title"]})
+            node = self.nodes.get(node["parent_id"])
+        path.reverse()
+        return path
+
+    def _render_node(self, node_id, request, with_counts):
+        node = self.nodes[node_id]
+        image = None
+        if node["image_url"]:
+            variants = variant_urls(node["image_variants"], request)
+            image = {
+                "src": request.build_absolute_uri(node["image_url"]),
+                "alt": node["image_alt"],
+                "srcset": srcset(variants),
+                "variants": variants,
+            }
+        data = {"id": node["id"], "title": node["title"], "image": image}
+        if with_counts:
+            data["productsCount"] = self.total_products[node_id]
+        data["subcategories"] = [
+            self._render_node(child, request, with_counts) for child in self.children[node_id]
+        ]
+        return data
+
+    def as_list(self, request) -> list:
+        """
+        Всё дерево в формате CategorySerializer. Результат кэшируется по базовому URL,
+        так как абсолютные ссылки на изображения зависят только от хоста запроса.
+        """
+        base_url = request.build_absolute_uri("/")
+        rendered = self._rendered.get(base_url)
+        if rendered is None:
+            rendered = [self._render_node(root, request, False) for root in self.roots]
+            self._rendered[base_url] = rendered
+        return rendered
+
+    def as_subtree(self, category_id, request) -> dict:
+        data = self._render_node(category_id, request, True)
+        data["breadcrumbs"] = self.breadcrumbs(category_id)
+        return data
+
+
+def _load_rows():
+    return list(
+        Category.objects.order_by("id")
+        .values("id", "title", "parent_id", "image__src", "image__alt", "image__variants")
+        .annotate(products_count=Count("products"))
+    )
+
+
+def _version_cache():
+    return caches[settings.CATEGORY_TREE_CACHE_ALIAS]
+
+
+def get_tree_version() -> str:
+    cache = _version_cache()
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_CACHE_KEY, version, timeout=None):
+            version = cache.get(VERSION_CACHE_KEY, version)
+    return version
+
+
+def bump_tree_version():
+    """Инвалидирует дерево во всех процессах"""
+    _version_cache().set(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+    logger.debug("Версия дерева категорий изменена")
+
+
+def get_category_tree() -> CategoryTree:
+    global _tree
+    version = get_tree_version()
+    tree = _tree
+    if tree is not None and tree.version == version:
+        return tree
+    with _lock:
+        if _tree is None or _tree.version != version:
+            _tree = CategoryTree(_load_rows(), version)
+            logger.info(
+                "Дерево категорий перестроено: %d узлов, версия %s", len(_tree.nodes), version
+            )
+        return _tree
@@ -0,0 +1,31 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Avg, Count
+
+from api_job.queue import job
+from .models import Product, Review
+
+logger = logging.getLogger(__name__)
+
+
+@job(queue="default", priority=5)
+def update_product_rating(product_id):
+    """
+    Пересчитывает reviews_count и rating продукта по его отзывам
+    """
+    with transaction.atomic():
+        product = Product.objects.filter(id=product_id).select_for_update().first()
+
+        if not product:
+            return
+
+        reviews_data = Review.objects.filter(product_id=product.id).aggregate(
+            avg_rating=Avg("rate"), reviews_count=Count("id")
+        )
+
+        Product.objects.filter(id=product.id).update(
+            rating=reviews_data["avg_rating"] or 0,
+            reviews_count=reviews_data["reviews_count"],
+        )
+        logger.debug("Отзывы для продукта %s обновлены", product.id)
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management import BaseCommand
+from django.db import connections
+
+from megano.images import IMAGE_MODELS, build_variants, is_stale
+
+
+def _init_worker():
+    # Дочерний процесс не должен использовать соединения родителя
+    connections.close_all()
+
+
+def _build(label, pk, force):
+    build_variants(label, pk, force=force)
+
+
+class Command(BaseCommand):
+    """
+    Строит уменьшенные копии (megano.images) для уже загруженных изображений
+    товаров, категорий и аватаров. Изображения декодируются параллельно
+    в --processes процессах.
+    """
+
+    help = "Build thumbnail/card/full WebP and JPEG variants for existing images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Количество процессов (по умолчанию — число ядер)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Перестроить и уже построенные варианты",
+        )
+
+    def handle(self, *args, **options):
+        processes, force = options["processes"], options["force"]
+        if processes <= 0:
+            self.stdout.write(self.style.ERROR("--processes должен быть больше 0"))
+            return
+
+        tasks = []
+        for label in IMAGE_MODELS:
+            for instance in apps.get_model(label).objects.only("pk", "src", "variants"):
+                if force or is_stale(instance):
+                    tasks.append((label, instance.pk))
+        self.stdout.write("Изображений к обработке: %d, процессов: %d" % (len(tasks), processes))
+        if not tasks:
+            return
+
+        started = time.monotonic()
+        failed = 0
+        connections.close_all()
+        # fork: дочерние процессы наследуют настроенный Django
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+        ) as executor:
+            futures = {
+                executor.submit(_build, label, pk, force): (label, pk) for label, pk in tasks
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING("%s #%s: %s" % (*futures[future], e)))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Готово: %d изображений за %.1f с, ошибок: %d"
+                % (len(tasks) - failed, time.monotonic() - started, failed)
+            )
+        )
@@ -0,0 +1,151 @@
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from api_product.models import Product, Review
+from api_transaction.models import StockReservation
+
+
+RATING_QUANT = Decimal("0.01")
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает денормализованные счётчики товаров (rating, reviews_count, reserved, available)
+    агрегирующими запросами по пачкам товаров и записывает только изменившиеся строки.
+    """
+
+    help = "Reconcile denormalized product counters with reviews and stock"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Количество товаров, обрабатываемых за один проход",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать расхождения, ничего не записывая",
+        )
+        parser.add_argument(
+            "--with-available",
+            action="store_true",
+            help="Синхронизировать флаг available с остатком (count > 0)",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+        with_available = options["with_available"]
+
+        if chunk_size <= 0:
+            self.stdout.write(self.style.ERROR("--chunk-size должен быть больше 0"))
+            return
+
+        update_fields = ["rating", "reviews_count"]
+        if with_available:
+            update_fields.append("available")
+
+        started = time.monotonic()
+        aggregate_time = write_time = 0.0
+        scanned = changed = chunks = 0
+        last_pk = 0
+        reserved_total = (
+            StockReservation.objects.filter(product_id=OuterRef("pk"))
+            .order_by()
+            .values("product_id")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+
+        while True:
+            # Keyset-пагинация по первичному ключу: каждая пачка читается по индексу
+            products = list(
+                Product.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .only("id", "rating", "reviews_count", "reserved", "available", "count")[
+                    :chunk_size
+                ]
+            )
+            if not products:
+                break
+            last_pk = products[-1].pk
+            chunks += 1
+            scanned += len(products)
+
+            tick = time.monotonic()
+            stats = {
+                row["product_id"]: row
+                for row in Review.objects.filter(product_id__in=[p.pk for p in products])
+                .order_by()
+                .values("product_id")
+                .annotate(avg_rating=Avg("rate"), reviews_count=Count("id"))
+            }
+            reserved = dict(
+                StockReservation.objects.filter(product_id__in=[p.pk for p in products])
+                .order_by()
+                .values("product_id")
+                .annotate(total=Sum("quantity"))
+                .values_list("product_id", "total")
+            )
+            aggregate_time += time.monotonic() - tick
+
+            dirty = []
+            reserved_dirty = []
+            for product in products:
+                row = stats.get(product.pk)
+                rating = Decimal(str(row["avg_rating"])) if row else Decimal(0)
+                rating = rating.quantize(RATING_QUANT, rounding=ROUND_HALF_UP)
+                reviews_count = row["reviews_count"] if row else 0
+
+                reserved_count = reserved.get(product.pk, 0)
+
+                if product.reserved != reserved_count:
+                    reserved_dirty.append(product.pk)
+                is_dirty = (
+                    product.rating != rating
+                    or product.reviews_count != reviews_count
+                    or product.reserved != reserved_count
+                )
+                product.rating = rating
+                product.reviews_count = reviews_count
+                product.reserved = reserved_count
+                if with_available and product.available != (product.count > 0):
+                    product.available = product.count > 0
+                    is_dirty = True
+                if is_dirty:
+                    dirty.append(product)
+
+            if dirty:
+                changed += len(dirty)
+                if dry_run:
+                    self.stdout.write(
+                        "Расхождения в товарах: %s" % ", ".join(str(p.pk) for p in dirty)
+                    )
+                else:
+                    tick = time.monotonic()
+                    with transaction.atomic():
+                        Product.objects.bulk_update(dirty, update_fields, batch_size=500)
+                        # reserved меняется параллельными резервированиями, поэтому сумма
+                        # считается заново внутри UPDATE, а не берётся из снимка выше
+                        Product.objects.filter(pk__in=reserved_dirty).update(
+                            reserved=Coalesce(Subquery(reserved_total), 0)
+                        )
+                    write_time += time.monotonic() - tick
+
+        total_time = time.monotonic() - started
+        self.stdout.write(
+            "Проверено товаров: %d (пачек: %d), расхождений: %d%s"
+            % (scanned, chunks, changed, " (dry-run)" if dry_run else "")
+        )
+        self.stdout.write(
+            "Время: всего %.3f c, агрегация %.3f c, запись %.3f c"
+            % (total_time, aggregate_time, write_time)
+        )
+        self.stdout.write(self.style.SUCCESS("Reconciliation finished."))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_product', '0007_product_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoryimage',
+            name='variants',
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name='Варианты'
+            ),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='variants',
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name='Варианты'
+            ),
+        ),
+    ]
@@ -21,6 +21,7 @@ class Product(models.Model):
     )
     price = models.DecimalField(default=0, decimal_places=2, max_digits=10, verbose_name="Цена")
     count = models.PositiveIntegerField(default=0, verbose_name="Количество")
+    reserved = models.PositiveIntegerField(default=0, verbose_name="Зарезервировано")
     date = models.DateTimeField(
         blank=True, null=True, auto_now_add=True, verbose_name="Дата создания"
     )
@@ -114,6 +115,8 @@ class CategoryImage(models.Model):
     )
     src = models.ImageField(upload_to=category_image_directory_path, verbose_name="Изображение")
     alt = models.CharField(default="image", max_length=64, verbose_name="Описание")
+    # Уменьшенные копии (megano.images)
+    variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Варианты")
 
     class Meta:
         verbose_name = "Изображение"
@@ -138,6 +141,8 @@ class ProductImage(models.Model):
     )
     src = models.ImageField(upload_to=product_image_directory_path, verbose_name="Изображение")
     alt = models.CharField(default="image", max_length=64, verbose_name="Описание")
+    # Уменьшенные копии (megano.images)
+    variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Варианты")
 
     class Meta:
         verbose_name = "Изображение"
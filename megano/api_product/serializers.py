@@ -3,6 +3,8 @@ from decimal import Decimal
 from django.utils import timezone
 
 from rest_framework import serializers
+
+from megano.images import srcset, variant_urls
 from .models import (
     CategoryImage,
     Product,
@@ -14,12 +16,32 @@ from .models import (
 )
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class ImageVariantsMixin(serializers.Serializer):
+    """
+    Уменьшенные копии изображения (megano.images): variants — URL по вариантам
+    и форматам, srcset — WebP-варианты для атрибута srcset. Пока копии не
+    построены, оба поля пустые
+    """
+
+    srcset = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
+
+    def _variant_urls(self, obj) -> dict:
+        return variant_urls(obj.variants, self.context.get('request'))
+
+    def get_srcset(self, obj) -> str:
+        return srcset(self._variant_urls(obj))
+
+    def get_variants(self, obj) -> dict:
+        return self._variant_urls(obj)
+
+
+class ImageSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     src = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ("src", "alt")
+        fields = ("src", "alt", "srcset", "variants")
 
     def get_src(self, obj) -> str:
         request = self.context.get('request')
@@ -74,13 +96,13 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         }
 
 
-class CategoryImageSerializer(serializers.ModelSerializer):
+class CategoryImageSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     src = serializers.SerializerMethodField()
     alt = serializers.CharField(default="category image")
 
     class Meta:
         model = CategoryImage
-        fields = ("src", "alt")
+        fields = ("src", "alt", "srcset", "variants")
 
     def get_src(self, obj) -> str:
         request = self.context.get('request')
@@ -115,6 +137,32 @@ class CategorySerializer(serializers.ModelSerializer):
         )
 
 
+class BreadcrumbSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+
+
+class CategorySubtreeNodeSerializer(serializers.Serializer):
+    """
+    Узел поддерева категории (CategoryTree.as_subtree): productsCount — товары
+    категории вместе с потомками. Используется только для схемы OpenAPI
+    """
+
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    image = CategoryImageSerializer(allow_null=True)
+    productsCount = serializers.IntegerField()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["subcategories"] = CategorySubtreeNodeSerializer(many=True)
+        return fields
+
+
+class CategorySubtreeSerializer(CategorySubtreeNodeSerializer):
+    breadcrumbs = BreadcrumbSerializer(many=True)
+
+
 class ProductContractSerializer(serializers.ModelSerializer):
     images = ImageSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -1,7 +1,9 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Review, Product
-from django.db.models import Avg, Count
+from megano.images import delete_variants, schedule_variants
+from .models import Review, Product, Category, CategoryImage, ProductImage
+from .category_tree import bump_tree_version
+from .jobs import update_product_rating
 from django.db import transaction
 import logging
 
@@ -9,25 +11,49 @@ logger = logging.getLogger(__name__)
 
 
 @receiver([post_save, post_delete], sender=Review)
-def update_product_reviews(sender, instance, **kwargs):
+def update_product_reviews(sender, instance, raw=False, **kwargs):
     """
-    Обновляет reviews_count и rating продукта при сохранении/удалении отзыва
+    Ставит в очередь пересчёт reviews_count и rating продукта при сохранении/удалении отзыва.
+    Пока пересчёт ждёт в очереди, повторные отзывы новую задачу не создают.
+    При загрузке фикстур (raw) счётчики уже в данных — задача не ставится
     """
-    try:
-        with transaction.atomic():
-            product = Product.objects.filter(id=instance.product_id).select_for_update().first()
+    if raw:
+        return
+    update_product_rating.enqueue(
+        args=[instance.product_id], key=f"product-rating:{instance.product_id}"
+    )
 
-            if not product:
-                return
 
-            reviews_data = Review.objects.filter(product_id=product.id).aggregate(
-                avg_rating=Avg("rate"), reviews_count=Count("id")
-            )
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=CategoryImage)
+def invalidate_category_tree(sender, instance, **kwargs):
+    """
+    Сбрасывает дерево категорий после фиксации транзакции
+    """
+    transaction.on_commit(bump_tree_version)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_category_counts(sender, instance, **kwargs):
+    """
+    Товар мог появиться, исчезнуть или сменить категорию — пересчитываем счётчики дерева.
+    Изменения остатков идут через queryset.update() и сигналов не вызывают
+    """
+    transaction.on_commit(bump_tree_version)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=CategoryImage)
+def build_image_variants(sender, instance, raw=False, **kwargs):
+    """
+    Ставит в очередь media построение уменьшенных копий нового изображения
+    """
+    if not raw:
+        schedule_variants(instance)
+
 
-            Product.objects.filter(id=product.id).update(
-                rating=reviews_data["avg_rating"] or 0,
-                reviews_count=reviews_data["reviews_count"],
-            )
-            logger.debug("Отзывы для продукта %s обновлены", product.id)
-    except Exception as e:
-        logger.error(f"Ошибка обновления отзывов для продукта {instance.product_id}: {str(e)}")
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=CategoryImage)
+def delete_image_variants(sender, instance, **kwargs):
+    storage = instance.src.storage
+    transaction.on_commit(lambda: delete_variants(storage, instance.variants))
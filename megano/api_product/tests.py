@@ -1,3 +1,220 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import Image
+
+from api_transaction.models import StockReservation
+from .category_tree import get_category_tree
+from .models import Category, Product, ProductImage, Review
+from .serializers import ImageSerializer
+
+
+def make_jpeg(size, color="red") -> ContentFile:
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG")
+    return ContentFile(buffer.getvalue(), name="photo.jpg")
+
+
+class ReconcileProductsTestCase(TestCase):
+    """
+    reconcile_products исправляет разошедшиеся счётчики товаров
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Electronics")
+        cls.phone = Product.objects.create(category=category, title="Phone", count=5)
+        cls.laptop = Product.objects.create(category=category, title="Laptop", count=0)
+        cls.clean = Product.objects.create(category=category, title="Clean", count=1)
+        for i, rate in enumerate((4, 5)):
+            user = User.objects.create_user(username=f"reviewer-{i}")
+            Review.objects.create(
+                product=cls.phone, user=user, author=user.username, email="a@b.c", rate=rate
+            )
+        StockReservation.objects.create(
+            owner="u1", product=cls.laptop, quantity=2, expires_at="2100-01-01T00:00Z"
+        )
+        # Счётчики разошлись: пересчёт отзывов не выполнялся, резерв потерян
+        Product.objects.filter(pk=cls.phone.pk).update(rating=1, reviews_count=7, reserved=3)
+        Product.objects.filter(pk=cls.laptop.pk).update(reserved=0, available=True)
+
+    def reconcile(self, *args) -> str:
+        out = StringIO()
+        call_command("reconcile_products", "--chunk-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def counters(self, product):
+        return Product.objects.values_list("rating", "reviews_count", "reserved", "available").get(
+            pk=product.pk
+        )
+
+    def test_dry_run_reports_without_writing(self):
+        output = self.reconcile("--dry-run")
+
+        self.assertIn(f"Расхождения в товарах: {self.phone.pk}", output)
+        self.assertIn(str(self.laptop.pk), output)
+        self.assertIn("расхождений: 2 (dry-run)", output)
+        self.assertEqual(self.counters(self.phone), (Decimal(1), 7, 3, True))
+
+    def test_counters_are_corrected(self):
+        output = self.reconcile("--with-available")
+
+        self.assertIn("Проверено товаров: 3 (пачек: 2), расхождений: 2", output)
+        self.assertEqual(self.counters(self.phone), (Decimal("4.50"), 2, 0, True))
+        self.assertEqual(self.counters(self.laptop), (Decimal(0), 0, 2, False))
+        self.assertIn("расхождений: 0", self.reconcile("--with-available"))
+
+    def test_reservation_made_during_reconcile_is_kept(self):
+        bulk_update = Product.objects.bulk_update
+
+        def reserve_then_update(*args, **kwargs):
+            # Покупатель резервирует телефон между агрегацией и записью
+            StockReservation.objects.create(
+                owner="u2", product=self.phone, quantity=1, expires_at="2100-01-01T00:00Z"
+            )
+            Product.objects.filter(pk=self.phone.pk).update(reserved=4)
+            return bulk_update(*args, **kwargs)
+
+        with mock.patch.object(Product.objects, "bulk_update", side_effect=reserve_then_update):
+            self.reconcile()
+
+        self.assertEqual(self.counters(self.phone)[2], 1)
+
+
+class CategoryTreeTestCase(TestCase):
+    """
+    Дерево категорий: счётчики поддеревьев, сброс по сигналам и фильтр каталога
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(title="Electronics")
+        cls.phones = Category.objects.create(title="Phones", parent=cls.root)
+        cls.smart = Category.objects.create(title="Smartphones", parent=cls.phones)
+        cls.other = Category.objects.create(title="Books")
+        for category, title in (
+            (cls.root, "Cable"),
+            (cls.phones, "Dial phone"),
+            (cls.smart, "Pixel"),
+            (cls.smart, "iPhone"),
+            (cls.other, "Novel"),
+        ):
+            Product.objects.create(category=category, title=title, count=1)
+
+    def setUp(self):
+        caches["shared"].clear()
+
+    def test_tree_building(self):
+        tree = get_category_tree()
+        self.assertEqual(tree.roots, [self.root.pk, self.other.pk])
+        self.assertCountEqual(
+            tree.subtree_ids(self.root.pk), [self.root.pk, self.phones.pk, self.smart.pk]
+        )
+        self.assertEqual(tree.subtree_ids(0), [])
+        self.assertEqual(
+            [crumb["title"] for crumb in tree.breadcrumbs(self.smart.pk)],
+            ["Electronics", "Phones", "Smartphones"],
+        )
+
+        data = self.client.get(f"/api/categories/{self.phones.pk}/").json()
+        self.assertEqual(data["productsCount"], 3)
+        self.assertEqual(data["subcategories"][0]["productsCount"], 2)
+        self.assertEqual(data["subcategories"][0]["subcategories"], [])
+        self.assertEqual(data["breadcrumbs"][0], {"id": self.root.pk, "title": "Electronics"})
+        self.assertEqual(self.client.get("/api/categories/0/").status_code, 404)
+
+        data = self.client.get("/api/categories/").json()
+        self.assertEqual([item["title"] for item in data], ["Electronics", "Books"])
+        self.assertNotIn("productsCount", data[0])
+        self.assertEqual(data[0]["subcategories"][0]["subcategories"][0]["title"], "Smartphones")
+
+    def test_tree_is_rebuilt_after_changes(self):
+        tree = get_category_tree()
+        self.assertIs(get_category_tree(), tree)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(title="Tablets", parent=self.root)
+        rebuilt = get_category_tree()
+        self.assertNotEqual(rebuilt.version, tree.version)
+        self.assertEqual(len(rebuilt.children[self.root.pk]), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(category=self.smart, title="Galaxy", count=1)
+        self.assertEqual(get_category_tree().total_products[self.root.pk], 5)
+
+    def test_parent_cycle_is_broken(self):
+        Category.objects.filter(pk=self.root.pk).update(parent=self.smart)
+        tree = get_category_tree()
+        self.assertEqual(tree.roots, [self.other.pk, self.root.pk])
+        self.assertEqual(tree.total_products[self.root.pk], 4)
+        self.assertEqual(
+            [crumb["title"] for crumb in tree.breadcrumbs(self.smart.pk)],
+            ["Electronics", "Phones", "Smartphones"],
+        )
+        self.assertEqual(self.client.get(f"/api/categories/{self.phones.pk}/").status_code, 200)
+
+    def test_catalog_filter_includes_descendants(self):
+        def titles(category):
+            response = self.client.get("/api/catalog/", {"category": category, "limit": 10})
+            return sorted(item["name"] for item in response.json()["items"])
+
+        self.assertEqual(titles(self.root.pk), ["Cable", "Dial phone", "Pixel", "iPhone"])
+        self.assertEqual(titles(self.smart.pk), ["Pixel", "iPhone"])
+        self.assertEqual(titles(0), [])
+        self.assertEqual(titles("abc"), [])
+
+
+@override_settings(JOB_QUEUE_EAGER=True, IMAGE_VARIANTS={"thumb": 50, "card": 200})
+class ImageVariantsTestCase(TestCase):
+    """
+    Уменьшенные копии строятся при загрузке и попадают в ImageSerializer
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        category = Category.objects.create(title="Electronics")
+        self.product = Product.objects.create(category=category, title="Phone", count=1)
+
+    def test_variants_are_built_and_replaced(self):
+        # Оригинал декодируется один раз на все варианты
+        with mock.patch("megano.images.Image.open", wraps=Image.open) as image_open:
+            image = ProductImage.objects.create(product=self.product, src=make_jpeg((800, 400)))
+        self.assertEqual(image_open.call_count, 1)
+        image.refresh_from_db()
+        self.assertEqual(image.variants["source"], image.src.name)
+        self.assertEqual(image.variants["thumb"]["width"], 50)
+        self.assertEqual(image.variants["card"]["width"], 200)
+        old_files = [image.variants["thumb"]["webp"], image.variants["card"]["jpeg"]]
+        with default_storage.open(image.variants["card"]["webp"]) as file:
+            self.assertEqual(Image.open(file).size, (200, 100))
+
+        request = RequestFactory().get("/")
+        data = ImageSerializer(image, context={"request": request}).data
+        self.assertEqual(
+            data["srcset"],
+            "http://testserver/media/%s 50w, http://testserver/media/%s 200w"
+            % (image.variants["thumb"]["webp"], image.variants["card"]["webp"]),
+        )
+        self.assertTrue(data["variants"]["thumb"]["jpeg"].endswith(".thumb.jpeg"))
+
+        # Новое изображение — новые имена вариантов, старые удалены
+        image.src = make_jpeg((300, 300), color="blue")
+        image.save()
+        image.refresh_from_db()
+        self.assertEqual(image.variants["source"], image.src.name)
+        self.assertNotIn(image.variants["thumb"]["webp"], old_files)
+        for name in old_files:
+            self.assertFalse(default_storage.exists(name))
@@ -5,6 +5,7 @@ from .views import (
     ReviewAPIView,
     TagsAPIListView,
     CategoriesAPIListView,
+    CategoryDetailAPIView,
     ProductPopularAPIView,
     ProductLimitedAPIView,
     CatalogView,
@@ -20,5 +21,6 @@ urlpatterns = [
     path("products/limited/", ProductLimitedAPIView.as_view(), name="product_limited"),
     path("tags/", TagsAPIListView.as_view(), name="tags"),
     path("categories/", CategoriesAPIListView.as_view(), name="categories"),
+    path("categories/<int:id>/", CategoryDetailAPIView.as_view(), name="category_detail"),
     path("catalog/", CatalogView.as_view(), name="catalog"),
 ]
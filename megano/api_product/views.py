@@ -11,6 +11,7 @@ from rest_framework.response import Response
 
 from drf_spectacular.utils import extend_schema
 
+from .category_tree import get_category_tree
 from .models import Product, Review, Tag, Category, ProductImage
 from .pagination import CustomPagination
 from .serializers import (
@@ -19,6 +20,7 @@ from .serializers import (
     ReviewSerializer,
     TagSerializer,
     CategorySerializer,
+    CategorySubtreeSerializer,
     ProductContractSerializer,
 )
 
@@ -51,6 +53,7 @@ class ProductDetailAPIView(RetrieveAPIView):
 class ReviewAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ReviewSerializer
+    throttle_scope = "review"
 
     def post(self, request: Request, id: int):
         logger.debug(
@@ -92,26 +95,32 @@ class TagsAPIListView(ListAPIView):
 
 @extend_schema(tags=["catalog"], responses=CategorySerializer)
 class CategoriesAPIListView(ListAPIView):
-    queryset = (
-        Category.objects.filter(parent=None)
-        .select_related("image")
-        .prefetch_related(
-            Prefetch("subcategories", queryset=Category.objects.select_related("image"))
-        )
-    )
+    queryset = Category.objects.none()
     serializer_class = CategorySerializer
 
-    def get(self, request, *args, **kwargs):
+    def list(self, request, *args, **kwargs):
         logger.debug("CategoriesAPIListView GET: user=%s", request.user)
-        response = super().get(request, *args, **kwargs)
+        tree = get_category_tree()
+        data = tree.as_list(request)
         logger.info(
-            "CategoriesAPIListView response: %s",
-            [
-                (i.get("title"), [subcat.get("title") for subcat in i.get("subcategories", [])])
-                for i in response.data
-            ],
+            "CategoriesAPIListView response: %d корневых категорий (версия дерева %s)",
+            len(data),
+            tree.version,
         )
-        return response
+        return Response(data)
+
+
+@extend_schema(tags=["catalog"], responses=CategorySubtreeSerializer)
+class CategoryDetailAPIView(APIView):
+    """
+    Поддерево категории с количеством товаров и хлебными крошками
+    """
+
+    def get(self, request: Request, id: int):
+        tree = get_category_tree()
+        if id not in tree:
+            return Response({"error": "Категория не найдена"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(tree.as_subtree(id, request))
 
 
 @extend_schema(tags=["catalog"], responses=ProductContractSerializer)
@@ -181,7 +190,9 @@ class CatalogView(ListAPIView):
         # )
         queryset = Product.objects.prefetch_related(
             Prefetch('tags', queryset=Tag.objects.only('id', 'name')),
-            Prefetch('images', queryset=ProductImage.objects.only('src', 'alt', 'product_id')),
+            Prefetch(
+                'images', queryset=ProductImage.objects.only('src', 'alt', 'variants', 'product_id')
+            ),
         ).select_related('category')
 
         # Фильтрация
@@ -215,8 +226,12 @@ class CatalogView(ListAPIView):
             queryset = queryset.filter(freeDelivery=params['filter[freeDelivery]'] == 'true')
 
         if category_id := params.get('category'):
-            logger.debug('Фильтрация по категории: %s', category_id)
-            queryset = queryset.filter(category_id=category_id)
+            try:
+                category_ids = get_category_tree().subtree_ids(int(category_id))
+            except ValueError:
+                category_ids = []
+            logger.debug('Фильтрация по категории %s и её потомкам: %s', category_id, category_ids)
+            queryset = queryset.filter(category_id__in=category_ids)
 
         if tags := params.getlist('tags[]'):
             logger.debug('Фильтрация по тегам: %s', tags)
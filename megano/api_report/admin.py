@@ -0,0 +1,31 @@
+from django.contrib import admin
+
+from .models import CategorySalesDaily, ProductSalesDaily
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """Сводные таблицы заполняются автоматически и только просматриваются"""
+
+    date_hierarchy = "day"
+    list_per_page = 100
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductSalesDaily)
+class ProductSalesDailyAdmin(RollupAdmin):
+    list_display = ("day", "product_id", "title", "category_id", "units", "revenue", "orders")
+    list_filter = ("category_id",)
+    search_fields = ("title",)
+    ordering = ("-day", "-revenue")
+
+
+@admin.register(CategorySalesDaily)
+class CategorySalesDailyAdmin(RollupAdmin):
+    list_display = ("day", "category_id", "units", "revenue", "orders")
+    list_filter = ("category_id",)
+    ordering = ("-day", "-revenue")
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ApiReportConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api_report'
+
+    def ready(self):
+        import api_report.signals
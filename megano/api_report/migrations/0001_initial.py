@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='RolledUpOrder',
+            fields=[
+                (
+                    'order_id',
+                    models.PositiveBigIntegerField(
+                        primary_key=True, serialize=False, verbose_name='Заказ'
+                    ),
+                ),
+                ('rolled_up_at', models.DateTimeField(auto_now_add=True, verbose_name='Учтён')),
+            ],
+            options={
+                'verbose_name': 'Учтённый заказ',
+                'verbose_name_plural': 'Учтённые заказы',
+            },
+        ),
+        migrations.CreateModel(
+            name='CategorySalesDaily',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                ('day', models.DateField(verbose_name='День')),
+                ('category_id', models.PositiveBigIntegerField(verbose_name='Категория')),
+                ('units', models.IntegerField(default=0, verbose_name='Продано единиц')),
+                (
+                    'revenue',
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=14, verbose_name='Выручка'
+                    ),
+                ),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+            ],
+            options={
+                'verbose_name': 'Продажи категории за день',
+                'verbose_name_plural': 'Продажи категорий по дням',
+                'unique_together': {('day', 'category_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                ('day', models.DateField(verbose_name='День')),
+                ('product_id', models.PositiveBigIntegerField(verbose_name='Товар')),
+                (
+                    'category_id',
+                    models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Категория'),
+                ),
+                ('title', models.CharField(default='', max_length=128, verbose_name='Название')),
+                ('units', models.IntegerField(default=0, verbose_name='Продано единиц')),
+                (
+                    'revenue',
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=14, verbose_name='Выручка'
+                    ),
+                ),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+            ],
+            options={
+                'verbose_name': 'Продажи товара за день',
+                'verbose_name_plural': 'Продажи товаров по дням',
+                'unique_together': {('day', 'product_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import models
+
+
+class ProductSalesDaily(models.Model):
+    """
+    Продажи товара за день. Идентификаторы хранятся числами, а не внешними
+    ключами: отчёты переживают удаление товаров и архивирование заказов
+    """
+
+    day = models.DateField(verbose_name="День")
+    product_id = models.PositiveBigIntegerField(verbose_name="Товар")
+    category_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="Категория")
+    title = models.CharField(max_length=128, default="", verbose_name="Название")
+    units = models.IntegerField(default=0, verbose_name="Продано единиц")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Выручка"
+    )
+    orders = models.IntegerField(default=0, verbose_name="Заказов")
+
+    class Meta:
+        unique_together = ("day", "product_id")
+        verbose_name = "Продажи товара за день"
+        verbose_name_plural = "Продажи товаров по дням"
+
+    def __str__(self):
+        return f"{self.day} {self.title or self.product_id}"
+
+
+class CategorySalesDaily(models.Model):
+    """
+    Продажи категории за день
+    """
+
+    day = models.DateField(verbose_name="День")
+    category_id = models.PositiveBigIntegerField(verbose_name="Категория")
+    units = models.IntegerField(default=0, verbose_name="Продано единиц")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Выручка"
+    )
+    orders = models.IntegerField(default=0, verbose_name="Заказов")
+
+    class Meta:
+        unique_together = ("day", "category_id")
+        verbose_name = "Продажи категории за день"
+        verbose_name_plural = "Продажи категорий по дням"
+
+    def __str__(self):
+        return f"{self.day} {self.category_id}"
+
+
+class RolledUpOrder(models.Model):
+    """
+    Заказ, уже учтённый в сводных таблицах: защищает от повторного учёта
+    """
+
+    order_id = models.PositiveBigIntegerField(primary_key=True, verbose_name="Заказ")
+    rolled_up_at = models.DateTimeField(auto_now_add=True, verbose_name="Учтён")
+
+    class Meta:
+        verbose_name = "Учтённый заказ"
+        verbose_name_plural = "Учтённые заказы"
+
+    def __str__(self):
+        return f"Заказ No{self.order_id}"
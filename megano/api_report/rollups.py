@@ -0,0 +1,156 @@
+"""
+Сводные таблицы продаж по дням (товар и категория).
+
+Заказ учитывается один раз, когда получает статус из REPORTABLE_STATUSES, и
+вычитается обратно при отмене. Учёт — это инкремент счётчиков: недостающие
+строки создаются вставкой с игнорированием конфликтов, затем все счётчики
+дня меняются одним UPDATE с Case/When, поэтому параллельные заказы не теряют
+изменения друг друга. Отчёты читают только сводные таблицы.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.db.models.functions import TruncDate
+
+from api_order.models import Order, OrderItem
+from .models import CategorySalesDaily, ProductSalesDaily, RolledUpOrder
+
+logger = logging.getLogger(__name__)
+
+REPORTABLE_STATUSES = (Order.Status.PAID, Order.Status.COMPLETED)
+
+
+def _aggregate(order_ids) -> tuple:
+    """
+    Продажи заказов по (день, товар) и (день, категория) по данным позиций
+    и снимков товаров; каталог не читается
+    """
+    products = defaultdict(lambda: {"units": 0, "revenue": Decimal(0), "orders": set()})
+    categories = defaultdict(lambda: {"units": 0, "revenue": Decimal(0), "orders": set()})
+    rows = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .annotate(day=TruncDate("order__createdAt"))
+        .values_list(
+            "order_id",
+            "day",
+            "product_id",
+            "snapshot__id",
+            "snapshot__category",
+            "snapshot__title",
+            "count",
+            "price",
+        )
+    )
+    for order_id, day, product_id, snapshot_id, category_id, title, count, price in rows:
+        product_id = product_id or snapshot_id
+        revenue = price * count
+        if product_id:
+            entry = products[(day, product_id)]
+            entry["units"] += count
+            entry["revenue"] += revenue
+            entry["orders"].add(order_id)
+            entry["category_id"] = category_id
+            entry["title"] = title or ""
+        if category_id:
+            entry = categories[(day, category_id)]
+            entry["units"] += count
+            entry["revenue"] += revenue
+            entry["orders"].add(order_id)
+    return products, categories
+
+
+def _per_key(field, values: dict, output_field):
+    return Case(
+        *[When(**{field: key}, then=Value(value)) for key, value in values.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def _increment(model, key_field, entries: dict, sign: int, extra=lambda entry: {}):
+    """
+    Прибавляет sign * (units, revenue, orders) к строкам {(day, key): entry}.
+    extra(entry) — дополнительные поля для вновь создаваемых строк
+    """
+    if not entries:
+        return
+    model.objects.bulk_create(
+        [
+            model(day=day, **{key_field: key}, **extra(entry))
+            for (day, key), entry in entries.items()
+        ],
+        ignore_conflicts=True,
+    )
+    by_day = defaultdict(dict)
+    for (day, key), entry in entries.items():
+        by_day[day][key] = entry
+    money = DecimalField(max_digits=14, decimal_places=2)
+    for day, day_entries in by_day.items():
+        units = {key: sign * entry["units"] for key, entry in day_entries.items()}
+        revenue = {key: sign * entry["revenue"] for key, entry in day_entries.items()}
+        orders = {key: sign * len(entry["orders"]) for key, entry in day_entries.items()}
+        model.objects.filter(day=day, **{f"{key_field}__in": list(day_entries)}).update(
+            units=F("units") + _per_key(key_field, units, IntegerField()),
+            revenue=F("revenue") + _per_key(key_field, revenue, money),
+            orders=F("orders") + _per_key(key_field, orders, IntegerField()),
+        )
+
+
+def _apply(order_ids, sign: int):
+    products, categories = _aggregate(order_ids)
+    _increment(
+        ProductSalesDaily,
+        "product_id",
+        products,
+        sign,
+        extra=lambda entry: {"title": entry["title"], "category_id": entry["category_id"]},
+    )
+    _increment(CategorySalesDaily, "category_id", categories, sign)
+
+
+def record_orders(order_ids) -> int:
+    """
+    Учитывает в сводных таблицах заказы из order_ids в статусах REPORTABLE_STATUSES,
+    ещё не учтённые ранее. Возвращает число учтённых заказов
+    """
+    try:
+        with transaction.atomic():
+            candidates = set(
+                Order.objects.filter(pk__in=list(order_ids), status__in=REPORTABLE_STATUSES)
+                .order_by()
+                .values_list("pk", flat=True)
+            )
+            candidates -= set(
+                RolledUpOrder.objects.filter(order_id__in=candidates).values_list(
+                    "order_id", flat=True
+                )
+            )
+            if not candidates:
+                return 0
+            # Первичный ключ не даст учесть заказ дважды параллельным транзакциям
+            RolledUpOrder.objects.bulk_create(
+                [RolledUpOrder(order_id=order_id) for order_id in candidates]
+            )
+            _apply(candidates, 1)
+    except IntegrityError:
+        logger.warning("Заказы %s уже учитываются другим процессом", sorted(order_ids))
+        return 0
+    logger.debug("Учтены в отчётах заказы: %s", sorted(candidates))
+    return len(candidates)
+
+
+def revert_orders(order_ids) -> int:
+    """Вычитает из сводных таблиц учтённые заказы (например, после отмены)"""
+    with transaction.atomic():
+        markers = RolledUpOrder.objects.select_for_update().filter(order_id__in=list(order_ids))
+        rolled_up = list(markers.values_list("order_id", flat=True))
+        if not rolled_up:
+            return 0
+        RolledUpOrder.objects.filter(order_id__in=rolled_up).delete()
+        _apply(rolled_up, -1)
+    logger.debug("Исключены из отчётов заказы: %s", rolled_up)
+    return len(rolled_up)
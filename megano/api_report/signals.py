@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from api_order.models import Order
+from .rollups import REPORTABLE_STATUSES, record_orders, revert_orders
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, raw=False, **kwargs):
+    """
+    Учитывает заказ в отчётах при переходе в оплаченный/выполненный статус
+    и вычитает его при отмене
+    """
+    if raw:
+        return
+    if instance.status in REPORTABLE_STATUSES:
+        record_orders([instance.pk])
+    elif instance.status == Order.Status.CANCELLED:
+        revert_orders([instance.pk])
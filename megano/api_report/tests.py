@@ -0,0 +1,89 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from api_auth.models import Profile
+from api_order.checkout import apply_order_lines
+from api_order.models import DeliverySettings, Order
+from api_product.models import Category, Product
+from .models import CategorySalesDaily, ProductSalesDaily
+
+
+class SalesRollupTestCase(TestCase):
+    """
+    Сводные таблицы продаж обновляются при оплате и отмене заказа
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="manager", is_staff=True)
+        user = User.objects.create_user(username="buyer")
+        cls.profile = Profile.objects.create(user=user, fullName="Buyer")
+        DeliverySettings.objects.create()
+        cls.category = Category.objects.create(title="Electronics")
+        cls.phone = Product.objects.create(
+            category=cls.category, title="Phone", price=100, count=50
+        )
+        cls.laptop = Product.objects.create(
+            category=cls.category, title="Laptop", price=1000, count=50
+        )
+
+    def checkout(self, lines, status=Order.Status.PAID):
+        order = Order.objects.create(user=self.profile)
+        apply_order_lines(order, lines, existing={})
+        order.status = status
+        order.save()
+        return order
+
+    def test_paid_orders_are_rolled_up_once(self):
+        order = self.checkout({self.phone.id: 2, self.laptop.id: 1})
+        self.checkout({self.phone.id: 1})
+        order.save()
+
+        phone = ProductSalesDaily.objects.get(product_id=self.phone.id)
+        self.assertEqual((phone.units, phone.revenue, phone.orders), (3, Decimal(300), 2))
+        self.assertEqual(phone.title, "Phone")
+        category = CategorySalesDaily.objects.get(category_id=self.category.id)
+        self.assertEqual((category.units, category.revenue, category.orders), (4, Decimal(1300), 2))
+
+    def test_cancelled_order_is_subtracted(self):
+        self.checkout({self.phone.id: 1})
+        order = self.checkout({self.phone.id: 2, self.laptop.id: 1})
+
+        order.status = Order.Status.CANCELLED
+        order.save()
+
+        category = CategorySalesDaily.objects.get(category_id=self.category.id)
+        self.assertEqual((category.units, category.revenue, category.orders), (1, Decimal(100), 1))
+        self.assertEqual(ProductSalesDaily.objects.get(product_id=self.laptop.id).units, 0)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.checkout({self.phone.id: 2, self.laptop.id: 1})
+        self.checkout({self.laptop.id: 3}, status=Order.Status.COMPLETED)
+        self.checkout({self.phone.id: 5}, status=Order.Status.AWAITING_PAYMENT)
+        incremental = list(ProductSalesDaily.objects.order_by("product_id").values_list())
+
+        call_command("rollup_sales", rebuild=True, batch_size=1, stdout=StringIO())
+
+        rebuilt = list(ProductSalesDaily.objects.order_by("product_id").values_list())
+        strip = lambda rows: [row[1:] for row in rows]  # noqa: E731
+        self.assertEqual(strip(rebuilt), strip(incremental))
+
+    def test_top_products_reads_rollups(self):
+        self.checkout({self.phone.id: 5, self.laptop.id: 1})
+        self.client.force_login(self.staff)
+
+        # сессия из таблицы кэша, пользователь и сводная таблица
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("api_report:top-products"),
+                {"orderBy": "revenue", "dateTo": timezone.localdate().isoformat()},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["id"] for row in response.data], [self.laptop.id, self.phone.id])
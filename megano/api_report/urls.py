@@ -0,0 +1,10 @@
+from django.urls import path
+
+from .views import CategorySalesAPIView, TopProductsAPIView
+
+app_name = "api_report"
+
+urlpatterns = [
+    path("reports/categories", CategorySalesAPIView.as_view(), name="category-sales"),
+    path("reports/top-products", TopProductsAPIView.as_view(), name="top-products"),
+]
@@ -0,0 +1,134 @@
+import logging
+from datetime import date, timedelta
+
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from rest_framework import permissions, status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+
+from api_product.category_tree import get_category_tree
+from .models import CategorySalesDaily, ProductSalesDaily
+
+logger = logging.getLogger(__name__)
+
+DATE_PARAMETERS = [
+    OpenApiParameter(
+        "dateFrom", str, description="Начальная дата, YYYY-MM-DD (по умолчанию неделя назад)"
+    ),
+    OpenApiParameter(
+        "dateTo", str, description="Конечная дата включительно (по умолчанию сегодня)"
+    ),
+]
+
+
+def parse_period(request) -> tuple:
+    """Период отчёта из dateFrom/dateTo; по умолчанию последние 7 дней"""
+    today = timezone.localdate()
+    date_to = request.query_params.get("dateTo")
+    date_from = request.query_params.get("dateFrom")
+    date_to = date.fromisoformat(date_to) if date_to else today
+    date_from = date.fromisoformat(date_from) if date_from else date_to - timedelta(days=6)
+    return date_from, date_to
+
+
+@extend_schema(tags=["reports"])
+class CategorySalesAPIView(APIView):
+    """
+    Выручка по категориям и дням — только из сводной таблицы
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(
+        parameters=DATE_PARAMETERS,
+        responses={200: None},
+        description="Продажи по категориям за каждый день периода",
+    )
+    def get(self, request: Request):
+        try:
+            date_from, date_to = parse_period(request)
+        except ValueError:
+            return Response({"error": "Неверный формат даты"}, status=status.HTTP_400_BAD_REQUEST)
+
+        tree = get_category_tree()
+        rows = (
+            CategorySalesDaily.objects.filter(day__range=(date_from, date_to))
+            .order_by("day", "category_id")
+            .values("day", "category_id", "units", "revenue", "orders")
+        )
+        data = [
+            {
+                "day": row["day"],
+                "category": row["category_id"],
+                "title": tree.nodes.get(row["category_id"], {}).get("title", ""),
+                "units": row["units"],
+                "revenue": row["revenue"],
+                "orders": row["orders"],
+            }
+            for row in rows
+        ]
+        return Response(data)
+
+
+@extend_schema(tags=["reports"])
+class TopProductsAPIView(APIView):
+    """
+    Самые продаваемые товары за период — только из сводной таблицы
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    order_fields = ("units", "revenue", "orders")
+
+    @extend_schema(
+        parameters=DATE_PARAMETERS
+        + [
+            OpenApiParameter("limit", int, description="Количество товаров (до 100)"),
+            OpenApiParameter("orderBy", str, enum=("units", "revenue", "orders")),
+        ],
+        responses={200: None},
+        description="Лидеры продаж за период",
+    )
+    def get(self, request: Request):
+        try:
+            date_from, date_to = parse_period(request)
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), 100)
+        except ValueError:
+            return Response(
+                {"error": "Неверные параметры отчёта"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        order_by = request.query_params.get("orderBy", "units")
+        if order_by not in self.order_fields:
+            return Response(
+                {"error": "orderBy должен быть одним из: %s" % ", ".join(self.order_fields)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        rows = (
+            ProductSalesDaily.objects.filter(day__range=(date_from, date_to))
+            .values("product_id")
+            .annotate(
+                title=Max("title"),
+                category=Max("category_id"),
+                units=Sum("units"),
+                revenue=Sum("revenue"),
+                orders=Sum("orders"),
+            )
+            .order_by(f"-{order_by}", "product_id")[:limit]
+        )
+        data = [
+            {
+                "id": row["product_id"],
+                "title": row["title"],
+                "category": row["category"],
+                "units": row["units"],
+                "revenue": row["revenue"],
+                "orders": row["orders"],
+            }
+            for row in rows
+        ]
+        return Response(data)
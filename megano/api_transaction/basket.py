@@ -0,0 +1,81 @@
+"""
+Чтение корзины за фиксированное число запросов.
+
+Корзина любого владельца (пользователя или гостя) сводится к словарю
+{product_id: count}; товары, изображения и теги для него загружаются тремя
+запросами независимо от количества позиций.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Prefetch
+
+from api_product.models import Product, ProductImage, Tag
+from .models import Basket
+from .serializers import BasketItemSerializer
+
+BASKET_PRODUCT_FIELDS = (
+    'id',
+    'category_id',
+    'price',
+    'count',
+    'title',
+    'description',
+    'freeDelivery',
+    'rating',
+    'reviews_count',
+    'available',
+    'salePrice',
+    'dateFrom',
+    'dateTo',
+)
+
+
+def get_user_counts(user) -> dict:
+    """Содержимое корзины пользователя из таблицы Basket"""
+    return dict(Basket.objects.filter(user=user).order_by('id').values_list('product_id', 'count'))
+
+
+def get_session_counts(session) -> dict:
+    """Содержимое гостевой корзины из сессии"""
+    return {
+        int(product_id): item['count'] for product_id, item in session.get('basket', {}).items()
+    }
+
+
+def get_basket_products(product_ids, **filters):
+    return (
+        Product.objects.filter(id__in=product_ids, **filters)
+        .only(*BASKET_PRODUCT_FIELDS)
+        .prefetch_related(
+            Prefetch(
+                'images', queryset=ProductImage.objects.only('src', 'alt', 'variants', 'product_id')
+            ),
+            Prefetch('tags', queryset=Tag.objects.only('id', 'name')),
+        )
+    )
+
+
+def serialize_basket(counts: dict, request, **filters) -> list:
+    """
+    Сериализует корзину {product_id: count} в порядке добавления позиций
+    """
+    if not counts:
+        return []
+    products = {product.id: product for product in get_basket_products(counts, **filters)}
+    ordered = [products[product_id] for product_id in counts if product_id in products]
+    data = BasketItemSerializer(ordered, many=True, context={'request': request}).data
+    for item in data:
+        item['count'] = counts[item['id']]
+    return data
+
+
+def basket_totals(counts: dict) -> dict:
+    """Итоги корзины: количество единиц и стоимость по действующим ценам (один запрос)"""
+    products = Product.objects.filter(id__in=counts).only(
+        'id', 'price', 'salePrice', 'dateFrom', 'dateTo'
+    )
+    return {
+        'totalCount': sum(counts.values()),
+        'totalCost': sum((p.current_price * counts[p.id] for p in products), Decimal(0)),
+    }
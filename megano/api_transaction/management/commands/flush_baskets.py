@@ -0,0 +1,35 @@
+import time
+
+from django.core.management import BaseCommand
+
+from api_transaction.storage import CacheBasketStorage
+
+
+class Command(BaseCommand):
+    """
+    Записывает в таблицу Basket корзины пользователей, изменённые в кэше
+    и ещё не сохранённые отложенной записью.
+    """
+
+    help = "Persist dirty cached baskets to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Повторять запись каждые N секунд (0 — выполнить один раз)",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            started = time.monotonic()
+            flushed = CacheBasketStorage.flush_all()
+            self.stdout.write(
+                "Записано корзин: %d за %.3f c" % (flushed, time.monotonic() - started)
+            )
+            if not interval:
+                break
+            time.sleep(interval)
+        self.stdout.write(self.style.SUCCESS("Baskets flushed."))
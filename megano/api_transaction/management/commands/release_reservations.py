@@ -0,0 +1,40 @@
+import time
+
+from django.core.management import BaseCommand
+
+from api_transaction.reservations import release_expired
+
+
+class Command(BaseCommand):
+    """
+    Освобождает истёкшие резервы товаров пачками в коротких транзакциях.
+    """
+
+    help = "Release expired stock reservations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество резервов, освобождаемых в одной транзакции",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Повторять каждые N секунд (0 — выполнить один раз)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            rows, units = release_expired(batch_size=options["batch_size"])
+            self.stdout.write(
+                "Освобождено резервов: %d (единиц товара: %d) за %.3f c"
+                % (rows, units, time.monotonic() - started)
+            )
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS("Reservations released."))
@@ -0,0 +1,140 @@
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends import db
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from api_transaction.models import Basket
+
+
+def sessions_in_db() -> bool:
+    """Сессии хранятся в таблице django_session (db, cached_db и их наследники)"""
+    engine = import_module(settings.SESSION_ENGINE)
+    return issubclass(engine.SessionStore, db.SessionStore)
+
+
+class Command(BaseCommand):
+    """
+    Удаляет брошенные корзины и истёкшие сессии (вместе с гостевыми корзинами)
+    пачками в коротких транзакциях, чтобы не держать блокировку записи SQLite.
+
+    Брошенной считается корзина пользователя, который не входил на сайт и ничего
+    не добавлял в корзину дольше --days дней.
+    """
+
+    help = "Delete abandoned basket rows and expired sessions in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Через сколько дней без активности корзина считается брошенной",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество строк, удаляемых в одной транзакции",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Пауза между пачками в секундах, чтобы пропустить другие записи",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0 or options["days"] <= 0:
+            self.stdout.write(self.style.ERROR("--batch-size и --days должны быть больше 0"))
+            return
+
+        started = time.monotonic()
+        free_before = self.free_bytes()
+        baskets = self.sweep_baskets(
+            timezone.now() - timedelta(days=options["days"]), batch_size, options["pause"]
+        )
+        if sessions_in_db():
+            sessions, session_bytes = self.sweep_sessions(batch_size, options["pause"])
+        else:
+            sessions = session_bytes = 0
+            self.stdout.write("Сессии хранятся не в БД (%s), пропускаем" % settings.SESSION_ENGINE)
+
+        self.stdout.write(
+            "Удалено строк корзин: %d, сессий: %d (%d байт данных сессий) за %.3f c"
+            % (baskets, sessions, session_bytes, time.monotonic() - started)
+        )
+        if free_before is not None:
+            self.stdout.write("Освобождено страниц БД: %d байт" % (self.free_bytes() - free_before))
+        self.stdout.write(self.style.SUCCESS("Sweep finished."))
+
+    def sweep_baskets(self, cutoff, batch_size, pause) -> int:
+        stale = (
+            Basket.objects.filter(created_at__lt=cutoff)
+            .exclude(user__last_login__gte=cutoff)
+            .exclude(user__basket_items__created_at__gte=cutoff)
+        )
+        deleted = 0
+        last_pk = 0
+        while True:
+            # Keyset по первичному ключу: каждая пачка читается по индексу
+            batch = list(
+                stale.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]
+            with transaction.atomic():
+                # Условие повторяется: пользователь мог вернуться после выборки
+                count, _ = stale.filter(pk__in=batch).delete()
+            deleted += count
+            if pause:
+                time.sleep(pause)
+        return deleted
+
+    def sweep_sessions(self, batch_size, pause) -> tuple:
+        now = timezone.now()
+        cache = caches[settings.BASKET_CACHE_ALIAS]
+        deleted = reclaimed = 0
+        while True:
+            batch = list(
+                Session.objects.filter(expire_date__lt=now)
+                .order_by("expire_date")
+                .annotate(size=Length("session_data"))
+                .values_list("session_key", "size")[:batch_size]
+            )
+            if not batch:
+                break
+            keys = [key for key, _ in batch]
+            with transaction.atomic():
+                count, _ = Session.objects.filter(
+                    session_key__in=keys, expire_date__lt=now
+                ).delete()
+            # Гостевые корзины в кэше тоже привязаны к ключу сессии
+            cache.delete_many([f"basket:s{key}" for key in keys])
+            deleted += count
+            reclaimed += sum(size or 0 for _, size in batch)
+            if pause:
+                time.sleep(pause)
+        return deleted, reclaimed
+
+    @staticmethod
+    def free_bytes():
+        """Размер свободных страниц файла SQLite (None для других СУБД)"""
+        if connection.vendor != "sqlite":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA freelist_count")
+            pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_size")
+            return pages * cursor.fetchone()[0]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_product', '0007_product_reserved'),
+        ('api_transaction', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                ('owner', models.CharField(max_length=64, verbose_name='Владелец')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Истекает')),
+                (
+                    'product',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='reservations',
+                        to='api_product.product',
+                        verbose_name='Товар',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Резерв товара',
+                'verbose_name_plural': 'Резервы товаров',
+                'unique_together': {('owner', 'product')},
+            },
+        ),
+    ]
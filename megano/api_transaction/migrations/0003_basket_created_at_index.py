@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_transaction', '0002_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='basket',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -12,7 +12,7 @@ class Basket(models.Model):
         related_name='basket_entries',
     )
     count = models.PositiveIntegerField(default=1)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         unique_together = ('user', 'product')
@@ -21,3 +21,28 @@ class Basket(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.product.title} ({self.count})"
+
+
+class StockReservation(models.Model):
+    """
+    Резерв товара под корзину владельца ("u<user_id>" или "s<session_key>")
+    с ограниченным сроком жизни
+    """
+
+    owner = models.CharField(max_length=64, verbose_name='Владелец')
+    product = models.ForeignKey(
+        "api_product.Product",
+        on_delete=models.CASCADE,
+        related_name='reservations',
+        verbose_name='Товар',
+    )
+    quantity = models.PositiveIntegerField(default=0, verbose_name='Количество')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Истекает')
+
+    class Meta:
+        unique_together = ('owner', 'product')
+        verbose_name = 'Резерв товара'
+        verbose_name_plural = 'Резервы товаров'
+
+    def __str__(self):
+        return f"{self.owner} - {self.product_id} ({self.quantity})"
@@ -0,0 +1,152 @@
+"""
+Резервирование остатков под корзины без блокировок строк.
+
+Проверка остатка и резервирование выполняются одним условным UPDATE
+(reserved = reserved + n WHERE count - reserved >= n), поэтому два параллельных
+добавления в корзину не могут вместе превысить остаток. Резервы живут
+STOCK_RESERVATION_TTL секунд; истёкшие освобождает команда release_reservations.
+"""
+
+import logging
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from api_product.models import Product
+from .models import StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationFailed(Exception):
+    """Остатка недостаточно хотя бы для одного товара"""
+
+    def __init__(self, product_ids):
+        super().__init__(product_ids)
+        self.product_ids = product_ids
+
+
+def _per_product(values: dict):
+    return Case(
+        *[When(pk=product_id, then=Value(value)) for product_id, value in values.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def release_reserved(quantities: dict):
+    """Возвращает в свободный остаток {product_id: n} одним UPDATE"""
+    if quantities:
+        Product.objects.filter(pk__in=list(quantities)).update(
+            reserved=Greatest(F('reserved') - _per_product(quantities), Value(0))
+        )
+
+
+def adjust_reservations(owner: str, deltas: dict):
+    """
+    Изменяет резервы владельца на {product_id: ±n} в одной транзакции.
+    Все увеличения проверяются и применяются одним условным UPDATE; если хотя бы
+    одному товару не хватает свободного остатка, бросает ReservationFailed и
+    ничего не меняет
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    with transaction.atomic():
+        reservations = StockReservation.objects.filter(owner=owner, product_id__in=list(deltas))
+        # Продление срока первым запросом заодно блокирует строки владельца до конца
+        # транзакции, так что параллельные изменения той же корзины не теряются
+        reservations.update(expires_at=expires_at)
+        held = dict(reservations.values_list('product_id', 'quantity'))
+        # Нельзя освободить больше, чем владелец держит сейчас
+        deltas = {
+            product_id: max(delta, -held.get(product_id, 0)) for product_id, delta in deltas.items()
+        }
+        increase = {product_id: delta for product_id, delta in deltas.items() if delta > 0}
+        decrease = {product_id: -delta for product_id, delta in deltas.items() if delta < 0}
+
+        if increase:
+            condition = reduce(
+                or_,
+                (
+                    Q(pk=product_id, count__gte=F('reserved') + delta)
+                    for product_id, delta in increase.items()
+                ),
+            )
+            updated = (
+                Product.objects.filter(condition, available=True)
+                .filter(pk__in=list(increase))
+                .update(reserved=F('reserved') + _per_product(increase))
+            )
+            if updated != len(increase):
+                failed = Product.objects.filter(pk__in=list(increase)).exclude(condition)
+                raise ReservationFailed(list(failed.values_list('pk', flat=True)) or list(increase))
+        release_reserved(decrease)
+
+        quantities = {
+            product_id: held.get(product_id, 0) + delta for product_id, delta in deltas.items()
+        }
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(
+                    owner=owner, product_id=product_id, quantity=quantity, expires_at=expires_at
+                )
+                for product_id, quantity in quantities.items()
+                if quantity > 0
+            ],
+            update_conflicts=True,
+            unique_fields=['owner', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
+        emptied = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        if emptied:
+            StockReservation.objects.filter(owner=owner, product_id__in=emptied).delete()
+
+
+def release_owner(owner: str):
+    """Освобождает все резервы владельца"""
+    with transaction.atomic():
+        held = dict(
+            StockReservation.objects.filter(owner=owner).values_list('product_id', 'quantity')
+        )
+        release_reserved(held)
+        StockReservation.objects.filter(owner=owner).delete()
+
+
+def release_expired(batch_size=500, now=None) -> tuple:
+    """
+    Освобождает истёкшие резервы пачками по batch_size в коротких транзакциях.
+    Возвращает (количество резервов, количество единиц товара)
+    """
+    now = now or timezone.now()
+    released_rows = released_units = 0
+    while True:
+        batch = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        with transaction.atomic():
+            reservations = StockReservation.objects.filter(id__in=batch, expires_at__lte=now)
+            # Захватываем строки, затем перечитываем: резерв могли продлить после выборки
+            reservations.update(expires_at=F('expires_at'))
+            rows = list(reservations.values_list('id', 'product_id', 'quantity'))
+            quantities = {}
+            for _, product_id, quantity in rows:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+            release_reserved(quantities)
+        released_rows += len(rows)
+        released_units += sum(quantities.values())
+        logger.debug("Освобождено резервов: %d", len(rows))
+    return released_rows, released_units
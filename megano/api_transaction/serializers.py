@@ -43,16 +43,23 @@ class BasketItemSerializer(serializers.ModelSerializer):
         ]
 
     def get_images(self, obj) -> list:
-        images = obj.images.all()
-        if not images.exists():
+        # list() использует prefetch_related, .exists() отправил бы отдельный запрос
+        images = list(obj.images.all())
+        if not images:
             return [{'src': None, 'alt': 'No image'}]
         return ImageSerializer(images, many=True, context=self.context).data
 
     def get_tags(self, obj) -> list:
-        tags = obj.tags.all()
-        if not tags.exists():
-            return []
-        return TagSerializer(tags, many=True, context=self.context).data
+        return TagSerializer(obj.tags.all(), many=True, context=self.context).data
+
+
+class BasketOperationSerializer(serializers.Serializer):
+    """
+    Операция массового изменения корзины: абсолютное количество товара, 0 — удалить
+    """
+
+    id = serializers.IntegerField(min_value=1)
+    count = serializers.IntegerField(min_value=0)
 
 
 class SaleSerializer(serializers.ModelSerializer):
@@ -0,0 +1,498 @@
+"""
+Хранилища корзины.
+
+Корзина представлена компактным словарём {product_id: count}. Класс хранилища
+задаётся настройкой BASKET_STORAGE:
+
+- DatabaseBasketStorage — таблица Basket для пользователей и сессия для гостей;
+- CacheBasketStorage — словарь в общем для всех процессов кэше
+  (BASKET_CACHE_ALIAS) для пользователей и гостей. При BASKET_WRITE_BEHIND
+  корзины пользователей записываются в таблицу Basket отложенно: первое
+  изменение ставит отметку basket:dirty:<user_id> и задачу flush_basket с
+  задержкой BASKET_WRITE_BEHIND_DELAY секунд, последующие до её выполнения
+  только накапливаются. Команда flush_baskets записывает все ожидающие
+  корзины сразу (например, перед остановкой). Без BASKET_WRITE_BEHIND кэш
+  может вытеснить запись, поэтому каждое изменение сразу сохраняется в
+  таблицу Basket (гостевая корзина — в сессию), а кэш только ускоряет чтение.
+
+При входе гостевая корзина переносится в корзину пользователя функциями
+take_guest_basket() (до login()) и merge_guest_basket() (после него).
+"""
+
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from api_job.models import Job
+from api_job.queue import job
+from api_product.models import Product
+from .basket import get_session_counts, get_user_counts
+from .models import Basket
+from .reservations import ReservationFailed, adjust_reservations, release_owner
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = "basket:dirty:{}"
+
+
+class BasketBusy(Exception):
+    """Корзину изменяет другой запрос, блокировка не получена"""
+
+
+class StockLimitExceeded(Exception):
+    """Новое количество товара в корзине превышает доступный остаток"""
+
+    def __init__(self, available):
+        super().__init__(available)
+        self.available = available
+
+
+def persist_user_counts(user_id, counts: dict):
+    """
+    Приводит строки Basket пользователя к словарю counts: одна вставка с
+    обновлением при конфликте по (user, product) и одно удаление лишних строк
+    """
+    with transaction.atomic():
+        Basket.objects.bulk_create(
+            [
+                Basket(user_id=user_id, product_id=product_id, count=count)
+                for product_id, count in counts.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'product'],
+            update_fields=['count'],
+        )
+        Basket.objects.filter(user_id=user_id).exclude(product_id__in=list(counts)).delete()
+
+
+def _diff_counts(current: dict, counts: dict) -> dict:
+    return {
+        product_id: count
+        for product_id, count in counts.items()
+        if current.get(product_id, 0) != count
+    }
+
+
+def _count_deltas(current: dict, changes: dict) -> dict:
+    return {product_id: count - current.get(product_id, 0) for product_id, count in changes.items()}
+
+
+class BaseBasketStorage:
+    """
+    Интерфейс хранилища корзины одного владельца (пользователя или гостя)
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user if request.user.is_authenticated else None
+
+    @property
+    def owner(self) -> str:
+        """Идентификатор владельца корзины: u<user_id> или s<session_key>"""
+        if self.user:
+            return f"u{self.user.pk}"
+        session = self.request.session
+        if not session.session_key:
+            session.save()
+        return f"s{session.session_key}"
+
+    def _save_session(self, counts):
+        self.request.session['basket'] = {
+            str(product_id): {'count': count} for product_id, count in counts.items()
+        }
+
+    def items(self) -> dict:
+        raise NotImplementedError
+
+    def add(self, product_id, count, limit=None) -> int:
+        """
+        Атомарно увеличивает количество товара и возвращает новое значение.
+        Если результат превышает limit, бросает StockLimitExceeded
+        """
+        raise NotImplementedError
+
+    def remove(self, product_id, count) -> bool:
+        """Уменьшает количество товара; False, если товара нет в корзине"""
+        raise NotImplementedError
+
+    def set_many(self, counts: dict, reserve=None) -> dict:
+        """
+        Устанавливает абсолютные количества {product_id: count} (0 — удалить позицию).
+        reserve({product_id: ±n}) вызывается с разницей к текущему содержимому до
+        записи, пока корзину не может изменить другой запрос; исключение из него
+        отменяет изменение. Возвращает только фактически изменившиеся позиции
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """Записывает отложенные изменения в БД (если хранилище их накапливает)"""
+
+
+class DatabaseBasketStorage(BaseBasketStorage):
+    """
+    Корзина пользователя в таблице Basket, гостевая корзина в сессии
+    """
+
+    def items(self) -> dict:
+        if self.user:
+            return get_user_counts(self.user)
+        return get_session_counts(self.request.session)
+
+    def add(self, product_id, count, limit=None) -> int:
+        if not self.user:
+            counts = self.items()
+            new_count = counts.get(product_id, 0) + count
+            if limit is not None and new_count > limit:
+                raise StockLimitExceeded(limit)
+            counts[product_id] = new_count
+            self._save_session(counts)
+            return new_count
+
+        with transaction.atomic():
+            items = Basket.objects.filter(user=self.user, product_id=product_id)
+            if limit is not None:
+                updated = items.filter(count__lte=limit - count).update(count=F('count') + count)
+            else:
+                updated = items.update(count=F('count') + count)
+            if not updated:
+                if items.exists():
+                    raise StockLimitExceeded(limit)
+                if limit is not None and count > limit:
+                    raise StockLimitExceeded(limit)
+                try:
+                    with transaction.atomic():
+                        Basket.objects.create(user=self.user, product_id=product_id, count=count)
+                except IntegrityError:
+                    # Параллельный запрос успел создать строку — повторяем инкремент
+                    return self.add(product_id, count, limit)
+            return items.values_list('count', flat=True).get()
+
+    def remove(self, product_id, count) -> bool:
+        if not self.user:
+            counts = self.items()
+            if product_id not in counts:
+                return False
+            if counts[product_id] <= count:
+                del counts[product_id]
+            else:
+                counts[product_id] -= count
+            self._save_session(counts)
+            return True
+
+        items = Basket.objects.filter(user=self.user, product_id=product_id)
+        if items.filter(count__gt=count).update(count=F('count') - count):
+            return True
+        deleted, _ = items.delete()
+        return bool(deleted)
+
+    def set_many(self, counts: dict, reserve=None) -> dict:
+        if not self.user:
+            current = self.items()
+            changes = _diff_counts(current, counts)
+            if changes and reserve:
+                reserve(_count_deltas(current, changes))
+            current.update(changes)
+            self._save_session({pid: count for pid, count in current.items() if count})
+            return changes
+
+        # Чтение и запись в одной транзакции: строки корзины блокируются до её конца
+        with transaction.atomic():
+            current = dict(
+                Basket.objects.select_for_update()
+                .filter(user=self.user)
+                .values_list('product_id', 'count')
+            )
+            changes = _diff_counts(current, counts)
+            if not changes:
+                return changes
+            if reserve:
+                reserve(_count_deltas(current, changes))
+            Basket.objects.bulk_create(
+                [
+                    Basket(user=self.user, product_id=product_id, count=count)
+                    for product_id, count in changes.items()
+                    if count
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'product'],
+                update_fields=['count'],
+            )
+            removed = [product_id for product_id, count in changes.items() if not count]
+            if removed:
+                Basket.objects.filter(user=self.user, product_id__in=removed).delete()
+        return changes
+
+    def clear(self):
+        if self.user:
+            Basket.objects.filter(user=self.user).delete()
+        else:
+            self.request.session.pop('basket', None)
+
+
+class CacheBasketStorage(BaseBasketStorage):
+    """
+    Корзина в кэше с атомарными изменениями под блокировкой cache.add()
+    и записью в таблицу Basket (отложенной при BASKET_WRITE_BEHIND)
+    """
+
+    lock_timeout = 5
+    lock_attempts = 50
+    lock_sleep = 0.01
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cache = caches[settings.BASKET_CACHE_ALIAS]
+        if self.user:
+            self.timeout = settings.BASKET_CACHE_TIMEOUT
+        else:
+            self.timeout = settings.SESSION_COOKIE_AGE
+        self.key = f"basket:{self.owner}"
+        self.write_behind = settings.BASKET_WRITE_BEHIND and self.user is not None
+
+    @classmethod
+    def _locked(cls, cache, key):
+        """Менеджер блокировки: cache.add атомарен в DatabaseCache, Memcached и Redis"""
+        return _CacheLock(cache, f"{key}:lock", cls.lock_timeout, cls.lock_attempts, cls.lock_sleep)
+
+    def items(self) -> dict:
+        counts = self.cache.get(self.key)
+        if counts is None:
+            if self.user:
+                counts = get_user_counts(self.user)
+            else:
+                counts = get_session_counts(self.request.session)
+            self.cache.add(self.key, counts, self.timeout)
+        return dict(counts)
+
+    def _persist(self, counts):
+        if self.user:
+            persist_user_counts(self.user.pk, counts)
+        else:
+            self._save_session(counts)
+
+    def _update(self, mutate):
+        with self._locked(self.cache, self.key):
+            counts = self.items()
+            result = mutate(counts)
+            self.cache.set(self.key, counts, self.timeout)
+            if not self.write_behind:
+                # Под блокировкой, чтобы запись параллельных изменений не шла не по порядку
+                self._persist(counts)
+        if self.write_behind:
+            self._mark_dirty()
+        return result
+
+    def add(self, product_id, count, limit=None) -> int:
+        def mutate(counts):
+            new_count = counts.get(product_id, 0) + count
+            if limit is not None and new_count > limit:
+                raise StockLimitExceeded(limit)
+            counts[product_id] = new_count
+            return new_count
+
+        return self._update(mutate)
+
+    def remove(self, product_id, count) -> bool:
+        def mutate(counts):
+            if product_id not in counts:
+                return False
+            if counts[product_id] <= count:
+                del counts[product_id]
+            else:
+                counts[product_id] -= count
+            return True
+
+        return self._update(mutate)
+
+    def set_many(self, counts: dict, reserve=None) -> dict:
+        def mutate(current):
+            changes = _diff_counts(current, counts)
+            if changes and reserve:
+                reserve(_count_deltas(current, changes))
+            for product_id, count in changes.items():
+                if count:
+                    current[product_id] = count
+                else:
+                    del current[product_id]
+            return changes
+
+        return self._update(mutate)
+
+    def clear(self):
+        with self._locked(self.cache, self.key):
+            self.cache.set(self.key, {}, self.timeout)
+        if self.user:
+            Basket.objects.filter(user=self.user).delete()
+            self.cache.delete(DIRTY_KEY.format(self.user.pk))
+        else:
+            self.request.session.pop('basket', None)
+
+    def flush(self):
+        if self.user:
+            self.flush_user(self.cache, self.user.pk)
+
+    def _mark_dirty(self):
+        user_id = self.user.pk
+        dirty_key = DIRTY_KEY.format(user_id)
+        # Отметка своя у каждого пользователя: add() атомарен и не ждёт чужих корзин
+        if self.cache.add(dirty_key, time.time(), None):
+            flush_basket.enqueue(
+                args=[user_id],
+                key=f"basket-flush:{user_id}",
+                countdown=settings.BASKET_WRITE_BEHIND_DELAY,
+            )
+            return
+        since = self.cache.get(dirty_key)
+        if since is not None and time.time() - since >= settings.BASKET_WRITE_BEHIND_DELAY:
+            # Задача отстаёт (очередь занята или обработчики остановлены)
+            self.flush()
+
+    @classmethod
+    def flush_user(cls, cache, user_id):
+        key = f"basket:u{user_id}"
+        # Снимаем отметку до чтения: изменение, сделанное во время записи, пометит корзину снова
+        cache.delete(DIRTY_KEY.format(user_id))
+        with cls._locked(cache, key):
+            counts = cache.get(key)
+            if counts is None:
+                logger.warning("Корзины пользователя %s нет в кэше, записывать нечего", user_id)
+                return
+            persist_user_counts(user_id, counts)
+        logger.debug("Корзина пользователя %s записана в БД: %s", user_id, counts)
+
+    @classmethod
+    def flush_all(cls) -> int:
+        """Записывает корзины, отмеченные изменёнными, не дожидаясь задач flush_basket"""
+        cache = caches[settings.BASKET_CACHE_ALIAS]
+        user_ids = {
+            args[0]
+            for args in Job.objects.filter(
+                name=flush_basket.name, status=Job.Status.QUEUED
+            ).values_list('args', flat=True)
+        }
+        dirty = cache.get_many([DIRTY_KEY.format(user_id) for user_id in user_ids])
+        flushed = 0
+        for user_id in sorted(user_ids):
+            if DIRTY_KEY.format(user_id) not in dirty:
+                continue
+            try:
+                cls.flush_user(cache, user_id)
+            except BasketBusy:
+                logger.warning("Корзина пользователя %s занята, запись отложена", user_id)
+                # Отметка снята до блокировки — возвращаем её для следующего запуска
+                cache.add(DIRTY_KEY.format(user_id), time.time(), None)
+                continue
+            flushed += 1
+        return flushed
+
+
+@job(queue="default")
+def flush_basket(user_id):
+    """Отложенная запись корзины пользователя из кэша в таблицу Basket"""
+    CacheBasketStorage.flush_user(caches[settings.BASKET_CACHE_ALIAS], user_id)
+
+
+class _CacheLock:
+    def __init__(self, cache, key, timeout, attempts, sleep):
+        self.cache = cache
+        self.key = key
+        self.timeout = timeout
+        self.attempts = attempts
+        self.sleep = sleep
+        self.token = uuid.uuid4().hex
+
+    def __enter__(self):
+        for _ in range(self.attempts):
+            if self.cache.add(self.key, self.token, self.timeout):
+                return self
+            time.sleep(self.sleep)
+        # Чужую блокировку не забираем: её владелец может ещё писать.
+        # Зависшая блокировка истечёт сама через timeout
+        logger.warning("Не удалось получить блокировку %s", self.key)
+        raise BasketBusy(self.key)
+
+    def __exit__(self, *exc_info):
+        if self.cache.get(self.key) == self.token:
+            self.cache.delete(self.key)
+        return False
+
+
+def get_basket_storage(request) -> BaseBasketStorage:
+    """Хранилище корзины текущего запроса (создаётся один раз на запрос)"""
+    storage = getattr(request, '_basket_storage', None)
+    if storage is None:
+        storage = import_string(settings.BASKET_STORAGE)(request)
+        request._basket_storage = storage
+    return storage
+
+
+def take_guest_basket(request):
+    """
+    Забирает гостевую корзину до login(): login() меняет ключ сессии, и корзина
+    гостя стала бы недоступна. Очищает её и возвращает (owner, counts) или None
+    """
+    storage = get_basket_storage(request)
+    guest = None
+    if not storage.user and request.session.session_key:
+        counts = storage.items()
+        if counts:
+            guest = (storage.owner, counts)
+            storage.clear()
+    # После входа хранилище должно создаваться заново уже для пользователя
+    del request._basket_storage
+    return guest
+
+
+def merge_guest_basket(request, guest) -> dict:
+    """
+    Добавляет гостевую корзину к корзине вошедшего пользователя.
+
+    Товары и их свободный остаток проверяются одним запросом, резервы гостя
+    переходят пользователю, позиции записываются одной вставкой с обновлением
+    при конфликте (user, product). Количество ограничивается свободным
+    остатком, недоступные товары отбрасываются. Возвращает изменённые позиции
+    """
+    if not guest:
+        return {}
+    guest_owner, counts = guest
+    storage = get_basket_storage(request)
+
+    with transaction.atomic():
+        # Резервы гостя возвращаются в свободный остаток и сразу берутся заново
+        release_owner(guest_owner)
+        free = {
+            product_id: count - reserved
+            for product_id, count, reserved in Product.objects.filter(
+                id__in=list(counts), available=True
+            ).values_list('id', 'count', 'reserved')
+        }
+        additions = {}
+        for product_id, count in counts.items():
+            count = min(count, free.get(product_id, 0))
+            if count > 0:
+                additions[product_id] = count
+        if not additions:
+            return {}
+        try:
+            adjust_reservations(storage.owner, additions)
+        except ReservationFailed as e:
+            # Остаток успели зарезервировать другие — позиции остаются без резерва,
+            # окончательная проверка выполнится при оформлении заказа
+            logger.warning("Не удалось зарезервировать товары %s при входе", e.product_ids)
+
+    current = storage.items()
+    changes = storage.set_many(
+        {product_id: current.get(product_id, 0) + count for product_id, count in additions.items()}
+    )
+    storage.flush()
+    logger.debug("Гостевая корзина %s перенесена пользователю: %s", guest_owner, changes)
+    return changes
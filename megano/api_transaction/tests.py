@@ -1,3 +1,312 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from api_job.models import Job
+from api_product.models import Category, Product, ProductImage, Tag
+from .models import Basket, StockReservation
+from .reservations import ReservationFailed, adjust_reservations, release_expired
+from .storage import CacheBasketStorage
+
+
+# Общие кэши (корзины, сессии, лимиты запросов) вне БД, как Redis в production:
+# считаются только запросы к данным
+@override_settings(
+    CACHES={
+        **settings.CACHES,
+        "shared": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-shared",
+        },
+        "baskets": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-baskets",
+        },
+        "sessions": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-sessions",
+        },
+    }
+)
+class BasketReadPathTestCase(TestCase):
+    """
+    Чтение корзины должно занимать фиксированное число запросов
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="secret-pass-123")
+        category = Category.objects.create(title="Electronics")
+        tags = [Tag.objects.create(name=f"tag-{i}") for i in range(2)]
+        cls.products = []
+        for i in range(10):
+            product = Product.objects.create(
+                category=category, title=f"Product {i}", price=100 + i, count=50
+            )
+            product.tags.set(tags)
+            ProductImage.objects.create(product=product, src=f"products/p{i}_1.jpg")
+            ProductImage.objects.create(product=product, src=f"products/p{i}_2.jpg")
+            cls.products.append(product)
+        cls.url = reverse("api_transaction:basket")
+
+    def setUp(self):
+        caches[settings.BASKET_CACHE_ALIAS].clear()
+
+    def fill_basket(self, size):
+        Basket.objects.filter(user=self.user).delete()
+        Basket.objects.bulk_create(
+            Basket(user=self.user, product=product, count=2) for product in self.products[:size]
+        )
+        caches[settings.BASKET_CACHE_ALIAS].clear()
+
+    def test_authenticated_basket_query_count_does_not_grow(self):
+        self.client.force_login(self.user)
+        for size in (1, 10):
+            self.fill_basket(size)
+            # пользователь, позиции корзины, товары, изображения, теги (сессия — из кэша)
+            with self.assertNumQueries(5):
+                response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), size)
+
+        item = response.data[0]
+        self.assertEqual(item["id"], self.products[0].id)
+        self.assertEqual(item["count"], 2)
+        self.assertEqual(len(item["images"]), 2)
+        self.assertEqual(len(item["tags"]), 2)
+
+    def test_guest_basket_round_trip(self):
+        self.client.post(
+            self.url, {"id": self.products[1].id, "count": 3}, content_type="application/json"
+        )
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["id"], self.products[1].id)
+        self.assertEqual(response.data[0]["count"], 3)
+
+
+class CacheBasketStorageTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="secret-pass-123")
+        category = Category.objects.create(title="Electronics")
+        cls.products = [
+            Product.objects.create(category=category, title=f"Product {i}", count=5)
+            for i in range(3)
+        ]
+        cls.url = reverse("api_transaction:basket")
+
+    def setUp(self):
+        caches[settings.BASKET_CACHE_ALIAS].clear()
+        self.client.force_login(self.user)
+
+    def test_mutations_are_written_behind(self):
+        product = self.products[0]
+        with self.settings(BASKET_WRITE_BEHIND=True, BASKET_WRITE_BEHIND_DELAY=3600):
+            self.client.post(
+                self.url, {"id": product.id, "count": 2}, content_type="application/json"
+            )
+            response = self.client.post(
+                self.url, {"id": product.id, "count": 1}, content_type="application/json"
+            )
+
+        self.assertEqual(response.data[0]["count"], 3)
+        self.assertFalse(Basket.objects.filter(user=self.user).exists())
+        # Первое изменение ставит одну отложенную запись, второе её не дублирует
+        job = Job.objects.get(key=f"basket-flush:{self.user.pk}")
+        self.assertGreater(job.run_at, timezone.now() + timedelta(minutes=59))
+
+        self.assertEqual(CacheBasketStorage.flush_all(), 1)
+        self.assertEqual(Basket.objects.get(user=self.user, product=product).count, 3)
+        self.assertEqual(CacheBasketStorage.flush_all(), 0)
+
+    def test_mutations_are_written_through_without_write_behind(self):
+        product = self.products[0]
+        self.client.post(self.url, {"id": product.id, "count": 2}, content_type="application/json")
+
+        self.assertEqual(Basket.objects.get(user=self.user, product=product).count, 2)
+        self.assertFalse(Job.objects.exists())
+        # Вытесненная из кэша корзина читается из таблицы без потерь
+        caches[settings.BASKET_CACHE_ALIAS].clear()
+        self.assertEqual(self.client.get(self.url).data[0]["count"], 2)
+
+    def test_guest_basket_survives_cache_eviction(self):
+        self.client.logout()
+        product = self.products[1]
+        self.client.post(self.url, {"id": product.id, "count": 2}, content_type="application/json")
+
+        caches[settings.BASKET_CACHE_ALIAS].clear()
+
+        self.assertEqual(self.client.get(self.url).data[0]["count"], 2)
+
+    def test_stock_limit_is_enforced(self):
+        product = self.products[1]
+        self.client.post(self.url, {"id": product.id, "count": 4}, content_type="application/json")
+        response = self.client.post(
+            self.url, {"id": product.id, "count": 2}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_remove_persists_deletion(self):
+        product = self.products[2]
+        # Задача flush_basket выполняется сразу
+        with self.settings(JOB_QUEUE_EAGER=True):
+            self.client.post(
+                self.url, {"id": product.id, "count": 1}, content_type="application/json"
+            )
+            self.assertTrue(Basket.objects.filter(user=self.user, product=product).exists())
+            response = self.client.delete(
+                self.url, {"id": product.id, "count": 1}, content_type="application/json"
+            )
+
+        self.assertEqual(response.data, [])
+        self.assertFalse(Basket.objects.filter(user=self.user).exists())
+
+    def test_locked_basket_is_not_taken_over(self):
+        product = self.products[0]
+        cache = caches[settings.BASKET_CACHE_ALIAS]
+        cache.set(f"basket:u{self.user.pk}:lock", "other-request", 5)
+
+        with self.settings(BASKET_WRITE_BEHIND_DELAY=3600):
+            response = self.client.post(
+                self.url, {"id": product.id, "count": 1}, content_type="application/json"
+            )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(cache.get(f"basket:u{self.user.pk}:lock"), "other-request")
+        self.assertFalse(StockReservation.objects.filter(product=product, quantity__gt=0).exists())
+        self.assertEqual(Product.objects.get(pk=product.pk).reserved, 0)
+
+
+class BasketBulkUpdateTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="secret-pass-123")
+        category = Category.objects.create(title="Electronics")
+        cls.products = [
+            Product.objects.create(category=category, title=f"Product {i}", price=10, count=5)
+            for i in range(3)
+        ]
+        cls.url = reverse("api_transaction:basket")
+
+    def setUp(self):
+        caches[settings.BASKET_CACHE_ALIAS].clear()
+        self.client.force_login(self.user)
+
+    def test_patch_returns_delta_and_totals(self):
+        first, second, third = self.products
+        self.client.post(self.url, {"id": first.id, "count": 1}, content_type="application/json")
+
+        response = self.client.patch(
+            self.url + "?delta=true",
+            [
+                {"id": first.id, "count": 0},
+                {"id": second.id, "count": 2},
+                {"id": third.id, "count": 3},
+            ],
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["removed"], [first.id])
+        self.assertEqual({item["id"] for item in response.data["items"]}, {second.id, third.id})
+        self.assertEqual(response.data["totalCount"], 5)
+        self.assertEqual(response.data["totalCost"], 50)
+        # Резервы совпадают с содержимым корзины
+        reserved = dict(
+            StockReservation.objects.filter(owner=f"u{self.user.pk}").values_list(
+                "product_id", "quantity"
+            )
+        )
+        self.assertEqual(reserved, {second.id: 2, third.id: 3})
+
+    def test_patch_rejects_whole_batch_on_shortage(self):
+        first, second, _ = self.products
+        response = self.client.patch(
+            self.url,
+            [{"id": first.id, "count": 1}, {"id": second.id, "count": 6}],
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(second.id, response.data["errors"])
+        self.assertEqual(self.client.get(self.url).data, [])
+
+
+class StockReservationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Electronics")
+        cls.product = Product.objects.create(category=category, title="Phone", count=3)
+        cls.other = Product.objects.create(category=category, title="Laptop", count=10)
+
+    def test_reservations_cannot_exceed_stock(self):
+        adjust_reservations("u1", {self.product.id: 2})
+
+        with self.assertRaises(ReservationFailed):
+            adjust_reservations("u2", {self.other.id: 1, self.product.id: 2})
+
+        self.product.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.product.reserved, 2)
+        self.assertEqual(self.other.reserved, 0)
+        self.assertFalse(StockReservation.objects.filter(owner="u2").exists())
+
+    def test_release_is_capped_by_held_quantity(self):
+        adjust_reservations("u1", {self.product.id: 1})
+        adjust_reservations("u1", {self.product.id: -5})
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_reservations_are_released(self):
+        adjust_reservations("u1", {self.product.id: 2, self.other.id: 4})
+        adjust_reservations("u2", {self.product.id: 1})
+        StockReservation.objects.filter(owner="u1").update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(release_expired(batch_size=1), (2, 6))
+
+        self.product.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.product.reserved, 1)
+        self.assertEqual(self.other.reserved, 0)
+
+
+class SweepBasketsTestCase(TestCase):
+    def test_only_abandoned_baskets_are_deleted(self):
+        category = Category.objects.create(title="Electronics")
+        products = [
+            Product.objects.create(category=category, title=f"Product {i}", count=5)
+            for i in range(2)
+        ]
+        old = timezone.now() - timedelta(days=60)
+        idle = User.objects.create_user(username="idle", last_login=old)
+        active = User.objects.create_user(username="active", last_login=old)
+        for user in (idle, active):
+            Basket.objects.create(user=user, product=products[0])
+        Basket.objects.create(user=active, product=products[1])
+        # Старые позиции активного пользователя остаются: он добавил товар недавно
+        Basket.objects.filter(product=products[0]).update(created_at=old)
+
+        # Истёкшая сессия удаляется и при SESSION_ENGINE = 'megano.sessions'
+        Session.objects.create(session_key="expired", session_data="", expire_date=old)
+
+        call_command("sweep_baskets", batch_size=1, stdout=StringIO())
+
+        self.assertFalse(Basket.objects.filter(user=idle).exists())
+        self.assertEqual(Basket.objects.filter(user=active).count(), 2)
+        self.assertFalse(Session.objects.exists())
@@ -8,66 +8,45 @@ from rest_framework.exceptions import ValidationError
 
 from drf_spectacular.utils import extend_schema
 
-from django.db import transaction
 from django.db.models import Prefetch
 from django.utils import timezone
 
-from api_transaction.models import Basket
 from api_product.serializers import ProductContractSerializer
 from api_product.models import Product, ProductImage, Tag
 from api_product.pagination import CustomPagination
-from .serializers import BasketItemSerializer, SaleSerializer
+from .basket import basket_totals, serialize_basket
+from .reservations import ReservationFailed, adjust_reservations
+from .storage import BasketBusy, StockLimitExceeded, get_basket_storage
+from .serializers import BasketItemSerializer, BasketOperationSerializer, SaleSerializer
 
 logger = logging.getLogger(__name__)
 
 
+def basket_busy() -> Response:
+    logger.warning("Basket is locked by a concurrent request")
+    return Response(
+        {'error': 'Корзина изменяется другим запросом, повторите попытку'},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
 @extend_schema(tags=["basket"], responses=BasketItemSerializer(many=True))
 class BasketAPIView(APIView):
 
+    throttle_scope = "basket"
+
     @extend_schema(
         responses={200: BasketItemSerializer(many=True)},
         description="Получение содержимого корзины пользователя",
     )
     def get(self, request):
+        storage = get_basket_storage(request)
         if request.user.is_authenticated:
-            basket_items = (
-                Basket.objects.filter(user=request.user)
-                .prefetch_related('product__images', 'product__tags')
-                .only(
-                    'count',
-                    'product__id',
-                    'product__price',
-                    'product__title',
-                    'product__description',
-                    'product__freeDelivery',
-                    'product__rating',
-                    'product__reviews_count',
-                    'product__category_id',
-                    'product__salePrice',
-                    'product__dateFrom',
-                    'product__dateTo',
-                )
-            )
-
-            serialized_items = []
-            for item in basket_items:
-                serializer = BasketItemSerializer(item.product, context={'request': request})
-                item_data = serializer.data
-                item_data.update({'count': item.count})
-                serialized_items.append(item_data)
+            data = serialize_basket(storage.items(), request)
         else:
-            # Для гостей - из сессии
-            basket = request.session.get('basket', {})
-            product_ids = list(basket.keys())
-            products = Product.objects.filter(id__in=product_ids, available=True)
-            serializer = BasketItemSerializer(products, many=True, context={'request': request})
-            data = []
-            for product, serialized in zip(products, serializer.data):
-                item_data = serialized
-                item_data['count'] = basket[str(product.id)]['count']
-                data.append(item_data)
-
-        return Response(serialized_items)
+            data = serialize_basket(storage.items(), request, available=True)
+
+        return Response(data)
 
     @extend_schema(
         request={
@@ -82,7 +61,6 @@ class BasketAPIView(APIView):
         responses={200: BasketItemSerializer(many=True)},
         description="Добавление товара в корзину",
     )
-    @transaction.atomic
     def post(self, request):
         try:
             product_id = request.data['id']
@@ -93,7 +71,9 @@ class BasketAPIView(APIView):
             if count <= 0:
                 raise ValidationError({'count': 'Количество должно быть от 1 и больше'})
 
-            product = Product.objects.get(id=product_id)
+            product = Product.objects.only('id', 'count', 'reserved', 'available').get(
+                id=product_id
+            )
 
             if not product.available or product.count <= 0:
                 return Response(
@@ -106,30 +86,29 @@ class BasketAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            if request.user.is_authenticated:
-                basket_item, created = Basket.objects.get_or_create(
-                    user=request.user, product=product, defaults={'count': count}
+            storage = get_basket_storage(request)
+            try:
+                # Проверка свободного остатка и резерв — один условный UPDATE
+                adjust_reservations(storage.owner, {product.id: count})
+            except ReservationFailed:
+                return Response(
+                    {
+                        "error": "Недостаточно товара (доступно: %s)"
+                        % max(product.count - product.reserved, 0)
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
                 )
-
-                if not created:
-                    new_count = basket_item.count + count
-                    if new_count > product.count:
-                        return Response(
-                            {"error": "Недостаточно товара (доступно: %s)" % product.count},
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-                    basket_item.count = new_count
-                    basket_item.save()
-            else:
-                # Работа с сессией для гостей
-                basket = request.session.get('basket', {})
-                product_key = str(product_id)
-                if product_key in basket:
-                    basket[product_key]['count'] += count
-                else:
-                    basket[product_key] = {'count': count}
-                request.session['basket'] = basket
-                request.session.modified = True
+            try:
+                storage.add(product.id, count, limit=product.count)
+            except StockLimitExceeded as e:
+                adjust_reservations(storage.owner, {product.id: -count})
+                return Response(
+                    {"error": "Недостаточно товара (доступно: %s)" % e.available},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            except BasketBusy:
+                adjust_reservations(storage.owner, {product.id: -count})
+                return basket_busy()
 
             return self.get(request)
 
@@ -156,7 +135,6 @@ class BasketAPIView(APIView):
         responses={200: BasketItemSerializer(many=True)},
         description="Удаление товара из корзины",
     )
-    @transaction.atomic
     def delete(self, request):
         try:
             data = request.data if request.data else {}
@@ -168,24 +146,17 @@ class BasketAPIView(APIView):
             if count <= 0:
                 raise ValidationError({'count': 'Количество должно быть от 1 и больше'})
 
-            if request.user.is_authenticated:
-                basket_item = Basket.objects.get(user=request.user, product_id=product_id)
-
-                if basket_item.count <= count:
-                    basket_item.delete()
-                else:
-                    basket_item.count -= count
-                    basket_item.save()
-            else:
-                basket = request.session.get('basket', {})
-                product_key = str(product_id)
-                if product_key in basket:
-                    if basket[product_key]['count'] <= count:
-                        del basket[product_key]
-                    else:
-                        basket[product_key]['count'] -= count
-                    request.session['basket'] = basket
-                    request.session.modified = True
+            storage = get_basket_storage(request)
+            try:
+                removed = storage.remove(int(product_id), count)
+            except BasketBusy:
+                return basket_busy()
+            if not removed:
+                logger.error("Basket item not found: %s", product_id)
+                return Response(
+                    {'error': 'Товар не найден в корзине'}, status=status.HTTP_404_NOT_FOUND
+                )
+            adjust_reservations(storage.owner, {int(product_id): -count})
 
             return self.get(request)
 
@@ -194,11 +165,78 @@ class BasketAPIView(APIView):
             return Response(
                 {'error': 'Неверные данные запроса'}, status=status.HTTP_400_BAD_REQUEST
             )
-        except Basket.DoesNotExist:
-            logger.error("Basket item not found: %s", product_id)
-            return Response(
-                {'error': 'Товар не найден в корзине'}, status=status.HTTP_404_NOT_FOUND
+
+    @extend_schema(
+        request=BasketOperationSerializer(many=True),
+        responses={200: BasketItemSerializer(many=True)},
+        description=(
+            "Массовое изменение корзины: список {id, count} с абсолютными количествами "
+            "(0 — удалить). С параметром ?delta=true возвращаются только изменённые "
+            "позиции и итоги корзины"
+        ),
+    )
+    def patch(self, request):
+        data = request.data
+        delta = request.query_params.get('delta') == 'true'
+        if isinstance(data, dict):
+            delta = delta or bool(data.get('delta'))
+            data = data.get('items', [])
+
+        serializer = BasketOperationSerializer(data=data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        counts = {item['id']: item['count'] for item in serializer.validated_data}
+        if not counts:
+            return Response({'error': 'Нет операций'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Остатки всех товаров проверяются одним запросом
+        products = {
+            item['id']: item
+            for item in Product.objects.filter(id__in=counts).values('id', 'count', 'available')
+        }
+        errors = {}
+        for product_id, count in counts.items():
+            product = products.get(product_id)
+            if product is None:
+                errors[product_id] = 'Товар не найден'
+            elif count and not product['available']:
+                errors[product_id] = 'Товар недоступен для заказа'
+            elif count > product['count']:
+                errors[product_id] = 'Недостаточно товара (доступно: %s)' % product['count']
+        if errors:
+            logger.warning("Basket PATCH rejected: %s", errors)
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        storage = get_basket_storage(request)
+        owner = storage.owner
+        try:
+            # Резервы меняются на разницу с корзиной, прочитанной под её блокировкой
+            changes = storage.set_many(
+                counts, reserve=lambda deltas: adjust_reservations(owner, deltas)
             )
+        except ReservationFailed as e:
+            errors = {
+                product_id: 'Товар зарезервирован другими покупателями'
+                for product_id in e.product_ids
+            }
+            logger.warning("Basket PATCH reservation failed: %s", errors)
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        except BasketBusy:
+            return basket_busy()
+        logger.debug("Basket PATCH changes: %s", changes)
+
+        if not delta:
+            return self.get(request)
+
+        updated = {product_id: count for product_id, count in changes.items() if count}
+        return Response(
+            {
+                'items': serialize_basket(updated, request),
+                'removed': [product_id for product_id, count in changes.items() if not count],
+                **basket_totals(storage.items()),
+            }
+        )
 
 
 @extend_schema(tags=["catalog"], responses=BasketItemSerializer(many=True))
@@ -206,7 +244,9 @@ class BannersAPIView(ListAPIView):
     queryset = (
         Product.objects.prefetch_related(
             Prefetch('tags', queryset=Tag.objects.only('id', 'name')),
-            Prefetch('images', queryset=ProductImage.objects.only('src', 'alt', 'product_id')),
+            Prefetch(
+                'images', queryset=ProductImage.objects.only('src', 'alt', 'variants', 'product_id')
+            ),
         )
         .only(
             "id",
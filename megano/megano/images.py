@@ -0,0 +1,213 @@
+"""
+Уменьшенные копии изображений (ProductImage, CategoryImage, Avatar).
+
+Для каждого загруженного изображения строятся варианты IMAGE_VARIANTS
+({имя: наибольшая сторона в пикселях}) в форматах WebP и JPEG. Имя файла
+варианта содержит хэш содержимого оригинала, поэтому при замене изображения
+меняется и URL, а старые копии можно кэшировать навсегда. Пути и размеры
+вариантов хранятся в поле variants модели:
+
+    {"source": "products/x.jpg", "thumb": {"width": 160, "webp": "...", "jpeg": "..."}, ...}
+
+Сериализаторы берут URL из этого поля, не обращаясь к хранилищу. Варианты
+строит задача build_variants в очереди media (её ставят сигналы при сохранении
+изображения), для уже загруженных изображений — команда build_image_variants.
+Пока вариантов нет, клиенты получают только оригинал.
+"""
+
+import hashlib
+import logging
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from api_job.queue import job
+
+logger = logging.getLogger(__name__)
+
+# Модели с полями src (ImageField) и variants (JSONField)
+IMAGE_MODELS = ("api_product.ProductImage", "api_product.CategoryImage", "api_auth.Avatar")
+
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def _digest(data) -> str:
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def variant_name(source, digest, variant, ext) -> str:
+    stem, _ = posixpath.splitext(source)
+    return f"{settings.IMAGE_VARIANTS_DIR}/{stem}.{digest}.{variant}.{ext}"
+
+
+class InvalidImage(Exception):
+    """Файл не является изображением допустимого формата и размера"""
+
+
+def _fit(image, size) -> Image.Image:
+    """
+    Уменьшает открытое изображение до size по наибольшей стороне. Для JPEG
+    draft() декодирует сразу в уменьшенном масштабе (1/2–1/8), не распаковывая
+    оригинал целиком
+    """
+    image.draft("RGB", (size, size))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    return image
+
+
+def _encode(image, fmt) -> bytes:
+    pil_format, options = FORMATS[fmt]
+    if pil_format == "JPEG" and image.mode == "RGBA":
+        # У JPEG нет прозрачности — подкладываем белый фон
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    buffer = BytesIO()
+    # Метаданные (EXIF, ICC) не копируются
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(field_file) -> dict:
+    """
+    Строит и сохраняет в хранилище все варианты изображения, возвращает значение
+    variants. Оригинал декодируется один раз под наибольший вариант, остальные
+    получаются из него последовательным уменьшением
+    """
+    storage = field_file.storage
+    with storage.open(field_file.name, "rb") as original:
+        data = original.read()
+    digest = _digest(data)
+    sizes = sorted(settings.IMAGE_VARIANTS.items(), key=lambda item: item[1], reverse=True)
+    entries = {}
+    if sizes:
+        with Image.open(BytesIO(data)) as original:
+            image = _fit(original, sizes[0][1])
+    for variant, size in sizes:
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        entry = {"width": image.width}
+        for fmt in FORMATS:
+            name = variant_name(field_file.name, digest, variant, fmt)
+            # Имя зависит от содержимого: готовый файл не перезаписываем
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(_encode(image, fmt)))
+            entry[fmt] = name
+        entries[variant] = entry
+    return {"source": field_file.name, **{name: entries[name] for name in settings.IMAGE_VARIANTS}}
+
+
+def normalize_image(file, max_side, max_pixels, formats=("JPEG", "PNG", "WEBP", "GIF")):
+    """
+    Уменьшает загруженное изображение до max_side и перекодирует в JPEG без
+    метаданных. Формат и размер в пикселях проверяются по заголовку до
+    декодирования, поэтому огромные изображения и «бомбы» отклоняются, не
+    занимая память. Файл читается из загрузки (на диске или в памяти), а не
+    копируется целиком. Возвращает ContentFile; имя задаёт вызывающий
+    """
+    try:
+        image = Image.open(file)
+    except Image.DecompressionBombError:
+        raise InvalidImage("Слишком большое изображение")
+    except (UnidentifiedImageError, OSError):
+        raise InvalidImage("Загруженный файл не является валидным изображением")
+    with image:
+        if image.format not in formats:
+            raise InvalidImage("Допустимые форматы: %s" % ", ".join(formats))
+        if image.width * image.height > max_pixels:
+            raise InvalidImage(
+                "Слишком большое изображение: %d×%d пикселей" % (image.width, image.height)
+            )
+        try:
+            return ContentFile(_encode(_fit(image, max_side), "jpeg"))
+        except (OSError, ValueError, SyntaxError):
+            raise InvalidImage("Изображение повреждено")
+
+
+def variant_files(variants) -> set:
+    return {
+        entry[fmt]
+        for variant, entry in variants.items()
+        if variant != "source"
+        for fmt in FORMATS
+        if fmt in entry
+    }
+
+
+def delete_variants(storage, variants, keep=()):
+    for name in variant_files(variants) - set(keep):
+        storage.delete(name)
+
+
+def is_stale(instance) -> bool:
+    """Варианты не построены или построены для прежнего файла"""
+    return bool(instance.src) and (instance.variants or {}).get("source") != instance.src.name
+
+
+@job(queue="media", priority=-5)
+def build_variants(label, pk, force=False):
+    """Строит варианты изображения модели label и записывает их в variants"""
+    model = apps.get_model(label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not (force or is_stale(instance)):
+        return
+    try:
+        variants = render_variants(instance.src)
+    except FileNotFoundError:
+        logger.warning("Оригинал %s для %s #%s не найден", instance.src.name, label, pk)
+        return
+    storage = instance.src.storage
+    with transaction.atomic():
+        current = model.objects.select_for_update().filter(pk=pk).first()
+        if current is None or current.src.name != variants["source"]:
+            # Изображение заменили или удалили, пока строились варианты
+            delete_variants(storage, variants)
+            return
+        previous = current.variants or {}
+        current.variants = variants
+        # save(), а не update(): сигналы сбрасывают кэши, где лежат URL
+        current.save(update_fields=["variants"])
+    delete_variants(storage, previous, keep=variant_files(variants))
+    logger.debug("Варианты %s #%s построены: %s", label, pk, variants["source"])
+
+
+def schedule_variants(instance):
+    """Ставит построение вариантов в очередь, если они устарели (для сигналов post_save)"""
+    if is_stale(instance):
+        label = instance._meta.label
+        build_variants.enqueue(
+            args=[label, instance.pk], key=f"image-variants:{label}:{instance.pk}"
+        )
+
+
+def variant_urls(variants, request) -> dict:
+    """{вариант: {"width", "webp", "jpeg"}} с абсолютными URL (без запроса — относительными)"""
+    absolute = request.build_absolute_uri if request is not None else str
+    return {
+        variant: {
+            key: absolute(default_storage.url(value)) if key in FORMATS else value
+            for key, value in entry.items()
+        }
+        for variant, entry in (variants or {}).items()
+        if variant != "source"
+    }
+
+
+def srcset(urls, fmt="webp") -> str:
+    """Значение атрибута srcset из результата variant_urls"""
+    return ", ".join(
+        f"{entry[fmt]} {entry['width']}w"
+        for entry in sorted(urls.values(), key=lambda entry: entry["width"])
+        if fmt in entry
+    )
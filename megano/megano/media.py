@@ -0,0 +1,170 @@
+"""
+Раздача загруженных файлов (MEDIA_ROOT).
+
+В отличие от django.views.static.serve, которая подключалась только при
+DEBUG, ответ пригоден для работы за кэширующим прокси и в браузере:
+
+- ETag из размера и времени изменения файла (os.stat, без чтения файла)
+  и Last-Modified; If-None-Match / If-Modified-Since дают 304;
+- Cache-Control: уменьшенные копии megano.images (каталог IMAGE_VARIANTS_DIR,
+  хэш содержимого в имени) кэшируются навсегда (immutable), остальные файлы —
+  на MEDIA_CACHE_MAX_AGE секунд с перепроверкой по ETag;
+- Range: один диапазон байтов (206/416) с учётом If-Range; несколько
+  диапазонов отдаются целым файлом, что допускает RFC 9110;
+- MEDIA_SENDFILE = "x-accel-redirect" (nginx, внутренний location
+  MEDIA_ACCEL_PREFIX) или "x-sendfile" (Apache, lighttpd): Django проверяет
+  путь и заголовки, а сам файл отдаёт прокси.
+"""
+
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.http import StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Хэш содержимого в имени: photo.0123456789ab.thumb.webp (megano.images.variant_name)
+CONTENT_ADDRESSED = re.compile(r"\.[0-9a-f]{12}\.[^/.]+\.[^/.]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(st) -> str:
+    return '"%x-%x"' % (st.st_size, st.st_mtime_ns)
+
+
+def cache_control(path) -> str:
+    # Неизменяемы только варианты: загруженный пользователем файл с похожим
+    # именем может быть перезаписан
+    if path.startswith(settings.IMAGE_VARIANTS_DIR + "/") and CONTENT_ADDRESSED.search(path):
+        return IMMUTABLE
+    return "public, max-age=%d" % settings.MEDIA_CACHE_MAX_AGE
+
+
+def not_modified(request, etag, mtime) -> bool:
+    """Условный GET: If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2)"""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        # Для GET сравнение слабое: W/"x" совпадает с "x"
+        tags = [tag.removeprefix("W/") for tag in parse_etags(if_none_match)]
+        return "*" in tags or etag in tags
+    since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return since is not None and int(mtime) <= since
+
+
+def parse_range(header, size):
+    """
+    (начало, конец включительно) для Range: bytes=..., None — отдать файл
+    целиком, ValueError — диапазон за пределами файла
+    """
+    match = RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-N: последние N байтов
+        length = int(last)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, document_root, content_type=None) -> HttpResponse:
+    """
+    Отдаёт файл path относительно document_root; Http404, если файла нет.
+    Режимы MEDIA_SENDFILE рассчитаны на файлы внутри MEDIA_ROOT
+    """
+    try:
+        full_path = safe_join(document_root, path)
+        st = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404(path)
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404(path)
+
+    etag = file_etag(st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(st.st_mtime),
+        "Cache-Control": cache_control(path),
+        "Accept-Ranges": "bytes",
+    }
+    if not_modified(request, etag, st.st_mtime):
+        return HttpResponseNotModified(headers=headers)
+
+    if content_type is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or "application/octet-stream"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+    if settings.MEDIA_SENDFILE == "x-accel-redirect":
+        # nginx сам отвечает на Range и отдаёт файл из внутреннего location
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(
+            os.path.relpath(full_path, settings.MEDIA_ROOT)
+        )
+        return response
+    if settings.MEDIA_SENDFILE == "x-sendfile":
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response["X-Sendfile"] = full_path
+        return response
+
+    byte_range = None
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, st.st_size)
+        except ValueError:
+            headers["Content-Range"] = "bytes */%d" % st.st_size
+            return HttpResponse(status=416, headers=headers)
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response["Content-Length"] = str(st.st_size)
+        return response
+    if byte_range is None:
+        return FileResponse(open(full_path, "rb"), content_type=content_type, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        _read_range(open(full_path, "rb"), start, length),
+        status=206,
+        content_type=content_type,
+        headers=headers,
+    )
+    response["Content-Range"] = "bytes %d-%d/%d" % (start, end, st.st_size)
+    response["Content-Length"] = str(length)
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """Файлы MEDIA_ROOT по адресу MEDIA_URL"""
+    return serve_file(request, path, settings.MEDIA_ROOT)
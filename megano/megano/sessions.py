@@ -0,0 +1,58 @@
+"""
+Хранилище сессий: cached_db с записью только изменившихся сессий.
+
+Чтение идёт из кэша SESSION_CACHE_ALIAS, в БД — только при промахе, поэтому
+обычный запрос вошедшего пользователя не делает SELECT к django_session.
+Django сохраняет сессию, если в неё что-то присвоили, даже то же самое
+значение; здесь запись (UPDATE в SQLite и кэш) пропускается, если
+сериализованные данные совпадают с загруженными.
+
+Подключается настройкой SESSION_ENGINE = 'megano.sessions'.
+"""
+
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+
+class SessionStore(CachedDBStore):
+    _loaded_payload = None
+
+    def _payload(self, data) -> bytes:
+        return self.serializer().dumps(data)
+
+    def load(self):
+        data = super().load()
+        self._loaded_payload = self._payload(data)
+        return data
+
+    async def aload(self):
+        data = await super().aload()
+        self._loaded_payload = self._payload(data)
+        return data
+
+    def _unchanged(self, must_create) -> bool:
+        return (
+            not must_create
+            and self.session_key is not None
+            and self._loaded_payload is not None
+            and self._payload(self._get_session(no_load=True)) == self._loaded_payload
+        )
+
+    def save(self, must_create=False):
+        if self._unchanged(must_create):
+            return
+        super().save(must_create)
+        self._loaded_payload = self._payload(self._session)
+
+    async def aexists(self, session_key):
+        # cached_db проверяет кэш синхронным `in`, что недопустимо в async-контексте
+        # для кэша в БД (DatabaseCache)
+        if await self._cache.ahas_key(self.cache_key_prefix + session_key):
+            return True
+        return await DBStore.aexists(self, session_key)
+
+    async def asave(self, must_create=False):
+        if self._unchanged(must_create):
+            return
+        await super().asave(must_create)
+        self._loaded_payload = self._payload(self._session)
@@ -49,6 +49,8 @@ INSTALLED_APPS = [
     'api_product.apps.ApiProductConfig',
     'api_transaction.apps.ApiTransactionConfig',
     'api_order.apps.ApiOrderConfig',
+    'api_report.apps.ApiReportConfig',
+    'api_job.apps.ApiJobConfig',
     'django_cleanup.apps.CleanupConfig',
 ]
 
@@ -91,9 +93,60 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db_megano.sqlite3',
+        # Обработчики фоновых задач пишут в базу из нескольких процессов:
+        # транзакция сразу берёт блокировку записи и ждёт её до timeout секунд,
+        # а не падает с «database is locked» при повышении блокировки
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# В production здесь должен быть общий для всех процессов кэш (Redis/Memcached)
+
+# Кэши с состоянием, которое должны видеть все процессы (корзины, сессии, версии
+# дерева категорий и настроек доставки, лимиты запросов, профили): Redis при заданном
+# REDIS_URL (нужен пакет redis), иначе таблица в БД — создаётся командой
+# python manage.py createcachetable. cache.add() в обоих атомарен, на нём построены
+# блокировки корзины
+REDIS_URL = os.environ.get('REDIS_URL')
+
+
+def shared_cache(name, max_entries):
+    if REDIS_URL:
+        # Redis не вытесняет записи сам по числу ключей, лимит задаётся maxmemory
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': name,
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': f'megano_cache_{name}',
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    }
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'megano-default',
+    },
+    'baskets': shared_cache('baskets', max_entries=100000),
+    'sessions': shared_cache('sessions', max_entries=100000),
+    'shared': shared_cache('shared', max_entries=100000),
+}
+
+# Сессии: 'megano.sessions' — cached_db, запись только изменившихся сессий;
+# 'django.contrib.sessions.backends.db' — каждая сессия читается из SQLite.
+# Кэш сессий общий (выход в одном процессе виден всем); чтение без SQL — только
+# с Redis, без REDIS_URL остаётся экономия на записи неизменившихся сессий.
+# Подписанные cookie не подходят: ключ сессии — владелец гостевой корзины и
+# резервов, а у signed_cookies он меняется при каждом изменении данных.
+# Сравнение: python manage.py bench_sessions
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'megano.sessions')
+SESSION_CACHE_ALIAS = 'sessions'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,6 +189,12 @@ STATICFILES_DIRS = [
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR / 'uploads')
+# Раздача загрузок (megano.media): max-age для файлов без хэша в имени;
+# MEDIA_SENDFILE — None, 'x-accel-redirect' (nginx) или 'x-sendfile' (Apache);
+# MEDIA_ACCEL_PREFIX — внутренний location nginx с alias на MEDIA_ROOT
+MEDIA_CACHE_MAX_AGE = 60 * 60
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -144,6 +203,13 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Токены первыми: по первому классу DRF выбирает 401 (WWW-Authenticate: Bearer) вместо 403
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api_auth.tokens.AccessTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': ['api_auth.throttling.ScopedSlidingWindowThrottle'],
     # 'APPEND_SLASH': False,
 }
 
@@ -169,6 +235,93 @@ LOGGING = {
     },
 }
 
+# Версия дерева категорий (api_product.category_tree) — в общем кэше, чтобы
+# изменение категории перестраивало дерево во всех процессах
+CATEGORY_TREE_CACHE_ALIAS = 'shared'
+
+# Версия настроек доставки (DeliverySettings.get_solo) — там же: изменение цен
+# доставки в админке видят все процессы
+DELIVERY_SETTINGS_CACHE_ALIAS = 'shared'
+
+# Корзина
+# DatabaseBasketStorage — таблица Basket и сессия; CacheBasketStorage — кэш для чтения.
+# Отложенная запись (BASKET_WRITE_BEHIND) хранит несохранённые корзины только в кэше,
+# поэтому включается лишь с Redis (maxmemory-policy noeviction): DatabaseCache
+# вытесняет записи сверх MAX_ENTRIES, и без Redis каждое изменение пишется в БД сразу
+
+BASKET_STORAGE = 'api_transaction.storage.CacheBasketStorage'
+BASKET_CACHE_ALIAS = 'baskets'
+BASKET_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+BASKET_WRITE_BEHIND = bool(REDIS_URL)
+BASKET_WRITE_BEHIND_DELAY = 60
+
+# Срок жизни резерва товара в корзине, секунды
+STOCK_RESERVATION_TTL = 30 * 60
+
+# Оплата заказов: класс платёжной системы и срок, после которого платёж без
+# ответа считается неудачным, секунды. Платежи проводят обработчики очереди
+# 'payments' (JOB_QUEUES)
+PAYMENT_PROCESSOR = 'api_order.payment.FakePaymentProcessor'
+PAYMENT_TIMEOUT = 5 * 60
+PAYMENT_FAKE_DELAY = 1
+
+# Фоновые задачи (api_job): True — выполнять сразу, без обработчиков;
+# лимиты одновременно выполняемых задач по очередям; базовая задержка
+# повтора, секунды (удваивается с каждой попыткой); время, после которого
+# задача зависшего обработчика возвращается в очередь; пауза опроса очереди;
+# сколько дней хранить выполненные задачи
+JOB_QUEUE_EAGER = False
+JOB_QUEUES = {
+    'default': {'concurrency': 4},
+    'media': {'concurrency': 2},
+    'payments': {'concurrency': 4},
+}
+JOB_RETRY_BACKOFF = 10
+JOB_LOCK_TIMEOUT = 10 * 60
+JOB_POLL_INTERVAL = 1
+JOB_RETENTION_DAYS = 7
+
+# Лимиты частоты запросов (api_auth.throttling): область -> (запросов, окно в секундах).
+# Для sign-in:username считаются только неудачные попытки входа. Счётчики — в общем
+# кэше, иначе при N процессах лимит был бы в N раз больше и сбрасывался перезапуском.
+# Без Redis каждый учтённый запрос стоит нескольких запросов к таблице кэша
+RATE_LIMIT_CACHE_ALIAS = 'shared'
+RATE_LIMITS = {
+    'sign-in:ip': (20, 60),
+    'sign-in:username': (5, 5 * 60),
+    'sign-up:ip': (10, 60 * 60),
+    'password:user': (5, 5 * 60),
+    'review': (10, 60),
+    'basket': (120, 60),
+    'orders': (30, 60),
+}
+
+# Асинхронные вход, регистрация и смена пароля (для запуска под ASGI):
+# хэширование в пуле из PASSWORD_HASH_WORKERS потоков, не более
+# PASSWORD_HASH_QUEUE ожидающих попыток, остальные получают 503
+AUTH_ASYNC_VIEWS = False
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_QUEUE = 32
+
+# Кэш профиля для чтения (api_auth.profile_cache), таймаут в секундах. Общий, чтобы
+# изменение профиля, email, телефона или аватара сбрасывало его во всех процессах
+PROFILE_CACHE_ALIAS = 'shared'
+PROFILE_CACHE_TIMEOUT = 15 * 60
+
+# Уменьшенные копии изображений (megano.images): вариант -> наибольшая сторона, px
+IMAGE_VARIANTS = {'thumb': 160, 'card': 480, 'full': 1200}
+IMAGE_VARIANTS_DIR = 'derived'
+
+# Аватары: размер загрузки и число пикселей проверяются до декодирования,
+# затем изображение уменьшается до AVATAR_SIZE и сохраняется в JPEG
+AVATAR_MAX_UPLOAD_SIZE = 10 * 2**20
+AVATAR_MAX_PIXELS = 40_000_000
+AVATAR_SIZE = 512
+
+# Токены для клиентов без cookie (api_auth.tokens), секунды
+ACCESS_TOKEN_TTL = 5 * 60
+REFRESH_TOKEN_TTL = 14 * 24 * 60 * 60
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
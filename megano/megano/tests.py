@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+
+class MediaServeTestCase(TestCase):
+    """
+    Раздача загрузок (megano.media): условный GET, диапазоны и кэширование
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for name, content in (
+            ("products/photo.jpg", b"0123456789"),
+            ("derived/products/photo.0123456789ab.thumb.webp", b"webp"),
+            ("products/photo.0123456789ab.thumb.webp", b"webp"),
+        ):
+            path = os.path.join(media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(content)
+
+    def test_conditional_get_and_cache_headers(self):
+        response = self.client.get("/media/products/photo.jpg")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+        etag = response["ETag"]
+
+        response = self.client.get("/media/products/photo.jpg", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        response = self.client.get(
+            "/media/products/photo.jpg", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get("/media/derived/products/photo.0123456789ab.thumb.webp")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Content-Type"], "image/webp")
+        # Похожее имя вне каталога вариантов может быть перезаписано — без immutable
+        response = self.client.get("/media/products/photo.0123456789ab.thumb.webp")
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+
+        self.assertEqual(self.client.get("/media/products/missing.jpg").status_code, 404)
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+        self.assertEqual(self.client.post("/media/products/photo.jpg").status_code, 405)
+
+    def test_range_requests(self):
+        url = "/media/products/photo.jpg"
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        # Файл изменился — If-Range с прежним ETag отдаёт его целиком
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE="x-accel-redirect")
+    def test_accel_redirect(self):
+        response = self.client.get("/media/products/photo.jpg")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/products/photo.jpg")
+        self.assertEqual(response.content, b"")
+        self.assertIn("ETag", response)
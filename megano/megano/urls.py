@@ -15,14 +15,17 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from debug_toolbar.toolbar import debug_toolbar_urls
 
+from megano import media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("", include("frontend.urls")),
@@ -30,11 +33,16 @@ urlpatterns = [
     path("api/", include("api_product.urls")),
     path("api/", include("api_transaction.urls")),
     path("api/", include("api_order.urls")),
+    path("api/", include("api_report.urls")),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/schema/swagger/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger"),
     path('swagger/', include('swagger.urls')),
+    # Загрузки с ETag, Range и Cache-Control (megano.media). Если /media/ отдаёт
+    # прокси напрямую, сюда запросы не дойдут
+    re_path(
+        r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), media.serve, name='media'
+    ),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += debug_toolbar_urls()
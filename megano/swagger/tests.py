@@ -1,3 +1,28 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+
+class SwaggerYamlTestCase(TestCase):
+    """
+    Загруженные файлы swagger отдаются через megano.media.serve_file
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(media_root, 'swagger_uploads'))
+        with open(os.path.join(media_root, 'swagger_uploads', 'api.yaml'), 'wb') as file:
+            file.write(b'openapi: 3.0.0\n')
+
+    def test_yaml_is_served(self):
+        response = self.client.get('/swagger/yaml/api.yaml/')
+        self.assertEqual(response['Content-Type'], 'application/x-yaml')
+        self.assertIn('ETag', response)
+        self.assertEqual(b''.join(response.streaming_content), b'openapi: 3.0.0\n')
+        self.assertEqual(self.client.get('/swagger/yaml/missing.yaml/').status_code, 404)
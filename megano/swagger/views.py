@@ -1,8 +1,9 @@
 from django.shortcuts import render, redirect
-from django.http import FileResponse, Http404
+from django.http import Http404
 from .forms import SwaggerUploadForm
 import os
 from django.conf import settings
+from megano.media import serve_file
 
 def upload_swagger(request):
     if request.method == 'POST':
@@ -23,10 +24,16 @@ def upload_swagger(request):
     return render(request, 'swagger/upload_swagger.html', {'form': form})
 
 def swagger_yaml_view(request, filename):
-    file_path = os.path.join(settings.MEDIA_ROOT, 'swagger_uploads', filename)
-    if not os.path.exists(file_path):
+    # ETag, Range и защита от выхода за пределы каталога — в serve_file
+    try:
+        return serve_file(
+            request,
+            f'swagger_uploads/{filename}',
+            settings.MEDIA_ROOT,
+            content_type='application/x-yaml',
+        )
+    except Http404:
         raise Http404("Swagger YAML файл не найден")
-    return FileResponse(open(file_path, 'rb'), content_type='application/x-yaml')
 
 def swagger_ui_view(request, filename):
     # Передаем в шаблон URL к swagger.yaml